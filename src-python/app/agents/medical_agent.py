@@ -1,10 +1,73 @@
 from services.file_reader import FileReader
+from services.context.document_index import DocumentIndex
+from services.context.document_cache import DocumentCache
+from services.context.document_index import IndexedDocument
+from services.context.document_store import DocumentStore
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional
+import asyncio
+import threading
 
 class MedicalAgent:
     """Orchestrates note generation decisions; no direct provider SDK calls."""
 
+    def __init__(self, document_store: Optional[DocumentStore] = None):
+        self._indexes: Dict[Path, DocumentIndex] = {}
+        # Requests and the pre-generation scheduler look indexes up from threads
+        self._indexes_lock = threading.Lock()
+        self.document_cache = DocumentCache()
+        self.document_store = document_store
+
+    def get_index(self, directory: Path, refresh: bool = True) -> DocumentIndex:
+        """Document index for a folder, kept up to date incrementally"""
+        directory = Path(directory).expanduser().resolve()
+        with self._indexes_lock:
+            if directory not in self._indexes:
+                self._indexes[directory] = DocumentIndex(directory, self.document_store)
+            index = self._indexes[directory]
+        if refresh:
+            index.refresh()
+        return index
+
+    def load_medical_files(
+        self, directory: Path, time_window: Optional[dict] = None
+    ) -> Dict[str, str]:
+        """
+        Read the folder, or only the slice selected by a noteOptions.timeWindow.
+        Only file versions missing from the shared document cache are read.
+        """
+        index = self.get_index(directory)
+        documents = index.select(time_window) if time_window else index.documents()
+        reader = FileReader(directory)
+        return self.document_cache.load(documents, reader, self._read_documents)
+
+    def _read_documents(self, documents: List[IndexedDocument], reader: FileReader) -> Dict[str, str]:
+        """
+        Files from disk and ingested documents from the store's normalized
+        text, within one byte budget (the reader's total cap).
+        """
+        stored = [d for d in documents if d.sha256]
+        files = [d for d in documents if not d.sha256]
+        if not stored:
+            return reader.read_indexed(files)
+        # Files get the share a single newest-first plan over both sources
+        # would give them; the store gets the rest, including what files left.
+        remaining = reader.remaining_bytes
+        file_budget = 0
+        for document in sorted(documents, key=lambda d: d.sort_key, reverse=True):
+            share = min(document.size, reader.max_file_bytes, remaining)
+            remaining -= share
+            if not document.sha256:
+                file_budget += share
+        contents = reader.read_indexed(files, budget=file_budget)
+        contents.update(self.document_store.read_texts(stored, reader))
+        return contents
+
+    async def aload_medical_files(
+        self, directory: Path, time_window: Optional[dict] = None
+    ) -> Dict[str, str]:
+        return await asyncio.to_thread(self.load_medical_files, directory, time_window)
+
     def read_medical_files(self, directory: Path) -> Dict[str, str]:
         fw = FileReader(directory)
         return fw.read_all_files()
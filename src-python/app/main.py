@@ -1,4 +1,5 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, status
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect, HTTPException, status
+from fastapi.responses import FileResponse
 from fastapi.middleware.cors import CORSMiddleware
 from langchain_openai import ChatOpenAI
 from langgraph.graph import START, MessagesState, StateGraph
@@ -6,16 +7,20 @@ from langgraph.checkpoint.memory import MemorySaver
 from langchain_core.messages import HumanMessage
 import os
 from dotenv import load_dotenv
+import io
 import json
 import sys
 from queue import Queue
 import threading
 import asyncio
+from datetime import datetime
 from pathlib import Path
 from urllib.parse import urlparse, parse_qs
 from pydantic import BaseModel
+from typing import List, Optional
 import re
 from textwrap import dedent
+from contextlib import asynccontextmanager
 import logging
 
 # Ensure the app package is importable in both development and when frozen by PyInstaller.
@@ -33,26 +38,9 @@ else:
     # Normal (source) execution: add the app directory (src-python/app) so relative imports work.
     sys.path.insert(0, str(Path(__file__).resolve().parent))
 
-from services.llm.open_router_client import OpenRouterClient
-from agents.medical_agent import MedicalAgent
-from services.note_formatters.NoteFormatterFactory import NoteFormatterFactory
-from services.citations.citation_extractor import CitationExtractor
-from models.note_types import NoteType
-from services.streams.connection_manager import ConnectionManager
-
 logger = logging.getLogger(__name__)
 
 BASE_DIR = Path(__file__).resolve().parent  # e.g., src-python/app
-# Use ~/tmp/medical-files on Ubuntu/Linux, fallback to local tmp for dev
-if os.getenv("MEDICAL_FILES_DIR"):
-    MEDICAL_FILES_DIR = Path(os.getenv("MEDICAL_FILES_DIR")).expanduser().resolve()
-else:
-    # Default: check home directory first (Ubuntu packaging), then local
-    home_medical_dir = Path.home() / "tmp" / "medical-files"
-    local_medical_dir = BASE_DIR / "tmp" / "medical_files"
-    MEDICAL_FILES_DIR = (
-        home_medical_dir if home_medical_dir.exists() else local_medical_dir
-    )
 
 
 def load_environment():
@@ -87,9 +75,75 @@ def load_environment():
             logger.warning(f"Failed loading .env from {candidate}: {exc}")
 
 
+# Before the service imports: modules read their settings from the environment at import
 load_environment()
 
-app = FastAPI()
+from services.llm.open_router_client import OpenRouterClient
+from agents.medical_agent import MedicalAgent
+from services.note_formatters.NoteFormatterFactory import NoteFormatterFactory
+from services.citations.citation_extractor import CitationExtractor
+from services.context.copy_forward import CopyForwardDeduplicator
+from services.context.document_index import TimeWindowError
+from services.context.observations import ObservationExtractor
+from services.context.document_store import (
+    AsyncBodyReader,
+    DocumentStore,
+    DocumentTooLargeError,
+    IngestError,
+)
+from services.context.patient_registry import PatientRegistry, UnknownPatientError
+from models.note_types import NoteType
+from services.streams.connection_manager import ConnectionManager, TaggedSink
+from services.streams.state_backend import create_state_backend
+from services.streams.section_parser import SectionStreamParser
+from services.llm.async_stream import ThreadedStream
+from services.streams.wire_protocol import WireProtocol, note_complete_frame
+from services.validation.note_validator import StreamingNoteValidator, resume_validation
+from services.scheduler.pregeneration import (
+    PrecomputedNoteStore,
+    PregenerationScheduler,
+    load_jobs,
+)
+from services.diagnostics.log_pipeline import configure_logging, log_context
+from services.diagnostics.profiler import (
+    ProfileStore,
+    profile_capture,
+    profiling_requested,
+    stream_thread_name,
+)
+
+# Use ~/tmp/medical-files on Ubuntu/Linux, fallback to local tmp for dev
+if os.getenv("MEDICAL_FILES_DIR"):
+    MEDICAL_FILES_DIR = Path(os.getenv("MEDICAL_FILES_DIR")).expanduser().resolve()
+else:
+    # Default: check home directory first (Ubuntu packaging), then local
+    home_medical_dir = Path.home() / "tmp" / "medical-files"
+    local_medical_dir = BASE_DIR / "tmp" / "medical_files"
+    MEDICAL_FILES_DIR = (
+        home_medical_dir if home_medical_dir.exists() else local_medical_dir
+    )
+
+
+def resolve_medical_dir() -> Path:
+    return Path(os.getenv("MEDICAL_FILES_DIR", str(MEDICAL_FILES_DIR))).expanduser().resolve()
+
+
+configure_logging()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await manager.start()
+    scheduler.start()
+    try:
+        yield
+    finally:
+        await scheduler.stop()
+        await manager.stop()
+        document_store.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -119,13 +173,27 @@ async def health():
 
 # Initialize shared components
 llm_client = OpenRouterClient()
-medical_agent = MedicalAgent()
+# Documents ingested over HTTP, listed alongside the files in their patient folder
+document_store = DocumentStore()
+medical_agent = MedicalAgent(document_store)
 citation_extractor = CitationExtractor()
+deduplicator = CopyForwardDeduplicator()
+observation_extractor = ObservationExtractor()
+# One subfolder per patient/encounter under MEDICAL_FILES_DIR, or a flat folder
+patient_registry = PatientRegistry(resolve_medical_dir(), medical_agent.get_index)
+profile_store = ProfileStore()
 
 
 class TriggerStreamRequest(BaseModel):
     threadId: str
+    # Subfolder of MEDICAL_FILES_DIR; remembered for the thread once given
+    patientId: Optional[str] = None
     docType: str = "ward_round"
+    # Several note types from one loaded context, e.g. ["ward_round", "discharge"];
+    # their frames are multiplexed over the socket with a docType tag. Give
+    # per-type prompts in noteOptions.instructions; noteOptions.instruction
+    # only applies when a single type is requested.
+    docTypes: Optional[List[str]] = None
     noteOptions: dict = {}
 
 
@@ -156,96 +224,499 @@ text
 <MARKDOWN>""")
 
 
-async def stream_note_to_ws(thread_id: str, doc_type: str, note_options: dict):
-    websocket = await manager.get_socket(thread_id)
-    if not websocket:
-        return
-    try:
-        # Build prompts
-        note_type = NoteType(doc_type)
-        formatter = NoteFormatterFactory.create(note_type)
-        medical_dir = Path(os.getenv("MEDICAL_FILES_DIR", str(MEDICAL_FILES_DIR)))
-        logger.info(f"Using medical files dir: {medical_dir}")
-        medical_content = medical_agent.read_medical_files(medical_dir)
-        system_prompt = formatter.get_system_prompt()
-        user_message = formatter.format_user_message(
-            medical_content,
-            note_options.get("instruction", f"Generate {note_type.value} note"),
+def prepare_prompt_content(
+    medical_content: dict, note_options: dict
+) -> tuple[dict, Optional[str]]:
+    """
+    Shrink the sources before they go into the prompt: readings move into a
+    compact observation table and copy-forward repeats are replaced with
+    references to their earliest copy.
+    """
+    content = medical_content
+    observation_table = None
+    if note_options.get("observationTables", True):
+        observations = observation_extractor.extract(content)
+        table = observations.to_table()
+        # Obs-light folders can grow with the table; keep the raw text then.
+        if table and len(table) + sum(map(len, observations.content.values())) < sum(
+            map(len, content.values())
+        ):
+            content = observations.content
+            observation_table = table
+    if note_options.get("dedupe", True):
+        content = deduplicator.deduplicate(content).content
+    return content, observation_table
+
+
+REPAIR_INSTRUCTION = dedent("""
+    Your note above stopped at a structural problem: {problem}
+    Continue the note from exactly where it ends, starting with the "## {section}" section.
+    Do not repeat any text or sections that are already written.
+    Keep the same citation numbering and citation format.""").strip()
+
+
+async def generate_validated_note(
+    thread_id: str, formatter, messages: list, note_options: dict, sink=None
+) -> str:
+    """
+    Stream a note to the client while validating it online.
+
+    Chunks are forwarded as they arrive, and section events too when the
+    client asked for them (?events=sections). On a fatal structure error
+    the LLM stream is abandoned, the client is told to roll back to the
+    start of the broken section, and only the remainder of the note is
+    regenerated (at most noteOptions.maxRepairs times).
+    """
+    sink = sink or manager
+    sections = formatter.get_sections()
+    max_repairs = int(note_options.get("maxRepairs", 1))
+    config = {"temperature": 0.3, "model": os.getenv("OPENROUTER_MODEL")}
+
+    # The parser runs either way: the validator needs its events
+    section_events = await sink.wants_section_events(thread_id)
+
+    async def send_events(events):
+        if not section_events:
+            return
+        for event in events:
+            await sink.send_frame(thread_id, event)
+
+    accumulated = ""
+    parser = SectionStreamParser(sections)
+    validator = StreamingNoteValidator(sections)
+    attempt_messages = messages
+    repairs = 0
+    while True:
+        fatal = None
+        # Stream deltas to client, plus section-level events if it opted in,
+        # so the UI can render each section without re-parsing the note.
+        # The provider iterator blocks; drive it from a thread so concurrent
+        # generations (and everything else on the loop) keep running.
+        stream = ThreadedStream(
+            llm_client.stream_chat(attempt_messages, config), name=stream_thread_name(thread_id)
         )
-        messages = medical_agent.build_messages(system_prompt, user_message)
-
-        # Stream deltas to client
-        accumulated = ""
-        config = {"temperature": 0.3, "model": os.getenv("OPENROUTER_MODEL")}
-        for delta in llm_client.stream_chat(messages, config):
-            accumulated += delta
-            await websocket.send_text(json.dumps({"type": "chunk", "content": delta}))
-
-        # Extract citation data (no HTML conversion)
-        citation_map = citation_extractor.extract_citations(
-            accumulated, medical_content
+        try:
+            async for delta in stream:
+                accumulated += delta
+                await sink.send_frame(thread_id, {"type": "chunk", "content": delta})
+                events = parser.feed(delta)
+                await send_events(events)
+                fatal = next((i for i in validator.observe(events) if i.fatal), None)
+                if fatal and repairs < max_repairs:
+                    # Abandon the rest of this generation; it will be regenerated.
+                    break
+            else:
+                events = parser.close()
+                await send_events(events)
+                issues = validator.observe(events) + validator.finish()
+                fatal = next((i for i in issues if i.fatal), None)
+                if not fatal or repairs >= max_repairs:
+                    break
+        finally:
+            # Also on cancellation (client gone): stop pulling the provider stream
+            await stream.aclose()
+
+        repairs += 1
+        cut = fatal.offset if fatal.offset is not None else len(accumulated)
+        logger.warning(f"Regenerating note from offset {cut}: {fatal.message}")
+        accumulated = accumulated[:cut]
+        await sink.send_frame(
+            thread_id,
+            {
+                "type": "rollback",
+                "offset": cut,
+                "section": fatal.section,
+                "reason": fatal.message,
+            },
         )
+        if accumulated and not accumulated.endswith("\n"):
+            accumulated += "\n\n"
+            await sink.send_frame(thread_id, {"type": "chunk", "content": "\n\n"})
+        # Rebuild parser/validator state for the kept prefix.
+        parser, validator = resume_validation(accumulated, sections)
+        section = validator.expected_next_section() or fatal.section
+        attempt_messages = messages + [
+            {"role": "assistant", "content": accumulated},
+            {
+                "role": "user",
+                "content": REPAIR_INSTRUCTION.format(
+                    problem=fatal.message, section=section
+                ),
+            },
+        ]
+
+    await sink.send_frame(
+        thread_id,
+        {
+            "type": "validation",
+            "valid": validator.is_valid,
+            "repairs": repairs,
+            "issues": [issue.model_dump() for issue in validator.issues],
+        },
+    )
+    return accumulated
 
-        # Send structured data to frontend
-        await websocket.send_text(
-            json.dumps(
-                {
-                    "type": "note_complete",
-                    "data": {
-                        "markdown": accumulated,
-                        "citations": {
-                            str(num): {
-                                "id": cite.id,
-                                "number": cite.number,
-                                "filename": cite.filename,
-                                "section": cite.section,
-                                "timestamp": cite.timestamp.isoformat()
-                                if cite.timestamp
-                                else None,
-                                "content": cite.content,
-                                "context": cite.context,
-                            }
-                            for num, cite in citation_map.citations.items()
-                        },
-                        "citation_count": citation_map.total_count,
-                    },
-                }
-            )
-        )
 
-        logger.info(f"Sent note_complete with {citation_map.total_count} citations")
-        await websocket.send_text(json.dumps({"type": "done"}))
+def record_patient(directory: Path, refresh: bool = True):
+    """Update the patient catalog from the folder's index (blocking; run in a thread)"""
+    patient_registry.record(directory, medical_agent.get_index(directory, refresh=refresh))
+
+
+class NoteContext(BaseModel):
+    """Sources loaded and prepared once, shared by every note generated from them"""
+
+    medical_content: dict  # original text; citations resolve against it
+    prompt_content: dict
+    observation_table: Optional[str] = None
+
+
+async def load_note_context(medical_dir: Path, note_options: dict) -> NoteContext:
+    logger.info(f"Using medical files dir: {medical_dir}")
+    medical_content = await medical_agent.aload_medical_files(
+        medical_dir, note_options.get("timeWindow")
+    )
+    await asyncio.to_thread(record_patient, medical_dir, False)
+    # Citations are still extracted against the original content.
+    prompt_content, observation_table = await asyncio.to_thread(
+        prepare_prompt_content, medical_content, note_options
+    )
+    return NoteContext(
+        medical_content=medical_content,
+        prompt_content=prompt_content,
+        observation_table=observation_table,
+    )
+
+
+def note_instruction(note_type: NoteType, note_options: dict, shared: bool = True) -> str:
+    """
+    noteOptions.instructions[docType], else noteOptions.instruction when it
+    applies to this note alone (`shared`), else a default for the type.
+    """
+    instructions = note_options.get("instructions") or {}
+    if instructions.get(note_type.value):
+        return instructions[note_type.value]
+    if shared and note_options.get("instruction"):
+        return note_options["instruction"]
+    return f"Generate {note_type.value} note"
+
+
+async def generate_note(
+    thread_id: str,
+    doc_type: str,
+    note_options: dict,
+    context: NoteContext,
+    sink,
+    shared_instruction: bool = True,
+):
+    """
+    Generate one note from a loaded context and send its frames to `sink`.
+    With several note types in one request, `shared_instruction` is False:
+    a single noteOptions.instruction is written for one type and is not sent
+    to the others.
+    """
+    # Build prompts
+    note_type = NoteType(doc_type)
+    formatter = NoteFormatterFactory.create(note_type)
+    system_prompt = formatter.get_system_prompt()
+    user_message = formatter.format_user_message(
+        context.prompt_content,
+        note_instruction(note_type, note_options, shared_instruction),
+        context.observation_table,
+    )
+    messages = medical_agent.build_messages(system_prompt, user_message)
+
+    accumulated = await generate_validated_note(
+        thread_id, formatter, messages, note_options, sink
+    )
+
+    # Extract citation data (no HTML conversion)
+    citation_map = citation_extractor.extract_citations(
+        accumulated, context.medical_content
+    )
+
+    # Send structured data to frontend; clients that negotiated
+    # markdown=ref get the hash of the streamed text instead of a copy.
+    await sink.send_frame(thread_id, note_complete_frame(accumulated, citation_map))
+
+    logger.info(
+        f"Sent {doc_type} note_complete with {citation_map.total_count} citations"
+    )
+    await sink.send_frame(thread_id, {"type": "done"})
+
+
+async def stream_note_to_ws(
+    thread_id: str,
+    doc_type: str,
+    note_options: dict,
+    sink=None,
+    medical_dir: Optional[Path] = None,
+):
+    """
+    Generate a note and send its frames to `sink` (the ConnectionManager by
+    default; the pre-generation scheduler passes a RecordingSink).
+    """
+    sink = sink or manager
+    if not await sink.is_connected(thread_id):
+        return
+    try:
+        context = await load_note_context(
+            medical_dir or resolve_medical_dir(), note_options
+        )
+        await generate_note(thread_id, doc_type, note_options, context, sink)
 
     except Exception as e:
         logger.error(f"Error in stream_note_to_ws: {e}", exc_info=True)
         try:
-            await websocket.send_text(json.dumps({"type": "error", "content": str(e)}))
+            await sink.send_frame(thread_id, {"type": "error", "content": str(e)})
         except Exception:
             pass
 
 
+async def stream_notes_to_ws(
+    thread_id: str, doc_types: List[str], note_options: dict, medical_dir: Path
+):
+    """
+    Generate several note types from one loaded context.
+
+    The generations run concurrently over the same socket; every frame they
+    send carries its docType. A final untagged done lists the docTypes once
+    all of them have finished or failed.
+    """
+
+    async def generate_tagged(doc_type: str):
+        sink = TaggedSink(manager, doc_type)
+        try:
+            await generate_note(
+                thread_id, doc_type, note_options, context, sink, shared_instruction=False
+            )
+        except Exception as e:
+            logger.error(f"Error generating {doc_type} note: {e}", exc_info=True)
+            await sink.send_frame(thread_id, {"type": "error", "content": str(e)})
+
+    try:
+        pending = []
+        for doc_type in doc_types:
+            precomputed = await scheduler.lookup(medical_dir, doc_type, note_options)
+            if precomputed is None:
+                pending.append(doc_type)
+                continue
+            sink = TaggedSink(manager, doc_type)
+            for frame in precomputed.frames():
+                await sink.send_frame(thread_id, frame)
+        if pending:
+            context = await load_note_context(medical_dir, note_options)
+            await asyncio.gather(*(generate_tagged(doc_type) for doc_type in pending))
+    except Exception as e:
+        logger.error(f"Error in stream_notes_to_ws: {e}", exc_info=True)
+        await manager.send_frame(thread_id, {"type": "error", "content": str(e)})
+    await manager.send_frame(thread_id, {"type": "done", "docTypes": doc_types})
+
+
+async def run_note_stream(
+    thread_id: str, doc_types: List[str], note_options: dict, medical_dir: Path
+):
+    """Generate the requested notes, in a profile capture when one is requested"""
+    with log_context(thread_id):
+        if not profiling_requested(note_options):
+            await _run_note_stream(thread_id, doc_types, note_options, medical_dir)
+            return
+        async with profile_capture(
+            thread_id, ",".join(doc_types), profile_store
+        ) as capture_id:
+            await manager.send_frame(thread_id, {"type": "profile", "id": capture_id})
+            await _run_note_stream(thread_id, doc_types, note_options, medical_dir)
+
+
+async def _run_note_stream(
+    thread_id: str, doc_types: List[str], note_options: dict, medical_dir: Path
+):
+    if len(doc_types) > 1:
+        await stream_notes_to_ws(thread_id, doc_types, note_options, medical_dir)
+        return
+    # A fresh pre-generated note is delivered instead of generating one
+    doc_type = doc_types[0]
+    precomputed = await scheduler.lookup(medical_dir, doc_type, note_options)
+    if precomputed is not None:
+        logger.info(f"Delivering {doc_type} note pre-generated at {precomputed.created_at}")
+        for frame in precomputed.frames():
+            await manager.send_frame(thread_id, frame)
+        return
+    await stream_note_to_ws(thread_id, doc_type, note_options, medical_dir=medical_dir)
+
+
 @app.post("/api/notes/trigger-stream", status_code=status.HTTP_202_ACCEPTED)
 async def trigger_stream(req: TriggerStreamRequest):
-    ws = await manager.get_socket(req.threadId)
-    if not ws:
+    # The socket may be held by another worker; the state backend routes frames to it.
+    if not await manager.is_connected(req.threadId):
         raise HTTPException(
             status_code=404, detail="WebSocket not connected for threadId"
         )
+    patient_id = req.patientId or await manager.backend.thread_patient(req.threadId)
+    try:
+        medical_dir = patient_registry.directory(patient_id)
+    except UnknownPatientError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    doc_types = list(dict.fromkeys(req.docTypes or [req.docType]))
+    available = {note_type.value for note_type in NoteFormatterFactory.get_available_types()}
+    unknown = [doc_type for doc_type in doc_types if doc_type not in available]
+    if unknown:
+        raise HTTPException(
+            status_code=400, detail=f"Unsupported docType: {', '.join(unknown)}"
+        )
+    time_window = req.noteOptions.get("timeWindow")
+    if time_window:
+        # sinceLast may name a type only this folder has, so check against its index
+        index = await asyncio.to_thread(medical_agent.get_index, medical_dir)
+        try:
+            index.check_window(time_window)
+        except TimeWindowError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    if req.patientId:
+        await manager.backend.link_patient(req.threadId, req.patientId)
     # Launch streaming task tied to this threadId
     await manager.start_stream_task(
         req.threadId,
-        stream_note_to_ws(req.threadId, req.docType, req.noteOptions),
+        run_note_stream(req.threadId, doc_types, req.noteOptions, medical_dir),
     )
-    return {"status": "started", "threadId": req.threadId}
+    return {
+        "status": "started",
+        "threadId": req.threadId,
+        "patientId": patient_id,
+        "docTypes": doc_types,
+    }
+
+
+@app.get("/api/patients")
+async def list_patients():
+    """Catalog of patient folders: file counts, bytes and latest document"""
+    summaries = await asyncio.to_thread(patient_registry.catalog)
+    return [summary.model_dump() for summary in summaries]
 
 
-manager = ConnectionManager()
+ARCHIVE_TYPES = {"application/x-tar", "application/gzip", "application/x-gtar"}
+
+
+@app.post("/api/documents", status_code=status.HTTP_201_CREATED)
+async def ingest_documents(
+    request: Request,
+    patientId: Optional[str] = None,
+    filename: Optional[str] = None,
+    timestamp: Optional[str] = None,
+    docType: Optional[str] = None,
+):
+    """
+    Stream documents into the compressed store for a patient folder.
+
+    The body is either one document named by `filename` (with optional
+    `timestamp` and `docType` overrides), or a tar archive of documents
+    (Content-Type application/x-tar, optionally gzipped). Metadata and
+    normalized text are extracted here, not when a note is generated.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    archive = content_type in ARCHIVE_TYPES
+    if not archive and not filename:
+        raise HTTPException(status_code=400, detail="filename is required for a single document")
+    try:
+        directory = patient_registry.create(patientId)
+        ingested_at = datetime.fromisoformat(timestamp) if timestamp else None
+    except UnknownPatientError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid timestamp: {timestamp!r}")
+
+    # The store reads the body from a worker thread as it arrives
+    body = io.BufferedReader(AsyncBodyReader(request.stream(), asyncio.get_running_loop()))
+    try:
+        if archive:
+            stored = await asyncio.to_thread(document_store.ingest_archive, directory, body)
+        else:
+            stored = [
+                await asyncio.to_thread(
+                    document_store.ingest, directory, filename, body, ingested_at, docType
+                )
+            ]
+    except DocumentTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except IngestError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Lists the new documents in the folder's index and the patient catalog
+    await asyncio.to_thread(record_patient, directory)
+    return {
+        "patientId": patientId,
+        "documents": [document.model_dump() for document in stored],
+    }
+
+
+@app.get("/api/documents")
+async def list_documents(patientId: Optional[str] = None):
+    """Documents ingested for a patient folder (files on disk are not listed)"""
+    try:
+        directory = patient_registry.directory(patientId)
+    except UnknownPatientError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    stored = await asyncio.to_thread(document_store.catalog, directory)
+    return [document.model_dump() for document in stored]
+
+
+@app.get("/api/profiles")
+async def list_profiles(limit: int = 20):
+    """Summaries of the most recent profile captures, newest first"""
+    summaries = await asyncio.to_thread(profile_store.list, limit)
+    return [summary.model_dump(exclude={"top_functions", "loop_blocks"}) for summary in summaries]
+
+
+@app.get("/api/profiles/{capture_id}")
+async def download_profile(capture_id: str):
+    path = profile_store.path(capture_id, ".json")
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/json", filename=path.name)
+
+
+@app.get("/api/profiles/{capture_id}/collapsed")
+async def download_collapsed_stacks(capture_id: str):
+    """Collapsed stacks for flamegraph.pl, speedscope or inferno"""
+    path = profile_store.path(capture_id, ".collapsed")
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=path.name)
+
+
+manager = ConnectionManager(create_state_backend())
+pregeneration_jobs = load_jobs()
+scheduler = PregenerationScheduler(
+    jobs=pregeneration_jobs,
+    # No jobs, no store: requests skip the precomputed lookup entirely
+    store=PrecomputedNoteStore() if pregeneration_jobs else None,
+    generate=lambda sink, thread_id, doc_type, note_options, directory: stream_note_to_ws(
+        thread_id, doc_type, note_options, sink, directory
+    ),
+    targets=lambda: patient_registry.targets(),
+    fingerprint=lambda directory: medical_agent.get_index(directory).fingerprint(),
+    worker_id=manager.worker_id,
+)
 
 
 @app.websocket("/ws/medical-note/{thread_id}")
 async def medical_note_ws(websocket: WebSocket, thread_id: str):
     await websocket.accept()
-    await manager.connect(thread_id, websocket)
+    try:
+        protocol = WireProtocol.from_query(websocket.query_params)
+    except ValueError as e:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=str(e))
+        return
+    await manager.connect(thread_id, websocket, protocol)
+    # ?patientId= links the thread to a patient folder up front
+    patient_id = websocket.query_params.get("patientId")
+    if patient_id:
+        try:
+            patient_registry.directory(patient_id)
+            await manager.backend.link_patient(thread_id, patient_id)
+        except UnknownPatientError as e:
+            logger.warning(f"Ignoring patientId for thread {thread_id}: {e}")
+    # Tell the client which encoding it actually got (msgpack may be unavailable)
+    await manager.send_frame(thread_id, protocol.describe())
     try:
         # Keep the socket alive; optional: read control messages if needed
         while True:
@@ -257,9 +728,27 @@ async def medical_note_ws(websocket: WebSocket, thread_id: str):
 
 
 if __name__ == "__main__":
+    import multiprocessing
+
+    # Worker processes re-execute the frozen binary; let them bootstrap first.
+    multiprocessing.freeze_support()
     port = 8000
     print(f"PORT:{port}", flush=True)  # To inform Tauri of the port
     sys.stdout.flush()
     import uvicorn
 
-    uvicorn.run(app, host="127.0.0.1", port=port)
+    workers = int(os.getenv("SIDECAR_WORKERS", "1"))
+    # permessage-deflate is negotiated per socket when the client offers it
+    server_options = {
+        "ws_per_message_deflate": os.getenv("SIDECAR_WS_DEFLATE", "1") != "0",
+        # uvicorn's loggers propagate to the queue-backed root handler
+        "log_config": None,
+    }
+    if workers > 1:
+        # Multiple workers need an import string; shared state goes through
+        # the SQLite state backend (see create_state_backend).
+        uvicorn.run(
+            "main:app", host="127.0.0.1", port=port, workers=workers, **server_options
+        )
+    else:
+        uvicorn.run(app, host="127.0.0.1", port=port, **server_options)
@@ -2,6 +2,9 @@ from abc import ABC, abstractmethod
 from typing import List, Dict, Optional
 from pydantic import BaseModel, Field
 from enum import Enum
+import logging
+
+logger = logging.getLogger(__name__)
 
 class NoteType(str, Enum):
     """Supported medical note types"""
@@ -47,10 +50,56 @@ class MedicalNoteFormatter(ABC):
         pass
     
     @abstractmethod
-    def format_user_message(self, medical_content: dict[str, str], instruction: str) -> str:
-        """Format the user message with medical content"""
+    def format_user_message(
+        self,
+        medical_content: dict[str, str],
+        instruction: str,
+        observation_table: Optional[str] = None,
+    ) -> str:
+        """Format the user message with medical content and optional observation trends"""
         pass
     
+    @staticmethod
+    def assemble_user_message(
+        medical_content: dict[str, str],
+        instruction: str,
+        observation_table: Optional[str] = None,
+    ) -> str:
+        """Sources wrapped with their IDs for citation tracking, plus observation trends"""
+        content_sections = []
+        for filename, content in medical_content.items():
+            logger.debug(f"Content of medical files - {filename}: {content[:100]!r}...")  # Log first 100 chars
+            content_sections.append(
+                f"<source id=\"{filename}\">\n"
+                f"<filename>{filename}</filename>\n"
+                f"<content>\n{content}\n</content>\n"
+                f"</source>\n"
+            )
+        
+        combined_content = "\n".join(content_sections)
+
+        observations = ""
+        if observation_table:
+            # Readings extracted from the sources; lines holding only readings
+            # are replaced in the sources by a marker pointing here. A
+            # [cite:file:Ln] citation is resolved to the original line.
+            observations = (
+                "## Observation Trends (extracted from the source files):\n"
+                "To cite a reading, use a file and line from its Sources column as "
+                "[cite:<file>:L<n>] and quote the table row; the original source "
+                "line is shown to the reader.\n\n"
+                f"{observation_table}\n\n"
+            )
+        
+        return f"""Based on the following medical files, {instruction}
+
+        {observations}
+        ## Medical Source Files:
+
+        {combined_content}
+
+        """
+
     @abstractmethod
     def validate_note(self, note: str) -> bool:
         """Validate the generated note structure"""
@@ -1,11 +1,15 @@
 import re
 from typing import Dict, Optional
 from models.citation import Citation, CitationMap
+from services.context.filenames import parse_filename_timestamp
 from datetime import datetime
 import logging
 
 logger = logging.getLogger(__name__)
 
+# [cite:file:L12] back-links a reading in the observation table to its line
+LINE_SECTION_RE = re.compile(r"^L(\d+)$")
+
 class CitationExtractor:
     """Extract citations with exact quotes from generated notes"""
 
@@ -58,8 +62,15 @@ class CitationExtractor:
 
             citation_id = f"{filename}:{section}"
 
-            logger.info(f"Extracted citation [{number}]: {filename} - {section}")
-            logger.info(f"Quote preview: {cleaned_quote[:100]}...")
+            # A reading cited from the Observation Trends table: the model
+            # quoted the table row, so show the source line it links back to.
+            context = f"From {section}"
+            source_line = self._source_line(filename, section, medical_content)
+            if source_line is not None:
+                cleaned_quote = source_line
+                context = f"From line {section[1:]}"
+
+            logger.debug(f"Extracted citation [{number}]: {filename} - {section}: {cleaned_quote[:100]!r}")
 
             citations_dict[number] = Citation(
                 id=citation_id,
@@ -67,7 +78,7 @@ class CitationExtractor:
                 filename=filename,
                 section=section,
                 content=cleaned_quote,  # Use the LLM's exact quote
-                context=f"From {section}",  # Add section as context
+                context=context,  # Add section as context
                 timestamp=self._extract_timestamp(filename)
             )
 
@@ -99,20 +110,18 @@ class CitationExtractor:
         # Fallback: return first 500 chars
         return content[:500] + "..." if len(content) > 500 else content
     
+    @staticmethod
+    def _source_line(filename: str, section: str, medical_content: Dict[str, str]) -> Optional[str]:
+        """The text of line n for a "Ln" section, if the source has it"""
+        match = LINE_SECTION_RE.match(section.strip())
+        if not match or filename not in medical_content:
+            return None
+        lines = medical_content[filename].splitlines()
+        number = int(match.group(1))
+        if not 1 <= number <= len(lines):
+            return None
+        return lines[number - 1].strip()
+
     def _extract_timestamp(self, filename: str) -> Optional[datetime]:
         """Extract timestamp from filename if present"""
-        timestamp_match = re.search(r'(\d{8})-(\d{2})\.(\d{2})', filename)
-        if timestamp_match:
-            date_str = timestamp_match.group(1)
-            hour = timestamp_match.group(2)
-            minute = timestamp_match.group(3)
-            
-            try:
-                return datetime.strptime(
-                    f"{date_str}{hour}{minute}", 
-                    "%Y%m%d%H%M"
-                )
-            except ValueError:
-                pass
-        
-        return None
+        return parse_filename_timestamp(filename)
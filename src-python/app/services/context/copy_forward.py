@@ -0,0 +1,240 @@
+from collections import OrderedDict, defaultdict
+from datetime import datetime
+from functools import lru_cache
+from hashlib import blake2b, sha1
+from typing import Dict, List, Optional, Tuple
+import re
+import logging
+import numpy as np
+from pydantic import BaseModel
+from .filenames import parse_filename_timestamp
+
+logger = logging.getLogger(__name__)
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 5
+# (a * x + b) % p over 32-bit shingle hashes; a * x + b stays below 2**64
+_PRIME = np.uint64((1 << 32) - 5)
+_rng = np.random.default_rng(0x5EED)
+_A = _rng.integers(1, int(_PRIME), NUM_PERM, dtype=np.uint64)[:, None]
+_B = _rng.integers(0, int(_PRIME), NUM_PERM, dtype=np.uint64)[:, None]
+_SHINGLE_BASE = np.uint64(1_000_003)
+
+BULLET_RE = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s*")
+WORD_RE = re.compile(r"\w+")
+REFERENCE_MARKER = '[Repeated from {filename}: "{anchor}" ... see that source]\n'
+ANCHOR_CHARS = 60
+
+
+class RepeatedBlock(BaseModel):
+    """A block replaced by a reference to its earlier copy"""
+    filename: str
+    block: int
+    start: int
+    end: int
+    canonical_filename: str
+    canonical_block: int
+    similarity: float
+
+
+class DedupResult(BaseModel):
+    content: Dict[str, str]  # filename -> content with repeats replaced
+    repeats: List[RepeatedBlock]
+    original_chars: int
+    deduped_chars: int
+
+    @property
+    def chars_saved(self) -> int:
+        return self.original_chars - self.deduped_chars
+
+
+def split_blocks(content: str) -> List[Tuple[int, int]]:
+    """
+    Split a document into (start, end) spans of copy-forward sized blocks.
+
+    A block ends at a blank line, or where a plain line follows a bullet list
+    (e.g. "Past medical history" then "- HTN", "- T2DM", then "Medications").
+    """
+    spans = []
+    start = None
+    previous_bullet = False
+    position = 0
+    for line in content.splitlines(keepends=True):
+        is_blank = not line.strip()
+        is_bullet = bool(BULLET_RE.match(line))
+        if is_blank:
+            if start is not None:
+                spans.append((start, position))
+                start = None
+        elif start is None:
+            start = position
+        elif previous_bullet and not is_bullet:
+            spans.append((start, position))
+            start = position
+        previous_bullet = is_bullet and not is_blank
+        position += len(line)
+    if start is not None:
+        spans.append((start, position))
+    return spans
+
+
+@lru_cache(maxsize=65536)
+def _token_hash(token: str) -> int:
+    return int.from_bytes(blake2b(token.encode(), digest_size=4).digest(), "big") % int(_PRIME)
+
+
+@lru_cache(maxsize=8192)
+def minhash_signature(text: str) -> Optional[Tuple[int, ...]]:
+    """MinHash over word shingles; None for blocks too short to dedup"""
+    tokens = WORD_RE.findall(text.lower())
+    if len(tokens) < CopyForwardDeduplicator.MIN_TOKENS:
+        return None
+    hashes = np.fromiter(map(_token_hash, tokens), dtype=np.uint64, count=len(tokens))
+    # Rolling polynomial hash of each SHINGLE_SIZE-token window
+    count = len(tokens) - SHINGLE_SIZE + 1
+    shingles = hashes[:count].copy()
+    for offset in range(1, SHINGLE_SIZE):
+        shingles = (shingles * _SHINGLE_BASE + hashes[offset:offset + count]) % _PRIME
+    shingles = np.unique(shingles)
+    # All permutations at once: (NUM_PERM, shingles) -> min per permutation
+    return tuple(((_A * shingles + _B) % _PRIME).min(axis=1).tolist())
+
+
+def _normalize_block(text: str) -> str:
+    """Block text with whitespace collapsed; anything else that differs is kept"""
+    return " ".join(text.split())
+
+
+def _similarity(a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_PERM
+
+
+class CopyForwardDeduplicator:
+    """
+    Near-duplicate detection for copy-forward text across source files.
+
+    Documents are visited oldest first (filename timestamp, then name). Each
+    block is MinHashed and looked up in an LSH index of blocks already kept;
+    a block that repeats an earlier file's block is replaced by a reference
+    naming that file, so citations still resolve to a real source. MinHash
+    only finds candidates: a block is replaced when its text (up to
+    whitespace) is the same as the earlier block, so an edited dose or
+    finding is always kept, and only when the reference is shorter than
+    the block itself.
+    Results are cached per set of document versions.
+    """
+
+    # Shorter blocks are rarely longer than the reference that would replace them
+    MIN_TOKENS = 16
+    THRESHOLD = 0.9
+    CACHE_SIZE = 32
+
+    def __init__(self, threshold: Optional[float] = None):
+        self.threshold = threshold or self.THRESHOLD
+        self._cache: "OrderedDict[tuple, DedupResult]" = OrderedDict()
+
+    @staticmethod
+    def _document_order(filename: str):
+        return (parse_filename_timestamp(filename) or datetime.max, filename)
+
+    @staticmethod
+    def _anchor(content: str, block: int) -> str:
+        """First line of a block, so the model can find it in the canonical file"""
+        start, end = split_blocks(content)[block - 1]
+        first_line = content[start:end].strip().splitlines()[0].strip()
+        return first_line[:ANCHOR_CHARS]
+
+    def deduplicate(self, medical_content: Dict[str, str]) -> DedupResult:
+        key = tuple(
+            sorted((name, sha1(text.encode("utf-8")).hexdigest()) for name, text in medical_content.items())
+        )
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            return cached
+
+        result = self._deduplicate(medical_content)
+        self._cache[key] = result
+        if len(self._cache) > self.CACHE_SIZE:
+            self._cache.popitem(last=False)
+        logger.info(
+            f"Copy-forward dedup: {len(result.repeats)} repeated blocks, "
+            f"{result.chars_saved} of {result.original_chars} chars removed"
+        )
+        return result
+
+    def _deduplicate(self, medical_content: Dict[str, str]) -> DedupResult:
+        buckets: Dict[tuple, List[Tuple[str, int, Tuple[int, ...], str]]] = defaultdict(list)
+        repeats: List[RepeatedBlock] = []
+        markers: Dict[Tuple[str, int], str] = {}
+
+        for filename in sorted(medical_content, key=self._document_order):
+            content = medical_content[filename]
+            for block, (start, end) in enumerate(split_blocks(content), 1):
+                signature = minhash_signature(content[start:end])
+                if signature is None:
+                    continue
+                bands = [(band, signature[band * ROWS:(band + 1) * ROWS]) for band in range(BANDS)]
+
+                text = _normalize_block(content[start:end])
+                best = None
+                seen = set()
+                for band in bands:
+                    for candidate in buckets.get(band, ()):
+                        if candidate[0] == filename or candidate[:2] in seen:
+                            continue
+                        seen.add(candidate[:2])
+                        score = _similarity(signature, candidate[2])
+                        # A near match may differ in a dose or finding; only an
+                        # identical block may be replaced by a reference
+                        if score >= self.threshold and candidate[3] == text:
+                            if best is None or score > best[1]:
+                                best = (candidate, score)
+
+                marker = None
+                if best:
+                    (canonical_filename, canonical_block, _, _), score = best
+                    marker = REFERENCE_MARKER.format(
+                        filename=canonical_filename,
+                        anchor=self._anchor(medical_content[canonical_filename], canonical_block),
+                    )
+                if marker is not None and len(marker) < end - start:
+                    markers[(filename, block)] = marker
+                    repeats.append(
+                        RepeatedBlock(
+                            filename=filename,
+                            block=block,
+                            start=start,
+                            end=end,
+                            canonical_filename=canonical_filename,
+                            canonical_block=canonical_block,
+                            similarity=score,
+                        )
+                    )
+                elif not best:
+                    for band in bands:
+                        buckets[band].append((filename, block, signature, text))
+
+        deduped = dict(medical_content)
+        by_file: Dict[str, List[RepeatedBlock]] = defaultdict(list)
+        for repeat in repeats:
+            by_file[repeat.filename].append(repeat)
+        for filename, file_repeats in by_file.items():
+            content = medical_content[filename]
+            parts = []
+            position = 0
+            for repeat in sorted(file_repeats, key=lambda r: r.start):
+                parts.append(content[position:repeat.start])
+                parts.append(markers[(filename, repeat.block)])
+                position = repeat.end
+            parts.append(content[position:])
+            deduped[filename] = "".join(parts)
+
+        return DedupResult(
+            content=deduped,
+            repeats=repeats,
+            original_chars=sum(len(text) for text in medical_content.values()),
+            deduped_chars=sum(len(text) for text in deduped.values()),
+        )
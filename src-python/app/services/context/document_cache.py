@@ -0,0 +1,134 @@
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import os
+import sys
+import threading
+import logging
+from services.file_reader import FileReader
+from .document_index import IndexedDocument
+
+logger = logging.getLogger(__name__)
+
+# (path, size, mtime_ns): a new version of a file is a new key
+CacheKey = Tuple[str, int, int]
+
+
+class DocumentCache:
+    """
+    Process-wide LRU cache of decoded documents under one memory budget.
+
+    Entries are keyed by file version, so a cached text is never served for
+    a file that changed, and every patient folder shares the same budget:
+    the least recently used documents are evicted first, whichever patient
+    they belong to.
+    """
+
+    MAX_BYTES = int(os.getenv("SIDECAR_DOCUMENT_CACHE_BYTES", str(256 * 1024 * 1024)))
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes if max_bytes is not None else self.MAX_BYTES
+        self._entries: "OrderedDict[CacheKey, Optional[str]]" = OrderedDict()
+        self._paths: Dict[str, CacheKey] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _cost(text: Optional[str]) -> int:
+        return sys.getsizeof(text)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def get(self, key: CacheKey) -> Tuple[bool, Optional[str]]:
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, self._entries[key]
+
+    def put(self, key: CacheKey, text: Optional[str]):
+        """Cache a file version; None records a file the reader skipped (binary)"""
+        cost = self._cost(text)
+        if cost > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._paths.get(key[0])
+            if previous is not None and previous in self._entries:
+                self._bytes -= self._cost(self._entries.pop(previous))
+            self._entries[key] = text
+            self._paths[key[0]] = key
+            self._bytes += cost
+            while self._bytes > self.max_bytes:
+                old_key, old_text = self._entries.popitem(last=False)
+                self._paths.pop(old_key[0], None)
+                self._bytes -= self._cost(old_text)
+                self.evictions += 1
+
+    def load(
+        self,
+        documents: Iterable[IndexedDocument],
+        reader: FileReader,
+        read: Optional[Callable[[List[IndexedDocument], FileReader], Dict[str, str]]] = None,
+    ) -> Dict[str, str]:
+        """
+        Texts for indexed documents, reading only versions not already cached.
+        `read(documents, reader)` loads documents within the reader's budget
+        (default: the reader, with the indexed sizes).
+
+        Versions are cached whole up to the reader's per-file cap, so a folder
+        larger than the total cap is still cached. The total cap is applied
+        when the result is assembled: newest documents first, the document
+        the budget runs out in is read again cut to what is left, and older
+        ones are represented by a truncation marker only.
+        """
+        read = read or (lambda missing, budgeted: budgeted.read_indexed(missing))
+        documents = sorted(documents, key=lambda d: d.sort_key, reverse=True)
+
+        cached: Dict[str, Optional[str]] = {}
+        missing: List[IndexedDocument] = []
+        for document in documents:
+            found, text = self.get((document.path, document.size, document.mtime_ns))
+            if found:
+                cached[document.filename] = text
+            else:
+                missing.append(document)
+        if missing:
+            # Only the per-file cap applies to what goes into the cache
+            uncapped = FileReader(
+                str(reader.directory),
+                max_file_bytes=reader.max_file_bytes,
+                max_total_bytes=sys.maxsize,
+                max_workers=reader.max_workers,
+            )
+            texts = read(missing, uncapped)
+            for document in missing:
+                text = texts.get(document.filename)
+                self.put((document.path, document.size, document.mtime_ns), text)
+                cached[document.filename] = text
+            logger.info(
+                f"Document cache: {len(documents) - len(missing)} hits, {len(missing)} read, "
+                f"{self._bytes / 1e6:.1f} of {self.max_bytes / 1e6:.0f} MB used"
+            )
+
+        contents: Dict[str, str] = {}
+        for document in documents:
+            text = cached[document.filename]
+            if text is None:
+                continue
+            cost = min(document.size, reader.max_file_bytes)
+            if cost <= reader.remaining_bytes:
+                contents[document.filename] = text
+                reader.bytes_loaded += cost
+            elif reader.remaining_bytes == 0:
+                contents[document.filename] = reader.TRUNCATION_MARKER.format(
+                    omitted=document.size, total=document.size
+                )
+            else:
+                contents.update(read([document], reader))
+        return dict(sorted(contents.items()))
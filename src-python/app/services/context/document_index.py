@@ -0,0 +1,247 @@
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timedelta
+from hashlib import sha1
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import os
+import threading
+import logging
+from pydantic import BaseModel
+from .filenames import (
+    DOCUMENT_TYPES,
+    infer_document_type,
+    parse_filename_date,
+    parse_filename_timestamp,
+)
+
+logger = logging.getLogger(__name__)
+
+SortKey = Tuple[datetime, str]
+
+
+def _parse_iso(value: str) -> datetime:
+    """Parse an ISO timestamp as naive local time, matching filename timestamps"""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+
+class TimeWindowError(ValueError):
+    """A noteOptions.timeWindow that is malformed or names an unknown document type"""
+
+
+class IndexedDocument(BaseModel):
+    filename: str
+    path: str
+    doc_type: str
+    timestamp: datetime
+    timestamp_source: str  # "filename" | "filename_date" | "mtime"
+    size: int
+    mtime_ns: int
+    # Set for documents held in the DocumentStore rather than on disk
+    sha256: Optional[str] = None
+
+    @property
+    def sort_key(self) -> SortKey:
+        return (self.timestamp, self.filename)
+
+
+class DocumentIndex:
+    """
+    Chronological index of the documents in a patient folder.
+
+    Documents are kept sorted by their clinical timestamp (parsed from the
+    filename, else file mtime), overall and per document type, so time-window
+    queries are binary searches. refresh() only stats the directory and
+    re-indexes files whose size or mtime changed; nothing is read. Documents
+    ingested into a DocumentStore for the folder are listed from its catalog;
+    a file on disk with the same name takes precedence.
+    """
+
+    def __init__(self, directory: Path, store=None):
+        self.directory = Path(directory)
+        self.store = store
+        self._documents: Dict[str, IndexedDocument] = {}
+        self._order: List[SortKey] = []
+        self._by_type: Dict[str, List[SortKey]] = {}
+        self._lock = threading.Lock()
+        # One refresh at a time; the scheduler and requests share indexes
+        self._refresh_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    @staticmethod
+    def describe(filename: str, path: str, size: int, mtime_ns: int) -> IndexedDocument:
+        timestamp, source = parse_filename_timestamp(filename), "filename"
+        if timestamp is None:
+            timestamp, source = parse_filename_date(filename), "filename_date"
+        if timestamp is None:
+            timestamp, source = datetime.fromtimestamp(mtime_ns / 1e9), "mtime"
+        return IndexedDocument(
+            filename=filename,
+            path=path,
+            doc_type=infer_document_type(filename),
+            timestamp=timestamp,
+            timestamp_source=source,
+            size=size,
+            mtime_ns=mtime_ns,
+        )
+
+    def add(self, document: IndexedDocument):
+        with self._lock:
+            self._remove(document.filename)
+            self._documents[document.filename] = document
+            insort(self._order, document.sort_key)
+            insort(self._by_type.setdefault(document.doc_type, []), document.sort_key)
+
+    def remove(self, filename: str):
+        with self._lock:
+            self._remove(filename)
+
+    def _remove(self, filename: str):
+        document = self._documents.pop(filename, None)
+        if document is None:
+            return
+        for keys in (self._order, self._by_type.get(document.doc_type, [])):
+            index = bisect_left(keys, document.sort_key)
+            if index < len(keys) and keys[index] == document.sort_key:
+                keys.pop(index)
+
+    def refresh(self) -> Tuple[int, int]:
+        """Sync with the directory; returns (changed, removed) counts"""
+        with self._refresh_lock:
+            return self._refresh()
+
+    def _refresh(self) -> Tuple[int, int]:
+        seen = set()
+        changed = 0
+        if self.directory.exists():
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if not entry.is_file():
+                        continue
+                    seen.add(entry.name)
+                    stat = entry.stat()
+                    current = self._documents.get(entry.name)
+                    if (
+                        current
+                        and current.sha256 is None
+                        and current.mtime_ns == stat.st_mtime_ns
+                        and current.size == stat.st_size
+                    ):
+                        continue
+                    self.add(self.describe(entry.name, entry.path, stat.st_size, stat.st_mtime_ns))
+                    changed += 1
+        for document in self.store.documents(self.directory) if self.store else []:
+            if document.filename in seen:
+                continue
+            seen.add(document.filename)
+            current = self._documents.get(document.filename)
+            if current and current.sha256 == document.sha256 and current.mtime_ns == document.mtime_ns:
+                continue
+            self.add(document)
+            changed += 1
+        with self._lock:
+            removed = [name for name in self._documents if name not in seen]
+        for name in removed:
+            self.remove(name)
+        if changed or removed:
+            logger.info(f"Indexed {self.directory}: {changed} changed, {len(removed)} removed")
+        return changed, len(removed)
+
+    def documents(self) -> List[IndexedDocument]:
+        return self.query()
+
+    def fingerprint(self) -> str:
+        """Changes whenever a document is added, removed or modified"""
+        with self._lock:
+            versions = sorted(
+                f"{d.filename}:{d.size}:{d.mtime_ns}" for d in self._documents.values()
+            )
+        return sha1("\n".join(versions).encode("utf-8")).hexdigest()
+
+    def query(
+        self,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        doc_types: Optional[Iterable[str]] = None,
+    ) -> List[IndexedDocument]:
+        """Documents with since <= timestamp <= until, oldest first"""
+        with self._lock:
+            if doc_types is None:
+                key_lists = [self._order]
+            else:
+                key_lists = [self._by_type.get(doc_type, []) for doc_type in doc_types]
+            keys: List[SortKey] = []
+            for key_list in key_lists:
+                lo = bisect_left(key_list, (since, "")) if since else 0
+                hi = bisect_right(key_list, (until, "\uffff")) if until else len(key_list)
+                keys.extend(key_list[lo:hi])
+            return [self._documents[filename] for _, filename in sorted(keys)]
+
+    def latest(self, doc_type: Optional[str] = None) -> Optional[IndexedDocument]:
+        with self._lock:
+            keys = self._order if doc_type is None else self._by_type.get(doc_type, [])
+            return self._documents[keys[-1][1]] if keys else None
+
+    def since_last(self, doc_type: str, doc_types: Optional[Iterable[str]] = None) -> List[IndexedDocument]:
+        """Everything from the latest document of `doc_type` onwards (e.g. since last ward round)"""
+        anchor = self.latest(doc_type)
+        return self.query(since=anchor.timestamp if anchor else None, doc_types=doc_types)
+
+    def doc_types(self) -> List[str]:
+        with self._lock:
+            return [doc_type for doc_type, keys in self._by_type.items() if keys]
+
+    def check_window(self, window) -> None:
+        """Raise TimeWindowError unless select() can resolve `window`"""
+        if not isinstance(window, dict):
+            raise TimeWindowError("timeWindow must be an object")
+        since_last = window.get("sinceLast")
+        if since_last is not None:
+            known = set(DOCUMENT_TYPES.values()) | set(self.doc_types())
+            if not isinstance(since_last, str) or since_last not in known:
+                raise TimeWindowError(
+                    f"Unknown document type for sinceLast: {since_last!r} "
+                    f"(expected one of {', '.join(sorted(known))})"
+                )
+        for key in ("since", "until"):
+            if window.get(key) is None:
+                continue
+            try:
+                _parse_iso(window[key])
+            except (TypeError, ValueError):
+                raise TimeWindowError(f"Invalid {key} timestamp: {window[key]!r}")
+        last_hours = window.get("lastHours")
+        if last_hours is not None and (
+            isinstance(last_hours, bool) or not isinstance(last_hours, (int, float)) or last_hours < 0
+        ):
+            raise TimeWindowError(f"lastHours must be a non-negative number: {last_hours!r}")
+        doc_types = window.get("documentTypes")
+        if doc_types is not None and (
+            not isinstance(doc_types, list) or not all(isinstance(t, str) for t in doc_types)
+        ):
+            raise TimeWindowError("documentTypes must be a list of document types")
+
+    def select(self, window: dict, now: Optional[datetime] = None) -> List[IndexedDocument]:
+        """
+        Resolve a noteOptions.timeWindow:
+          {"lastHours": 24}             documents from the last 24h
+          {"sinceLast": "ward_note"}     from the latest ward note onwards
+                                         (everything if the folder has none yet)
+          {"since": iso, "until": iso}   explicit range (either end optional)
+        plus optional "documentTypes": [...] to restrict types. Raises
+        TimeWindowError for a window that check_window() rejects.
+        """
+        self.check_window(window)
+        doc_types = window.get("documentTypes")
+        if window.get("sinceLast") is not None:
+            return self.since_last(window["sinceLast"], doc_types)
+        since = _parse_iso(window["since"]) if window.get("since") else None
+        until = _parse_iso(window["until"]) if window.get("until") else None
+        if window.get("lastHours") is not None:
+            until = until or now or datetime.now()
+            since = until - timedelta(hours=float(window["lastHours"]))
+        return self.query(since=since, until=until, doc_types=doc_types)
@@ -0,0 +1,478 @@
+from datetime import datetime
+from hashlib import sha256
+from pathlib import Path
+from typing import AsyncIterator, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+import asyncio
+import codecs
+import gzip
+import io
+import os
+import sqlite3
+import tarfile
+import tempfile
+import threading
+import time
+import logging
+from pydantic import BaseModel
+from services.file_reader import FileReader
+from .document_index import DocumentIndex, IndexedDocument, _parse_iso
+
+logger = logging.getLogger(__name__)
+
+# Optional; gzip is used when zstandard is not installed
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - depends on the build
+    zstandard = None
+
+GZIP = "gz"
+ZSTD = "zst"
+# IndexedDocument.path for documents held in the store
+STORE_SCHEME = "store:"
+
+# Text state of a stored object
+TEXT_RAW = "raw"  # the raw bytes are already normalized UTF-8 text
+TEXT_NORMALIZED = "normalized"  # a normalized copy is stored alongside
+TEXT_BINARY = "binary"  # not text; never loaded into prompts
+
+CHUNK_BYTES = 1024 * 1024
+
+
+class IngestError(ValueError):
+    pass
+
+
+class DocumentTooLargeError(IngestError):
+    pass
+
+
+class StoredDocument(BaseModel):
+    filename: str
+    sha256: str
+    doc_type: str
+    timestamp: datetime
+    timestamp_source: str  # as IndexedDocument, or "ingest" when given explicitly
+    size: int
+    stored_bytes: int
+    text: str  # TEXT_RAW | TEXT_NORMALIZED | TEXT_BINARY
+    ingested_at: datetime
+
+
+def _open_writer(file: BinaryIO, codec: str):
+    if codec == ZSTD:
+        return zstandard.ZstdCompressor(level=3).stream_writer(file, closefd=False)
+    return gzip.GzipFile(fileobj=file, mode="wb", compresslevel=6, mtime=0)
+
+
+def _open_reader(file: BinaryIO, codec: str):
+    if codec == ZSTD:
+        return zstandard.ZstdDecompressor().stream_reader(file)
+    return gzip.GzipFile(fileobj=file, mode="rb")
+
+
+def _read_chunks(path: Path, codec: str) -> Iterator[bytes]:
+    """An object's decompressed bytes, CHUNK_BYTES at a time"""
+    with open(path, "rb") as file, _open_reader(file, codec) as reader:
+        while True:
+            chunk = reader.read(CHUNK_BYTES)
+            if not chunk:
+                return
+            yield chunk
+
+
+def _read_object(path: Path, codec: str, limit: Optional[int] = None) -> bytes:
+    """An object's decompressed bytes, at most `limit` of them"""
+    parts = []
+    size = 0
+    for chunk in _read_chunks(path, codec):
+        parts.append(chunk)
+        size += len(chunk)
+        if limit is not None and size >= limit:
+            break
+    data = b"".join(parts)
+    return data if limit is None else data[:limit]
+
+
+def _text_encoding(chunks: Iterable[bytes]) -> Tuple[Optional[str], bool]:
+    """
+    Scan raw bytes as FileReader.decode would decode them. Returns the
+    encoding (None for binary data) and whether the bytes are already
+    normalized: UTF-8 without a BOM and without CRLF line endings.
+    """
+    decoder = None
+    crlf = False
+    previous_cr = False
+    for chunk in chunks:
+        if decoder is None:
+            if FileReader.is_binary(chunk[: FileReader.SNIFF_BYTES]):
+                return None, False
+            encoding = FileReader.encoding_of(chunk)
+            decoder = codecs.getincrementaldecoder(encoding)(errors="strict")
+        try:
+            decoder.decode(chunk)
+        except UnicodeDecodeError:
+            return "cp1252", False
+        crlf = crlf or b"\r\n" in chunk or (previous_cr and chunk.startswith(b"\n"))
+        previous_cr = chunk.endswith(b"\r")
+    if decoder is None:
+        return "utf-8", True
+    try:
+        decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        return "cp1252", False
+    return encoding, encoding == "utf-8" and not crlf
+
+
+def _normalized_chunks(chunks: Iterable[bytes], encoding: str) -> Iterator[bytes]:
+    """UTF-8 text with LF line endings, as prompts see it"""
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    carry = ""
+    for chunk in chunks:
+        text = carry + decoder.decode(chunk)
+        # A trailing CR may be the first half of a CRLF split across chunks
+        carry = "\r" if text.endswith("\r") else ""
+        yield text[: len(text) - len(carry)].replace("\r\n", "\n").encode("utf-8")
+    yield (carry + decoder.decode(b"", final=True)).replace("\r\n", "\n").encode("utf-8")
+
+
+class DocumentStore:
+    """
+    Content-addressed, compressed store for documents ingested over HTTP.
+
+    Objects live under objects/<sha[:2]>/<sha>.<codec>, written once and
+    shared by every document with the same bytes. A SQLite catalog maps
+    (source folder, filename) to an object with the metadata extracted at
+    ingest time, so DocumentIndex lists ingested documents next to the files
+    in that folder without reading them. Text is normalized at ingest; a
+    normalized copy is only stored when it differs from the raw bytes.
+    """
+
+    MAX_DOCUMENT_BYTES = int(os.getenv("SIDECAR_INGEST_MAX_BYTES", str(256 * 1024 * 1024)))
+
+    def __init__(
+        self,
+        root: Optional[Path] = None,
+        codec: Optional[str] = None,
+        max_document_bytes: Optional[int] = None,
+    ):
+        self.max_document_bytes = max_document_bytes or self.MAX_DOCUMENT_BYTES
+        root = root or Path(
+            os.getenv("SIDECAR_DOCUMENT_STORE", str(Path.home() / "tmp" / "anton-sidecar" / "documents"))
+        )
+        self.root = Path(root).expanduser().resolve()
+        self.codec = codec or (ZSTD if zstandard is not None else GZIP)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _db(self) -> sqlite3.Connection:
+        # Opened on first use, so a sidecar that never ingests creates nothing
+        if self._conn is None:
+            (self.root / "objects").mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(
+                str(self.root / "catalog.db"), timeout=5.0, isolation_level=None, check_same_thread=False
+            )
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS objects (
+                    sha256 TEXT PRIMARY KEY,
+                    codec TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    stored_bytes INTEGER NOT NULL,
+                    text TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS documents (
+                    source TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    sha256 TEXT NOT NULL REFERENCES objects (sha256),
+                    doc_type TEXT NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    timestamp_source TEXT NOT NULL,
+                    ingested_ns INTEGER NOT NULL,
+                    PRIMARY KEY (source, filename)
+                );
+                """
+            )
+        return self._conn
+
+    def _execute(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            cursor = self._db().execute(sql, params)
+            return cursor.fetchall() if cursor.description else [cursor.rowcount]
+
+    def _object_path(self, digest: str, codec: str, text: bool = False) -> Path:
+        suffix = f".txt.{codec}" if text else f".{codec}"
+        return self.root / "objects" / digest[:2] / f"{digest}{suffix}"
+
+    def _write_object(self, path: Path, chunks: Iterable[bytes]) -> int:
+        """Compress chunks to a temp file and move it into place; returns stored bytes"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                with _open_writer(file, self.codec) as writer:
+                    for chunk in chunks:
+                        writer.write(chunk)
+            os.replace(temp, path)
+        except BaseException:
+            os.unlink(temp)
+            raise
+        return path.stat().st_size
+
+    def _store_object(self, stream: BinaryIO) -> tuple:
+        """Hash and compress a stream; returns (sha256, size, codec, stored_bytes, text)"""
+        digest = sha256()
+        size = 0
+
+        def chunks():
+            nonlocal size
+            while True:
+                chunk = stream.read(CHUNK_BYTES)
+                if not chunk:
+                    return
+                size += len(chunk)
+                if size > self.max_document_bytes:
+                    raise DocumentTooLargeError(
+                        f"Document exceeds {self.max_document_bytes} bytes"
+                    )
+                digest.update(chunk)
+                yield chunk
+
+        (self.root / "objects").mkdir(parents=True, exist_ok=True)
+        fd, staged = tempfile.mkstemp(dir=self.root / "objects", suffix=".tmp")
+        os.close(fd)
+        staged = Path(staged)
+        try:
+            stored_bytes = self._write_object(staged, chunks())
+            sha = digest.hexdigest()
+            existing = self._execute(
+                "SELECT codec, stored_bytes, text FROM objects WHERE sha256 = ?", (sha,)
+            )
+            if existing:
+                codec, stored_bytes, text = existing[0]
+                return sha, size, codec, stored_bytes, text
+            path = self._object_path(sha, self.codec)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(staged, path)
+        finally:
+            staged.unlink(missing_ok=True)
+
+        text = self._normalize_object(sha, path)
+        self._execute(
+            "INSERT OR IGNORE INTO objects VALUES (?, ?, ?, ?, ?)",
+            (sha, self.codec, size, stored_bytes, text),
+        )
+        return sha, size, self.codec, stored_bytes, text
+
+    def _normalize_object(self, sha: str, path: Path) -> str:
+        # Streamed in two passes so a large object is never held in memory:
+        # a scan, then a normalized copy only when the raw bytes need one.
+        encoding, normalized = _text_encoding(_read_chunks(path, self.codec))
+        if encoding is None:
+            return TEXT_BINARY
+        if normalized:
+            return TEXT_RAW
+        self._write_object(
+            self._object_path(sha, self.codec, text=True),
+            _normalized_chunks(_read_chunks(path, self.codec), encoding),
+        )
+        return TEXT_NORMALIZED
+
+    def ingest(
+        self,
+        source: Path,
+        filename: str,
+        stream: BinaryIO,
+        timestamp: Optional[datetime] = None,
+        doc_type: Optional[str] = None,
+        mtime_ns: Optional[int] = None,
+    ) -> StoredDocument:
+        """
+        Store one document for a source folder, replacing any earlier version
+        with the same filename. The timestamp comes from `timestamp`, else the
+        filename, else `mtime_ns` (default: now), as for files on disk.
+        """
+        if not filename or Path(filename).name != filename or filename in (".", ".."):
+            raise IngestError(f"Invalid filename: {filename!r}")
+        sha, size, codec, stored_bytes, text = self._store_object(stream)
+        ingested_ns = time.time_ns()
+        document = DocumentIndex.describe(
+            filename, STORE_SCHEME + sha, size, mtime_ns or ingested_ns
+        )
+        timestamp_source = document.timestamp_source
+        if timestamp is not None:
+            timestamp_source = "ingest"
+            document.timestamp = _parse_iso(timestamp.isoformat())
+        self._execute(
+            "INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                str(Path(source).resolve()),
+                filename,
+                sha,
+                doc_type or document.doc_type,
+                document.timestamp.isoformat(),
+                timestamp_source,
+                ingested_ns,
+            ),
+        )
+        logger.info(
+            f"Ingested {filename} ({size} bytes, {stored_bytes} stored as {codec}, {text})"
+        )
+        return StoredDocument(
+            filename=filename,
+            sha256=sha,
+            doc_type=doc_type or document.doc_type,
+            timestamp=document.timestamp,
+            timestamp_source=timestamp_source,
+            size=size,
+            stored_bytes=stored_bytes,
+            text=text,
+            ingested_at=datetime.fromtimestamp(ingested_ns / 1e9),
+        )
+
+    def ingest_archive(self, source: Path, stream: BinaryIO) -> List[StoredDocument]:
+        """Store every regular file in a tar stream (optionally gzip/bz2/xz compressed)"""
+        stored = []
+        try:
+            with tarfile.open(fileobj=stream, mode="r|*") as archive:
+                for member in archive:
+                    if not member.isfile():
+                        continue
+                    stored.append(
+                        self.ingest(
+                            source,
+                            Path(member.name).name,
+                            archive.extractfile(member),
+                            mtime_ns=int(member.mtime * 1e9) or None,
+                        )
+                    )
+        except tarfile.TarError as e:
+            raise IngestError(f"Invalid archive: {e}") from e
+        return stored
+
+    def catalog(self, source: Path) -> List[StoredDocument]:
+        rows = self._execute(
+            "SELECT d.filename, d.sha256, d.doc_type, d.timestamp, d.timestamp_source, o.size, "
+            "o.stored_bytes, o.text, d.ingested_ns FROM documents d JOIN objects o USING (sha256) "
+            "WHERE d.source = ? ORDER BY d.timestamp, d.filename",
+            (str(Path(source).resolve()),),
+        )
+        return [
+            StoredDocument(
+                filename=filename,
+                sha256=sha,
+                doc_type=doc_type,
+                timestamp=datetime.fromisoformat(timestamp),
+                timestamp_source=timestamp_source,
+                size=size,
+                stored_bytes=stored_bytes,
+                text=text,
+                ingested_at=datetime.fromtimestamp(ingested_ns / 1e9),
+            )
+            for filename, sha, doc_type, timestamp, timestamp_source, size, stored_bytes, text, ingested_ns in rows
+        ]
+
+    def documents(self, source: Path) -> List[IndexedDocument]:
+        """Index entries for the text documents ingested for a source folder"""
+        if self._conn is None and not (self.root / "catalog.db").exists():
+            return []
+        return [
+            IndexedDocument(
+                filename=stored.filename,
+                path=STORE_SCHEME + stored.sha256,
+                doc_type=stored.doc_type,
+                timestamp=stored.timestamp,
+                timestamp_source=stored.timestamp_source,
+                size=stored.size,
+                mtime_ns=int(stored.ingested_at.timestamp() * 1e9),
+                sha256=stored.sha256,
+            )
+            for stored in self.catalog(source)
+            if stored.text != TEXT_BINARY
+        ]
+
+    def read_text(self, sha: str, limit: Optional[int] = None) -> Optional[bytes]:
+        """Normalized UTF-8 text of an object, up to `limit` bytes; None if missing or binary"""
+        rows = self._execute("SELECT codec, text FROM objects WHERE sha256 = ?", (sha,))
+        if not rows or rows[0][1] == TEXT_BINARY:
+            return None
+        codec, text = rows[0]
+        try:
+            return _read_object(self._object_path(sha, codec, text=text == TEXT_NORMALIZED), codec, limit)
+        except OSError as e:
+            logger.warning(f"Error reading stored document {sha}: {e}")
+            return None
+
+    def read_texts(
+        self, documents: Iterable[IndexedDocument], reader: FileReader, budget: Optional[int] = None
+    ) -> Dict[str, str]:
+        """
+        Texts for ingested documents, newest first, within the reader's
+        per-file cap and `budget` bytes (default: what is left of its total
+        cap), truncated the way FileReader truncates files. The bytes loaded
+        count against the reader's total cap.
+        """
+        contents: Dict[str, str] = {}
+        remaining = reader.remaining_bytes if budget is None else min(budget, reader.remaining_bytes)
+        for document in sorted(documents, key=lambda d: d.sort_key, reverse=True):
+            # Not capped by document.size: normalized text can be longer than the raw bytes
+            limit = min(reader.max_file_bytes, remaining)
+            if limit <= 0 and document.size > 0:
+                contents[document.filename] = reader.TRUNCATION_MARKER.format(
+                    omitted=document.size, total=document.size
+                )
+                continue
+            # One byte past the limit tells whether the text was cut short
+            data = self.read_text(document.sha256, limit + 1)
+            if data is None:
+                continue
+            loaded = min(len(data), limit)
+            remaining -= loaded
+            reader.bytes_loaded += loaded
+            if len(data) <= limit:
+                contents[document.filename] = data.decode("utf-8")
+            else:
+                # The normalized length is not stored; report against the ingested size
+                total = max(document.size, limit + 1)
+                contents[document.filename] = reader.decode(
+                    data[:limit], truncated=True
+                ) + reader.TRUNCATION_MARKER.format(omitted=total - limit, total=total)
+        return contents
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class AsyncBodyReader(io.RawIOBase):
+    """
+    Blocking file object over an async byte stream (e.g. Request.stream()),
+    for store code running in a worker thread: each read waits for the next
+    chunk from the event loop, so uploads are never buffered whole.
+    """
+
+    def __init__(self, chunks: AsyncIterator[bytes], loop: asyncio.AbstractEventLoop):
+        self._chunks = chunks.__aiter__()
+        self._loop = loop
+        self._pending = b""
+        self._eof = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending:
+            if self._eof:
+                return 0
+            try:
+                self._pending = asyncio.run_coroutine_threadsafe(
+                    self._chunks.__anext__(), self._loop
+                ).result()
+            except StopAsyncIteration:
+                self._eof = True
+        count = min(len(buffer), len(self._pending))
+        buffer[:count] = self._pending[:count]
+        self._pending = self._pending[count:]
+        return count
@@ -0,0 +1,66 @@
+import re
+from datetime import datetime
+from typing import Optional
+
+# e.g. nurse-note-20251010-19.43.txt
+FILENAME_TIMESTAMP_RE = re.compile(r"(\d{8})-(\d{2})\.(\d{2})")
+
+
+def parse_filename_timestamp(filename: str) -> Optional[datetime]:
+    """Extract the YYYYMMDD-HH.MM timestamp from a filename if present"""
+    timestamp_match = FILENAME_TIMESTAMP_RE.search(filename)
+    if timestamp_match:
+        date_str = timestamp_match.group(1)
+        hour = timestamp_match.group(2)
+        minute = timestamp_match.group(3)
+
+        try:
+            return datetime.strptime(f"{date_str}{hour}{minute}", "%Y%m%d%H%M")
+        except ValueError:
+            pass
+
+    return None
+
+
+# e.g. lab-results-20251010.txt (date only)
+FILENAME_DATE_RE = re.compile(r"(?<!\d)(\d{8})(?!\d)")
+# Filename prefix -> document type
+DOCUMENT_TYPES = {
+    "nurse-note": "nurse_note",
+    "nursing-note": "nurse_note",
+    "ward-round": "ward_note",
+    "ward-note": "ward_note",
+    "previous-ward-note": "ward_note",
+    "lab-results": "lab",
+    "lab": "lab",
+    "labs": "lab",
+    "pathology": "lab",
+    "physio-note": "physio",
+    "physio": "physio",
+    "gen-history": "history",
+    "triage": "triage",
+    "discharge": "discharge",
+}
+
+
+def parse_filename_date(filename: str) -> Optional[datetime]:
+    """Extract a YYYYMMDD date (midnight) from a filename without a time"""
+    date_match = FILENAME_DATE_RE.search(filename)
+    if date_match:
+        try:
+            return datetime.strptime(date_match.group(1), "%Y%m%d")
+        except ValueError:
+            pass
+    return None
+
+
+def infer_document_type(filename: str) -> str:
+    """Infer the document type from the filename prefix, e.g. nurse-note-... -> nurse_note"""
+    stem = filename.lower().rsplit(".", 1)[0]
+    prefix = re.split(r"[-_]?\d{8}", stem, maxsplit=1)[0].strip("-_ ")
+    if prefix in DOCUMENT_TYPES:
+        return DOCUMENT_TYPES[prefix]
+    for known, doc_type in DOCUMENT_TYPES.items():
+        if prefix.startswith(known):
+            return doc_type
+    return prefix.replace("-", "_") or "other"
@@ -0,0 +1,238 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+import re
+import logging
+import numpy as np
+from .filenames import parse_filename_date, parse_filename_timestamp
+
+logger = logging.getLogger(__name__)
+
+# A value directly after its label (or a separator), never part of a range
+# ("BGL target 6-10"), a count ("last 2 readings") or a frequency ("2x daily")
+_NOT_READING = r"(?!\.?\d)(?!\s*(?:[-–]|to\b)\s*\d)(?!\s*(?:x\b|readings?\b|times\b|targets?\b|days?\b|hours?\b|hrs?\b))"
+_NUM = rf"(\d{{1,3}}(?:\.\d+)?){_NOT_READING}"
+_SEP = r"\s*(?:AV)?\s*[:=]?\s*"
+
+# parameter -> (unit, pattern); the first group is the value
+PARAMETERS: Dict[str, Tuple[str, re.Pattern]] = {
+    "Temp": ("°C", re.compile(rf"\btemp(?:erature)?{_SEP}{_NUM}\s*(?:°\s*C\b|C\b)?", re.I)),
+    "HR": ("bpm", re.compile(rf"\b(?:HR|pulse(?: rate)?){_SEP}{_NUM}", re.I)),
+    "RR": ("/min", re.compile(rf"\b(?:RR|resp(?:iratory)? rate){_SEP}{_NUM}", re.I)),
+    "SpO2": ("%", re.compile(rf"\b(?:SpO2|sats){_SEP}{_NUM}\s*%?", re.I)),
+    "BSL": ("mmol/L", re.compile(rf"\b(?:BSL|BGL)s?{_SEP}{_NUM}(?:\s*mmol/L)?", re.I)),
+    "Na": ("mmol/L", re.compile(rf"\bNa{_SEP}{_NUM}\b")),
+    "K": ("mmol/L", re.compile(rf"\bK{_SEP}(\d(?:\.\d+)?){_NOT_READING}")),
+    "Cr": ("µmol/L", re.compile(rf"\bCr{_SEP}{_NUM}\b")),
+    "Hb": ("g/L", re.compile(rf"\bHb{_SEP}{_NUM}\b")),
+    "CRP": ("mg/L", re.compile(rf"\bCRP{_SEP}{_NUM}\b")),
+}
+BP_RE = re.compile(rf"\bBP\s*[:=]?\s*(\d{{2,3}})\s*/\s*(\d{{2,3}}){_NOT_READING}", re.I)
+# Further readings after a labelled BP on the same line ("BP 130/80 lying, 110/70 standing")
+BP_FOLLOW_RE = re.compile(rf"(?<![\d/])(\d{{2,3}})\s*/\s*(\d{{2,3}}){_NOT_READING}")
+SBP_RE = re.compile(rf"\bsystolic blood pressure{_SEP}(\d{{2,3}})", re.I)
+LINE_TIME_RE = re.compile(r"^\s*(\d{1,2})[:.](\d{2})\b")
+AT_TIME_RE = re.compile(r"@\s*(\d{1,2})(?:[:.](\d{2}))?\s*(am|pm)?", re.I)
+LINE_MARKER = "[obs {lines}: see Observation Trends]"
+
+
+class ObservationSeries:
+    """Readings of one parameter, array-backed and sorted by time"""
+
+    def __init__(self, parameter: str, unit: str, times: np.ndarray, values: np.ndarray, sources: List[str]):
+        order = np.argsort(times, kind="stable")
+        self.parameter = parameter
+        self.unit = unit
+        self.times = times[order]
+        self.values = values[order]
+        self.sources = [sources[i] for i in order]
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def trend(self, window_hours: float = 24) -> dict:
+        """min/max/last/delta over the window ending at the latest reading"""
+        last_time = self.times[-1]
+        mask = self.times >= last_time - np.timedelta64(int(window_hours * 60), "m")
+        values = self.values[mask]
+        return {
+            "min": float(values.min()),
+            "max": float(values.max()),
+            "last": float(values[-1]),
+            "last_time": last_time.astype(datetime),
+            "delta": float(values[-1] - values[0]),
+            "count": int(mask.sum()),
+            "values": values,
+            "sources": [s for s, keep in zip(self.sources, mask) if keep],
+        }
+
+
+class ObservationSet:
+    def __init__(self, series: Dict[str, ObservationSeries], content: Dict[str, str], window_hours: float = 24):
+        self.series = series
+        self.content = content  # sources with reading-only lines replaced
+        self.window_hours = window_hours
+
+    def to_table(self) -> str:
+        """Compact markdown table with a back-link to every source line"""
+        window_hours = self.window_hours
+        if not self.series:
+            return ""
+        rows = [
+            f"Parameter | Last | {window_hours:g}h min-max | {window_hours:g}h delta | n | Sources",
+            "--- | --- | --- | --- | --- | ---",
+        ]
+        seen_links: Dict[str, str] = {}
+        for name, series in self.series.items():
+            t = series.trend(window_hours)
+            sources: Dict[str, List[str]] = {}
+            for source in t["sources"]:
+                filename, line = source.rsplit(":", 1)
+                sources.setdefault(filename, []).append(line)
+            links = "; ".join(f"{filename}:{','.join(lines)}" for filename, lines in sources.items())
+            # Vitals recorded on one line share their sources; list them once
+            if links in seen_links:
+                links = f"as {seen_links[links]}"
+            else:
+                seen_links[links] = name
+            rows.append(
+                f"{name} ({series.unit}) | {t['last']:g} @ {t['last_time']:%d/%m %H:%M} | "
+                f"{t['min']:g}-{t['max']:g} | {t['delta']:+g} | {t['count']} | {links}"
+            )
+        return "\n".join(rows)
+
+
+class ObservationExtractor:
+    """
+    Pull vitals, BSLs and common lab values out of source text.
+
+    Each reading is timed from the document's filename timestamp, adjusted by
+    an "HH:MM -" line prefix or an "@ 2am" marker, and stored per parameter in
+    NumPy arrays. Lines made entirely of readings (plus times, separators and
+    words like "obs") are replaced in the returned content by a marker
+    pointing at the trends table, whose rows link back to them as file:Ln;
+    a [cite:file:Ln] citation is resolved to the original line (see
+    CitationExtractor). Any line with other text is kept verbatim.
+    """
+
+    def extract(self, medical_content: Dict[str, str], window_hours: float = 24) -> ObservationSet:
+        readings: Dict[str, List[Tuple[datetime, float, str]]] = {}
+        # (filename, line number) -> readings on lines that hold nothing else
+        reading_only_lines: Dict[Tuple[str, int], List[Tuple[str, datetime]]] = {}
+
+        for filename, text in medical_content.items():
+            document_time = parse_filename_timestamp(filename)
+            # A date-only filename gives midnight, not when the note was written
+            timed = document_time is not None
+            document_time = document_time or parse_filename_date(filename)
+            if document_time is None:
+                continue
+            for number, line in enumerate(text.splitlines(), 1):
+                found, spans = self._parse_line(line)
+                if not found:
+                    continue
+                when = self._reading_time(line, document_time, timed)
+                source = f"{filename}:L{number}"
+                for parameter, value in found:
+                    readings.setdefault(parameter, []).append((when, value, source))
+                if not self._residual(line, spans):
+                    reading_only_lines[(filename, number)] = [(parameter, when) for parameter, _ in found]
+
+        series = {}
+        for parameter in [*PARAMETERS, "SBP", "DBP"]:
+            if parameter not in readings:
+                continue
+            times, values, sources = zip(*readings[parameter])
+            unit = "mmHg" if parameter in ("SBP", "DBP") else PARAMETERS[parameter][0]
+            series[parameter] = ObservationSeries(
+                parameter,
+                unit,
+                np.array(times, dtype="datetime64[m]"),
+                np.array(values, dtype=np.float64),
+                list(sources),
+            )
+
+        # Only drop a line when every reading on it is shown in the table window
+        window = np.timedelta64(int(window_hours * 60), "m")
+        cutoffs = {name: (s.times[-1] - window).astype(datetime) for name, s in series.items()}
+        content: Dict[str, str] = {}
+        for filename, text in medical_content.items():
+            lines = text.splitlines(keepends=True)
+            output: List[str] = []
+            run: List[int] = []  # consecutive replaced line numbers
+            for number, line in enumerate(lines, 1):
+                found = reading_only_lines.get((filename, number))
+                if found and all(when >= cutoffs[parameter] for parameter, when in found):
+                    run.append(number)
+                    continue
+                if run:
+                    output.append(self._marker(run))
+                    run = []
+                output.append(line)
+            if run:
+                output.append(self._marker(run))
+            content[filename] = "".join(output)
+
+        logger.info(f"Extracted {sum(len(s) for s in series.values())} readings across {len(series)} parameters")
+        return ObservationSet(series, content, window_hours)
+
+    @staticmethod
+    def _marker(numbers: List[int]) -> str:
+        lines = f"L{numbers[0]}" if len(numbers) == 1 else f"L{numbers[0]}-{numbers[-1]}"
+        return LINE_MARKER.format(lines=lines) + "\n"
+
+    @staticmethod
+    def _parse_line(line: str) -> Tuple[List[Tuple[str, float]], List[Tuple[int, int]]]:
+        found: List[Tuple[str, float]] = []
+        spans: List[Tuple[int, int]] = []
+        for match in BP_RE.finditer(line):
+            found += [("SBP", float(match.group(1))), ("DBP", float(match.group(2)))]
+            spans.append(match.span())
+        if spans:
+            for match in BP_FOLLOW_RE.finditer(line, spans[0][1]):
+                if any(start <= match.start() < end for start, end in spans):
+                    continue
+                found += [("SBP", float(match.group(1))), ("DBP", float(match.group(2)))]
+                spans.append(match.span())
+        for match in SBP_RE.finditer(line):
+            found.append(("SBP", float(match.group(1))))
+            spans.append(match.span())
+        for parameter, (_, pattern) in PARAMETERS.items():
+            for match in pattern.finditer(line):
+                if any(start <= match.start(1) < end for start, end in spans):
+                    continue
+                found.append((parameter, float(match.group(1))))
+                spans.append(match.span())
+        return found, spans
+
+    @staticmethod
+    def _residual(line: str, spans: List[Tuple[int, int]]) -> int:
+        kept = list(line)
+        for start, end in spans:
+            kept[start:end] = [" "] * (end - start)
+        residual = re.sub(
+            r"\b(?:obs|vitals?|AV|mmol/L|lying|sitting|standing)\b|\d{1,2}:\d{2}|[^A-Za-z]",
+            "",
+            "".join(kept),
+            flags=re.I,
+        )
+        return len(residual)
+
+    @staticmethod
+    def _reading_time(line: str, document_time: datetime, timed: bool = True) -> datetime:
+        match = LINE_TIME_RE.match(line)
+        hour = minute = None
+        if match:
+            hour, minute = int(match.group(1)), int(match.group(2))
+        else:
+            match = AT_TIME_RE.search(line)
+            if match:
+                hour, minute = int(match.group(1)) % 12 if match.group(3) else int(match.group(1)), int(match.group(2) or 0)
+                if (match.group(3) or "").lower() == "pm":
+                    hour += 12
+        if hour is None or hour > 23 or minute > 59:
+            return document_time
+        when = document_time.replace(hour=hour, minute=minute)
+        # A reading timed after the note was written belongs to the previous day
+        if timed and when > document_time + timedelta(hours=1):
+            when -= timedelta(days=1)
+        return when
@@ -0,0 +1,121 @@
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+import os
+import re
+import threading
+import logging
+from pydantic import BaseModel
+from .document_index import DocumentIndex
+
+logger = logging.getLogger(__name__)
+
+PATIENT_ID_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]{0,127}$")
+
+
+class UnknownPatientError(LookupError):
+    pass
+
+
+class PatientSummary(BaseModel):
+    patient_id: str
+    file_count: int
+    total_bytes: int
+    latest_timestamp: Optional[datetime] = None
+    latest_document: Optional[str] = None
+
+
+class PatientRegistry:
+    """
+    Patient (or encounter) folders under one root directory.
+
+    A root holding files directly is the legacy flat layout and is served as
+    a single folder. The catalog is refreshed from one scandir of the root:
+    a patient folder is only re-indexed when its directory mtime changed
+    (files added, removed or renamed), or when a request refreshes its index.
+    """
+
+    def __init__(self, root: Path, index_for: Callable[[Path], DocumentIndex]):
+        self.root = Path(root).expanduser().resolve()
+        self.index_for = index_for
+        self._catalog: Dict[str, Tuple[int, PatientSummary]] = {}  # id -> (dir mtime_ns, summary)
+        self._lock = threading.Lock()
+
+    def directory(self, patient_id: Optional[str]) -> Path:
+        """Folder to load for a patient; the root itself when no patient is given"""
+        if not patient_id:
+            return self.root
+        if not PATIENT_ID_RE.match(patient_id):
+            raise UnknownPatientError(f"Invalid patientId: {patient_id!r}")
+        directory = self.root / patient_id
+        if not directory.is_dir():
+            raise UnknownPatientError(f"No folder for patient {patient_id}")
+        return directory
+
+    def create(self, patient_id: Optional[str]) -> Path:
+        """Folder for a patient, created if needed (documents can be ingested before any file exists)"""
+        if not patient_id:
+            return self.root
+        if not PATIENT_ID_RE.match(patient_id):
+            raise UnknownPatientError(f"Invalid patientId: {patient_id!r}")
+        directory = self.root / patient_id
+        directory.mkdir(parents=True, exist_ok=True)
+        return directory
+
+    def patient_ids(self) -> List[str]:
+        if not self.root.exists():
+            return []
+        with os.scandir(self.root) as entries:
+            return sorted(
+                entry.name for entry in entries if entry.is_dir() and PATIENT_ID_RE.match(entry.name)
+            )
+
+    def targets(self) -> List[Path]:
+        """Every patient folder, or the root in the flat layout"""
+        patient_ids = self.patient_ids()
+        return [self.root / patient_id for patient_id in patient_ids] if patient_ids else [self.root]
+
+    @staticmethod
+    def summarize(patient_id: str, index: DocumentIndex) -> PatientSummary:
+        documents = index.documents()
+        latest = documents[-1] if documents else None
+        return PatientSummary(
+            patient_id=patient_id,
+            file_count=len(documents),
+            total_bytes=sum(d.size for d in documents),
+            latest_timestamp=latest.timestamp if latest else None,
+            latest_document=latest.filename if latest else None,
+        )
+
+    def record(self, directory: Path, index: DocumentIndex):
+        """Update a catalog entry from an index a request just refreshed"""
+        directory = Path(directory).resolve()
+        if directory.parent != self.root:
+            return
+        try:
+            mtime_ns = directory.stat().st_mtime_ns
+        except OSError:
+            return
+        with self._lock:
+            self._catalog[directory.name] = (mtime_ns, self.summarize(directory.name, index))
+
+    def catalog(self) -> List[PatientSummary]:
+        if not self.root.exists():
+            return []
+        seen = set()
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if not entry.is_dir() or not PATIENT_ID_RE.match(entry.name):
+                    continue
+                seen.add(entry.name)
+                mtime_ns = entry.stat().st_mtime_ns
+                cached = self._catalog.get(entry.name)
+                if cached and cached[0] == mtime_ns:
+                    continue
+                summary = self.summarize(entry.name, self.index_for(Path(entry.path)))
+                with self._lock:
+                    self._catalog[entry.name] = (mtime_ns, summary)
+        with self._lock:
+            for patient_id in [p for p in self._catalog if p not in seen]:
+                del self._catalog[patient_id]
+            return [summary for _, summary in sorted(self._catalog.values(), key=lambda c: c[1].patient_id)]
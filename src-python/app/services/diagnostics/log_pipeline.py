@@ -0,0 +1,159 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+
+# Per-request context; copied into tasks and asyncio.to_thread workers
+thread_id_var: ContextVar[str] = ContextVar("thread_id", default="-")
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s [%(thread_id)s %(request_id)s] %(message)s"
+
+_listener: Optional[QueueListener] = None
+_lock = threading.Lock()
+
+
+@contextmanager
+def log_context(thread_id: Optional[str] = None, request_id: Optional[str] = None):
+    """
+    Tag every log record emitted inside the block with the request's ids.
+    Nested blocks keep the enclosing request id unless given a new one.
+    """
+    current = request_id_var.get()
+    tokens = [
+        thread_id_var.set(thread_id or thread_id_var.get()),
+        request_id_var.set(request_id or (current if current != "-" else uuid.uuid4().hex[:8])),
+    ]
+    try:
+        yield request_id_var.get()
+    finally:
+        request_id_var.reset(tokens[1])
+        thread_id_var.reset(tokens[0])
+
+
+class ContextFilter(logging.Filter):
+    """Copy the request context onto the record before it leaves the caller"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.thread_id = thread_id_var.get()
+        record.request_id = request_id_var.get()
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Token bucket per call site for DEBUG/INFO records.
+
+    Per-item lines (one per file, one per citation) are allowed `rate` per
+    second with bursts of `burst`; the next record that passes reports how
+    many were dropped. Warnings and errors are never limited.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self._buckets: Dict[Tuple[str, int], list] = {}  # site -> [tokens, last, dropped]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.rate <= 0:
+            return True
+        with self._lock:
+            return self._take(record)
+
+    def _take(self, record: logging.LogRecord) -> bool:
+        now = time.monotonic()
+        bucket = self._buckets.setdefault((record.pathname, record.lineno), [self.burst, now, 0])
+        bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if bucket[0] < 1:
+            bucket[2] += 1
+            return False
+        bucket[0] -= 1
+        if bucket[2]:
+            record.msg = f"{record.msg} (+{bucket[2]} similar suppressed)"
+            bucket[2] = 0
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread_id": getattr(record, "thread_id", "-"),
+            "request_id": getattr(record, "request_id", "-"),
+            "msg": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def configure_logging() -> QueueListener:
+    """
+    Route all logging through a queue drained by a background thread.
+
+    Callers on the event loop only format the record and enqueue it; stream
+    and file I/O happen in the listener thread. Configured from env:
+      SIDECAR_LOG_LEVEL    root level (INFO)
+      SIDECAR_LOG_FORMAT   "text" or "json"
+      SIDECAR_LOG_FILE     optional file written alongside stderr
+      SIDECAR_LOG_RATE     DEBUG/INFO records per second per call site (20, 0 = unlimited)
+    """
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return _listener
+
+        level = os.getenv("SIDECAR_LOG_LEVEL", "INFO").upper()
+        rate = float(os.getenv("SIDECAR_LOG_RATE", "20"))
+        formatter = (
+            JsonFormatter()
+            if os.getenv("SIDECAR_LOG_FORMAT", "text").lower() == "json"
+            else logging.Formatter(TEXT_FORMAT)
+        )
+        handlers = [logging.StreamHandler()]
+        log_file = os.getenv("SIDECAR_LOG_FILE")
+        if log_file:
+            path = Path(log_file).expanduser()
+            path.parent.mkdir(parents=True, exist_ok=True)
+            handlers.append(logging.FileHandler(path, encoding="utf-8"))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        queue_handler = QueueHandler(log_queue)
+        queue_handler.addFilter(ContextFilter())
+        queue_handler.addFilter(RateLimitFilter(rate, burst=max(1, int(rate))))
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(queue_handler)
+        root.setLevel(level)
+
+        _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+        return _listener
+
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
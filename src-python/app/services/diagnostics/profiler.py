@@ -0,0 +1,225 @@
+from collections import Counter
+from contextlib import asynccontextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+import asyncio
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+import logging
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_INTERVAL = float(os.getenv("SIDECAR_PROFILE_INTERVAL_MS", "5")) / 1000
+LAG_INTERVAL = 0.01
+SLOW_CALLBACK = float(os.getenv("SIDECAR_PROFILE_SLOW_MS", "50")) / 1000
+KEEP = int(os.getenv("SIDECAR_PROFILE_KEEP", "20"))
+MAX_DEPTH = 128
+TOP_FUNCTIONS = 25
+CAPTURE_ID_RE = re.compile(r"^[0-9]{8}-[0-9]{6}-[0-9a-f]{8}$")
+STREAM_THREAD_PREFIX = "llm-stream "
+
+
+def stream_thread_name(thread_id: str) -> str:
+    """Name for a generation's LLM stream thread, so a capture can tell it from others"""
+    return STREAM_THREAD_PREFIX + thread_id
+
+
+def profile_dir() -> Path:
+    return Path(
+        os.getenv("SIDECAR_PROFILE_DIR", str(Path.home() / "tmp" / "anton-sidecar" / "profiles"))
+    ).expanduser()
+
+
+def profiling_requested(note_options: dict) -> bool:
+    """noteOptions.profile, or SIDECAR_PROFILE=1 to profile every generation"""
+    return bool(note_options.get("profile")) or os.getenv("SIDECAR_PROFILE") == "1"
+
+
+class LoopBlock(BaseModel):
+    at_ms: float  # offset from the start of the capture
+    duration_ms: float
+
+
+class CaptureSummary(BaseModel):
+    id: str
+    thread_id: str
+    doc_type: str
+    started_at: datetime
+    duration_ms: float
+    samples: int
+    sample_interval_ms: float
+    loop_blocked_ms: float
+    loop_blocks: List[LoopBlock]
+    top_functions: List[dict]  # {"frame", "self", "total"} in samples
+    # Other generations streaming during the capture; their threads are not sampled
+    other_generations: int = 0
+    error: Optional[str] = None
+
+
+class _Sampler(threading.Thread):
+    """
+    Samples stacks with sys._current_frames(): the loop thread, the capture's
+    own LLM stream thread, and threads started during the capture. Threads
+    that already existed, and other generations' stream threads, are left
+    out; the other streams seen are counted instead.
+    """
+
+    def __init__(self, interval: float, thread_id: str):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.other_streams: set = set()
+        # Created on the loop thread, by profile_capture
+        self._loop_ident = threading.get_ident()
+        self._stream_name = stream_thread_name(thread_id)
+        self._existing = {thread.ident for thread in threading.enumerate()}
+        self._stop_event = threading.Event()
+
+    def _includes(self, ident: int, name: str) -> bool:
+        if name.startswith(STREAM_THREAD_PREFIX) and name != self._stream_name:
+            self.other_streams.add(name)
+            return False
+        return ident == self._loop_ident or name == self._stream_name or ident not in self._existing
+
+    def run(self):
+        self._existing.add(threading.get_ident())
+        while not self._stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if not self._includes(ident, names.get(ident, "")):
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_DEPTH:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+async def _monitor_loop_lag(blocks: List[LoopBlock], origin: float):
+    """Record every stretch where the event loop could not run this task on time"""
+    while True:
+        expected = time.perf_counter() + LAG_INTERVAL
+        await asyncio.sleep(LAG_INTERVAL)
+        lag = time.perf_counter() - expected
+        if lag >= SLOW_CALLBACK:
+            blocks.append(LoopBlock(at_ms=(expected - origin) * 1000, duration_ms=lag * 1000))
+
+
+class ProfileStore:
+    """
+    Captures on disk: <id>.json summary plus <id>.collapsed stacks. Each save
+    prunes all but the newest `keep` (SIDECAR_PROFILE_KEEP, default 20).
+    """
+
+    def __init__(self, directory: Optional[Path] = None, keep: int = KEEP):
+        self.directory = Path(directory) if directory else profile_dir()
+        self.keep = keep
+
+    def path(self, capture_id: str, suffix: str) -> Optional[Path]:
+        if not CAPTURE_ID_RE.match(capture_id):
+            return None
+        path = self.directory / f"{capture_id}{suffix}"
+        return path if path.exists() else None
+
+    def save(self, summary: CaptureSummary, stacks: Counter):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Brendan Gregg's collapsed format: "root;child;leaf count", one stack per line
+        collapsed = "".join(f"{';'.join(stack)} {count}\n" for stack, count in stacks.most_common())
+        (self.directory / f"{summary.id}.collapsed").write_text(collapsed, encoding="utf-8")
+        (self.directory / f"{summary.id}.json").write_text(summary.model_dump_json(indent=2), encoding="utf-8")
+        self._prune()
+
+    def list(self, limit: Optional[int] = None) -> List[CaptureSummary]:
+        if not self.directory.exists():
+            return []
+        paths = sorted(self.directory.glob("*.json"), reverse=True)[: limit or self.keep]
+        summaries = []
+        for path in paths:
+            try:
+                summaries.append(CaptureSummary.model_validate_json(path.read_text(encoding="utf-8")))
+            except Exception as e:
+                logger.warning(f"Skipping unreadable profile {path.name}: {e}")
+        return summaries
+
+    def _prune(self):
+        for path in sorted(self.directory.glob("*.json"), reverse=True)[self.keep:]:
+            path.unlink(missing_ok=True)
+            path.with_suffix(".collapsed").unlink(missing_ok=True)
+
+
+def _top_functions(stacks: Counter) -> List[dict]:
+    self_counts: Counter = Counter()
+    total_counts: Counter = Counter()
+    for stack, count in stacks.items():
+        self_counts[stack[-1]] += count
+        for frame in set(stack[1:]):
+            total_counts[frame] += count
+    return [
+        {"frame": frame, "self": self_counts[frame], "total": total}
+        for frame, total in total_counts.most_common(TOP_FUNCTIONS)
+    ]
+
+
+@asynccontextmanager
+async def profile_capture(thread_id: str, doc_type: str, store: Optional[ProfileStore] = None):
+    """
+    Profile one generation: a stack sampler over the loop, the generation's
+    LLM stream thread and worker threads started during the capture, plus a
+    loop-lag monitor for blocking callbacks. Work on pool threads that
+    existed before is not sampled, since other generations share them.
+    Only entered when profiling_requested(), so nothing runs otherwise.
+    """
+    store = store or ProfileStore()
+    started_at = datetime.now()
+    capture_id = f"{started_at:%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}"
+    origin = time.perf_counter()
+    blocks: List[LoopBlock] = []
+    sampler = _Sampler(SAMPLE_INTERVAL, thread_id)
+    sampler.start()
+    monitor = asyncio.create_task(_monitor_loop_lag(blocks, origin))
+    error = None
+    try:
+        yield capture_id
+    except BaseException as e:
+        error = repr(e)
+        raise
+    finally:
+        monitor.cancel()
+        sampler.stop()
+        summary = CaptureSummary(
+            id=capture_id,
+            thread_id=thread_id,
+            doc_type=doc_type,
+            started_at=started_at,
+            duration_ms=(time.perf_counter() - origin) * 1000,
+            samples=sampler.samples,
+            sample_interval_ms=SAMPLE_INTERVAL * 1000,
+            loop_blocked_ms=sum(block.duration_ms for block in blocks),
+            loop_blocks=blocks,
+            top_functions=_top_functions(sampler.stacks),
+            other_generations=len(sampler.other_streams),
+            error=error,
+        )
+        try:
+            await asyncio.to_thread(store.save, summary, sampler.stacks)
+            logger.info(
+                f"Profile {capture_id}: {summary.duration_ms:.0f} ms, {summary.samples} samples, "
+                f"loop blocked {summary.loop_blocked_ms:.0f} ms, "
+                f"{summary.other_generations} other generations streaming"
+            )
+        except Exception as e:
+            logger.error(f"Failed to save profile {capture_id}: {e}")
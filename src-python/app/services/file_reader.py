@@ -1,41 +1,244 @@
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import codecs
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+# Bytes that may appear in text; anything else in a sample counts as a control byte
+_TEXT_BYTES = bytes({8, 9, 10, 12, 13, 27} | set(range(32, 256)))
+
+
 class FileReader:
     # Default to ~/tmp/medical-files on Ubuntu, fallback to /srv/medical_files
     DEFAULT_DIR = Path.home() / "tmp" / "medical-files"
 
-    def __init__(self, directory: str | None = None):
+    # Per-file and per-request byte caps (override via env)
+    MAX_FILE_BYTES = _env_int("MEDICAL_FILE_MAX_BYTES", 2 * 1024 * 1024)
+    MAX_TOTAL_BYTES = _env_int("MEDICAL_TOTAL_MAX_BYTES", 16 * 1024 * 1024)
+    MAX_WORKERS = _env_int("MEDICAL_READ_WORKERS", 8)
+    # Below this many planned bytes, files are read on the calling thread;
+    # a pool costs more than it saves on a folder of small notes
+    POOL_MIN_BYTES = 8 * 1024 * 1024
+    SNIFF_BYTES = 8192
+    TRUNCATION_MARKER = "\n[... truncated: {omitted} of {total} bytes not loaded ...]\n"
+
+    def __init__(
+        self,
+        directory: str | None = None,
+        max_file_bytes: Optional[int] = None,
+        max_total_bytes: Optional[int] = None,
+        max_workers: Optional[int] = None,
+    ):
         # Use provided directory, or fall back to default
         if directory:
             self.directory = Path(directory).expanduser().resolve()
         else:
             self.directory = self.DEFAULT_DIR.expanduser().resolve()
-        
-    def read_file(self, file_path: Path) -> str:
+        self.max_file_bytes = max_file_bytes or self.MAX_FILE_BYTES
+        self.max_total_bytes = max_total_bytes or self.MAX_TOTAL_BYTES
+        self.max_workers = max_workers or self.MAX_WORKERS
+        # Bytes loaded so far; max_total_bytes caps everything this reader
+        # loads, files and stored documents alike
+        self.bytes_loaded = 0
+
+    @property
+    def remaining_bytes(self) -> int:
+        return max(0, self.max_total_bytes - self.bytes_loaded)
+
+    @staticmethod
+    def is_binary(sample: bytes) -> bool:
+        """Heuristic: NUL bytes (outside UTF-16 text) or mostly control bytes"""
+        if not sample:
+            return False
+        if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+            return False
+        if b"\x00" in sample:
+            return True
+        control = len(sample.translate(None, _TEXT_BYTES))
+        return control / len(sample) > 0.1
+
+    @staticmethod
+    def encoding_of(data: bytes) -> str:
+        """Encoding named by a BOM at the start of `data`, else UTF-8"""
+        for bom, encoding in (
+            (codecs.BOM_UTF8, "utf-8-sig"),
+            (codecs.BOM_UTF16_LE, "utf-16"),
+            (codecs.BOM_UTF16_BE, "utf-16"),
+        ):
+            if data.startswith(bom):
+                return encoding
+        return "utf-8"
+
+    @classmethod
+    def decode(cls, data: bytes, truncated: bool = False) -> str:
+        """Decode text using its BOM, else UTF-8, else Windows-1252"""
+        encoding = cls.encoding_of(data)
         try:
-            with open(file_path, 'r') as file:
-                return file.read()
-        except Exception as e:
-            print(f"Error reading file {file_path}: {e}")
-            return ""
+            if not truncated:
+                return data.decode(encoding)
+            # An incremental decoder tolerates a multi-byte character cut by truncation
+            decoder = codecs.getincrementaldecoder(encoding)(errors="strict")
+            return decoder.decode(data, final=False)
+        except UnicodeDecodeError:
+            return data.decode("cp1252", errors="replace")
 
-    def read_all_files(self) -> dict[str, str]:
-        file_contents: dict[str, str] = {}
-        dir_path = Path(self.directory)
+    def read_file(
+        self, file_path: str | Path, limit: Optional[int] = None, size: Optional[int] = None
+    ) -> Optional[str]:
+        """
+        Read one text file, truncated to `limit` bytes; None if binary or
+        unreadable. The file is opened once: the binary sniff is the start of
+        the read. `size` saves the stat when the caller already has it.
+        """
+        limit = min(limit or self.max_file_bytes, self.max_file_bytes)
+        try:
+            with open(file_path, "rb") as file:
+                if size is None:
+                    size = os.fstat(file.fileno()).st_size
+                sniff = min(self.SNIFF_BYTES, limit)
+                data = file.read(sniff)
+                if self.is_binary(data):
+                    logger.info(f"Skipping binary file {file_path}")
+                    return None
+                if len(data) == sniff < limit:
+                    data += file.read(limit - sniff)
+        except OSError as e:
+            logger.warning(f"Error reading file {file_path}: {e}")
+            return None
+        truncated = size > len(data)
+        text = self.decode(data, truncated=truncated)
+        if truncated:
+            text += self.TRUNCATION_MARKER.format(omitted=size - len(data), total=size)
+        return text
 
+    def _marker(self, path: str, size: int) -> Optional[str]:
+        """Truncation marker for a text file left without budget; None if binary or unreadable"""
+        try:
+            with open(path, "rb") as file:
+                sample = file.read(self.SNIFF_BYTES)
+        except OSError as e:
+            logger.warning(f"Error reading file {path}: {e}")
+            return None
+        if self.is_binary(sample):
+            logger.info(f"Skipping binary file {path}")
+            return None
+        return self.TRUNCATION_MARKER.format(omitted=size, total=size)
+
+    def list_files(self) -> List[os.DirEntry]:
+        dir_path = Path(self.directory)
         if not dir_path.exists():
-            print(f"Directory does not exist: {dir_path}")
-            return file_contents
+            logger.warning(f"Directory does not exist: {dir_path}")
+            return []
 
         # Optional: quick permission check (readable)
         if not os.access(str(dir_path), os.R_OK):
-            print(f"Insufficient permissions to read directory: {dir_path}")
-            return file_contents
-
-        for file_path in dir_path.glob('*'):
-            if file_path.is_file():
-                content = self.read_file(file_path)
-                file_contents[file_path.name] = content
-        
-        return file_contents
\ No newline at end of file
+            logger.warning(f"Insufficient permissions to read directory: {dir_path}")
+            return []
+
+        with os.scandir(dir_path) as entries:
+            return [entry for entry in entries if entry.is_file()]
+
+    def read_files(self, entries: Iterable[os.DirEntry]) -> dict[str, str]:
+        """Read directory entries (see read_paths), using the stat scandir cached"""
+        files = []
+        for entry in entries:
+            stat = entry.stat()
+            files.append((entry.name, entry.path, stat.st_size, stat.st_mtime_ns))
+        return self._read_planned(files)
+
+    def read_paths(self, paths: Iterable[Path], budget: Optional[int] = None) -> dict[str, str]:
+        """
+        Read files concurrently within the per-file cap and `budget` bytes
+        (default: what is left of the total cap).
+
+        The budget goes to the most recently modified files first; files
+        left without budget are represented by a truncation marker only.
+        """
+        files = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError as e:
+                logger.warning(f"Error reading file {path}: {e}")
+                continue
+            files.append((Path(path).name, str(path), stat.st_size, stat.st_mtime_ns))
+        return self._read_planned(files, budget)
+
+    def read_indexed(self, documents: Iterable, budget: Optional[int] = None) -> dict[str, str]:
+        """read_paths for indexed documents, using their recorded size and mtime_ns"""
+        return self._read_planned(
+            [(os.path.basename(d.path), d.path, d.size, d.mtime_ns) for d in documents], budget
+        )
+
+    def _map(self, fn: Callable, items: list, planned_bytes: int) -> list:
+        """(item, fn(item)) pairs, computed on up to max_workers threads"""
+        # One batch per worker, interleaved so large files spread evenly; a
+        # future per file costs more than reading a small note. Decoding
+        # holds the GIL, so threads beyond the CPU count only add overhead.
+        workers = max(1, min(self.max_workers, os.cpu_count() or 1, len(items)))
+        if workers == 1 or planned_bytes < self.POOL_MIN_BYTES:
+            return [(item, fn(item)) for item in items]
+        batches = [items[i::workers] for i in range(workers)]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(lambda batch: [(item, fn(item)) for item in batch], batches)
+            return [pair for batch in results for pair in batch]
+
+    def _read_planned(
+        self, files: List[Tuple[str, str, int, int]], budget: Optional[int] = None
+    ) -> dict[str, str]:
+        # name -> [path, limit, size], newest first. Binary and unreadable
+        # files are only found when read; the budget they held is handed on
+        # below.
+        planned: Dict[str, list] = {}
+        remaining = self.remaining_bytes if budget is None else min(budget, self.remaining_bytes)
+        for name, path, size, _ in sorted(files, key=lambda f: f[3], reverse=True):
+            limit = min(size, self.max_file_bytes, remaining)
+            remaining -= limit
+            planned[name] = [path, limit, size]
+
+        def read(name: str) -> Optional[str]:
+            path, limit, size = planned[name]
+            if limit <= 0 and size > 0:
+                return self._marker(path, size)
+            return self.read_file(path, limit or None, size)
+
+        total = sum(limit for _, limit, _ in planned.values())
+        contents: Dict[str, Optional[str]] = dict(self._map(read, list(planned), total))
+        # Budget held by files that still failed to read goes to the newest
+        # files that were cut short, until nothing more can be placed.
+        while True:
+            freed = sum(planned[name][1] for name, text in contents.items() if text is None)
+            for name in [name for name, text in contents.items() if text is None]:
+                planned[name][1] = 0
+            short = [
+                name
+                for name, text in contents.items()
+                if text is not None and planned[name][1] < min(planned[name][2], self.max_file_bytes)
+            ]
+            if not freed or not short:
+                break
+            for name in short:
+                extra = min(freed, min(planned[name][2], self.max_file_bytes) - planned[name][1])
+                planned[name][1] += extra
+                freed -= extra
+                if not freed:
+                    break
+            regrown = [name for name in short if planned[name][1] > 0]
+            contents.update(self._map(read, regrown, total))
+
+        self.bytes_loaded += sum(planned[name][1] for name, text in contents.items() if text is not None)
+        return {name: text for name, text in sorted(contents.items()) if text is not None}
+
+    def read_all_files(self) -> dict[str, str]:
+        return self.read_files(self.list_files())
@@ -0,0 +1,72 @@
+from typing import AsyncIterator, Iterable, Optional
+import asyncio
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class ThreadedStream(AsyncIterator[str]):
+    """
+    Drive a blocking delta iterator (e.g. ModelClient.stream_chat) from a
+    dedicated thread and hand the deltas to the event loop, so several
+    generations can stream concurrently without stalling the loop.
+    """
+
+    def __init__(self, iterable: Iterable[str], name: str = "llm-stream"):
+        self._loop = asyncio.get_running_loop()
+        # (item or _DONE, error raised by the iterator)
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(
+            target=self._produce, args=(iterable,), name=name, daemon=True
+        )
+        self._thread.start()
+
+    def _put(self, item, error: Optional[BaseException] = None):
+        try:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, (item, error))
+        except RuntimeError:
+            # Event loop already closed; nobody is listening any more
+            self._closed.set()
+
+    def _produce(self, iterable: Iterable[str]):
+        iterator = iter(iterable)
+        error = None
+        try:
+            for item in iterator:
+                if self._closed.is_set():
+                    break
+                self._put(item)
+        except BaseException as e:
+            error = e
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                try:
+                    close()
+                except Exception as e:
+                    logger.debug(f"Error closing LLM stream: {e}")
+        self._put(_DONE, error)
+
+    def __aiter__(self) -> "ThreadedStream":
+        return self
+
+    async def __anext__(self) -> str:
+        try:
+            item, error = await self._queue.get()
+        except asyncio.CancelledError:
+            # The consumer is gone; let the thread drop the provider stream
+            self._closed.set()
+            raise
+        if item is _DONE:
+            if error is not None:
+                raise error
+            raise StopAsyncIteration
+        return item
+
+    async def aclose(self):
+        """Stop consuming; the thread drops the stream at its next delta"""
+        self._closed.set()
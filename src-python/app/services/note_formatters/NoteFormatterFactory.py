@@ -1,6 +1,7 @@
 from typing import List, Dict, Type
 from models.note_types import MedicalNoteFormatter, NoteType
 from .ward_round_formatter import WardRoundFormatter
+from .discharge_formatter import DischargeFormatter
 
 
 class NoteFormatterFactory:
@@ -8,6 +9,7 @@ class NoteFormatterFactory:
 
     _formatters: Dict[NoteType, Type[MedicalNoteFormatter]] = {
         NoteType.WARD_ROUND: WardRoundFormatter,
+        NoteType.DISCHARGE: DischargeFormatter,
     }
 
     @classmethod
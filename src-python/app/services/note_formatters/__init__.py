@@ -1,4 +1,5 @@
 from .ward_round_formatter import WardRoundFormatter
+from .discharge_formatter import DischargeFormatter
 
 
-__all__ = ["WardRoundFormatter"]
+__all__ = ["WardRoundFormatter", "DischargeFormatter"]
@@ -1,9 +1,9 @@
 # services/note_formatters/ward_round.py
 from models.note_types import MedicalNoteFormatter, NoteType
-from typing import List, Dict
+from services.validation.note_validator import validate_note_text
+from typing import List, Dict, Optional
 import logging
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class WardRoundFormatter(MedicalNoteFormatter):
@@ -14,12 +14,14 @@ class WardRoundFormatter(MedicalNoteFormatter):
         return NoteType.WARD_ROUND
     
     def get_sections(self) -> List[str]:
+        # The ## headings the system prompt asks for, in order. "Staff present"
+        # is a labelled block in the header, not a section.
         return [
-            "Staff present",
             "Issues",
             "Progress",
             "Examination",
-            "Impression and Plan"
+            "Impression and Plan",
+            "References"
         ]
     
     
@@ -154,8 +156,8 @@ class WardRoundFormatter(MedicalNoteFormatter):
     2. [cite:previous-ward-note-20251009.txt:Past Medical History]
     > PMHx: COPD (diagnosed 2018), Asthma (childhood onset), Type 2 Diabetes Mellitus, Hypertension. Current medications include Trelegy Ellipta for COPD/asthma management.
 
-    3. [cite:nurse-note-20251010-19.43.txt:Vital signs]
-    > 02:00 - Temp 37.1°C, HR 82, BP 142/77, RR 18, SpO2 93%. Patient resting comfortably.
+    3. [cite:nurse-note-20251010-19.43.txt:L12]
+    > SpO2 (%) | 93 @ 10/10 02:00 | 93-96 | -3 | 3 | nurse-note-20251010-19.43.txt:L4,L8,L12
 
     4. [cite:lab-results-20251010.txt:Blood glucose levels]
     > Pre-dinner BSL: 17.5 mmol/L. Administered 3 units NovoRapid as per sliding scale. Post-meal BSL (2 hours): 14.3 mmol/L.
@@ -165,7 +167,8 @@ class WardRoundFormatter(MedicalNoteFormatter):
 
     CITATION FORMAT - CRITICAL
     Each citation in the References section MUST include:
-    1. Citation number and source: [cite:filename.ext:section]
+    1. Citation number and source: [cite:filename.ext:section], or [cite:filename.ext:L<n>]
+       for a reading from the Observation Trends table (quote its row)
     2. Exact quote from source (prefixed with >):
     - Copy the EXACT text from the source document
     - Include 1-3 sentences that directly support what you cited
@@ -243,41 +246,15 @@ class WardRoundFormatter(MedicalNoteFormatter):
 
 
     
-    def format_user_message(self, medical_content: dict[str, str], instruction: str) -> str:
+    def format_user_message(
+        self,
+        medical_content: dict[str, str],
+        instruction: str,
+        observation_table: Optional[str] = None,
+    ) -> str:
         """Format medical files with source IDs for citation tracking"""
-        
-        content_sections = []
-        for filename, content in medical_content.items():
-            # Add source markers for citation tracking
-            logger.info(f"Content of medical files - {filename}: {content[:100]}...")  # Log first 100 chars
-            content_sections.append(
-                f"<source id=\"{filename}\">\n"
-                f"<filename>{filename}</filename>\n"
-                f"<content>\n{content}\n</content>\n"
-                f"</source>\n"
-            )
-        
-        combined_content = "\n".join(content_sections)
-        
-        return f"""Based on the following medical files, {instruction}
-
-        ## Medical Source Files:
-
-        {combined_content}
-
-        """
+        return self.assemble_user_message(medical_content, instruction, observation_table)
     
     def validate_note(self, note: str) -> bool:
-        """Validate note has required sections and citations"""
-        required_sections = [
-            "### Staff present",
-            "### Issues",
-            "### Progress",
-            "### Examination",
-            "### Impression and Plan"
-        ]
-        
-        has_sections = all(section in note for section in required_sections)
-        has_citations = "[cite:" in note  # Check for at least some citations
-        
-        return has_sections and has_citations
+        """Validate note section order, citation syntax and references"""
+        return validate_note_text(note, self.get_sections()).is_valid
@@ -0,0 +1,394 @@
+from datetime import date, datetime, time as dtime, timedelta
+from hashlib import sha1
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+from pydantic import BaseModel, field_validator
+from services.diagnostics.log_pipeline import log_context
+from services.streams.wire_protocol import NoteCompleteFrame
+
+logger = logging.getLogger(__name__)
+
+# noteOptions that do not change the generated note
+VOLATILE_OPTIONS = {"profile", "regenerate"}
+CHECK_INTERVAL = 30.0
+# An unfinished job slot not renewed for this long belongs to a crashed worker
+SLOT_LEASE = timedelta(minutes=15)
+# A job whose time passed while the sidecar was down still runs this long after
+CATCH_UP = timedelta(hours=float(os.getenv("SIDECAR_PREGENERATE_CATCH_UP_HOURS", "3")))
+# Pre-generated notes older than this are never served
+MAX_AGE = timedelta(hours=float(os.getenv("SIDECAR_PRECOMPUTED_MAX_AGE_HOURS", "12")))
+
+
+def options_key(doc_type: str, note_options: dict) -> str:
+    options = {k: v for k, v in note_options.items() if k not in VOLATILE_OPTIONS}
+    canonical = json.dumps([doc_type, options], sort_keys=True, separators=(",", ":"))
+    return sha1(canonical.encode("utf-8")).hexdigest()
+
+
+class PregenerationJob(BaseModel):
+    at: str  # "HH:MM", local time
+    docType: str = "ward_round"
+    noteOptions: dict = {}
+    name: Optional[str] = None
+
+    @field_validator("at")
+    @classmethod
+    def _check_time(cls, value: str) -> str:
+        datetime.strptime(value, "%H:%M")
+        return value
+
+    @property
+    def label(self) -> str:
+        return self.name or f"{self.docType}@{self.at}"
+
+    def due_at(self, day: date) -> datetime:
+        return datetime.combine(day, dtime.fromisoformat(self.at))
+
+
+class PrecomputedNote(BaseModel):
+    directory: str
+    doc_type: str
+    options_key: str
+    fingerprint: str  # DocumentIndex.fingerprint() of the folder when generated
+    markdown: str
+    note_complete: str  # NoteCompleteFrame JSON
+    validation: Optional[str] = None  # validation frame JSON
+    created_at: datetime
+    stale: bool = False
+
+    def frames(self) -> list:
+        """The usual chunk/note_complete/done sequence, delivered in one go"""
+        frames: list = [
+            {"type": "precomputed", "generatedAt": self.created_at.isoformat()},
+            {"type": "chunk", "content": self.markdown},
+            NoteCompleteFrame.model_validate_json(self.note_complete),
+        ]
+        if self.validation:
+            frames.append(json.loads(self.validation))
+        frames.append({"type": "done"})
+        return frames
+
+
+def load_jobs() -> List[PregenerationJob]:
+    """
+    Jobs from SIDECAR_PREGENERATE: a JSON list, or a path to a JSON file, e.g.
+    [{"at": "06:30", "docType": "ward_round",
+      "noteOptions": {"instruction": "Generate ward round note"}}]
+    """
+    raw = os.getenv("SIDECAR_PREGENERATE", "").strip()
+    if not raw:
+        return []
+    if not raw.startswith("["):
+        raw = Path(raw).expanduser().read_text(encoding="utf-8")
+    return [PregenerationJob.model_validate(job) for job in json.loads(raw)]
+
+
+class RecordingSink:
+    """
+    Null socket for the normal note pipeline: it accepts frames the way
+    ConnectionManager does and keeps the ones worth persisting.
+    """
+
+    def __init__(self):
+        self.note_complete: Optional[NoteCompleteFrame] = None
+        self.validation: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.frames = 0
+
+    async def is_connected(self, thread_id: str) -> bool:
+        return True
+
+    async def wants_section_events(self, thread_id: str) -> bool:
+        return False
+
+    async def send_frame(self, thread_id: str, frame) -> bool:
+        self.frames += 1
+        if isinstance(frame, NoteCompleteFrame):
+            self.note_complete = frame
+        elif frame.get("type") == "validation":
+            self.validation = frame
+        elif frame.get("type") == "error":
+            self.error = frame.get("content")
+        return True
+
+
+class PrecomputedNoteStore:
+    """
+    SQLite store for pre-generated notes and job claims.
+
+    The database is shared by all sidecar workers; a job slot is claimed with
+    INSERT OR IGNORE so exactly one worker runs it.
+    """
+
+    def __init__(self, db_path: Optional[Path] = None):
+        db_path = db_path or Path(
+            os.getenv("SIDECAR_PRECOMPUTED_DB", str(Path.home() / "tmp" / "anton-sidecar" / "precomputed.db"))
+        )
+        self.db_path = Path(db_path).expanduser().resolve()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(
+            str(self.db_path), timeout=5.0, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS notes (
+                directory TEXT NOT NULL,
+                doc_type TEXT NOT NULL,
+                options_key TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                markdown TEXT NOT NULL,
+                note_complete TEXT NOT NULL,
+                validation TEXT,
+                created_at TEXT NOT NULL,
+                stale INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (directory, options_key)
+            );
+            CREATE TABLE IF NOT EXISTS job_runs (
+                slot TEXT PRIMARY KEY,
+                worker_id TEXT NOT NULL,
+                claimed_at REAL NOT NULL,
+                finished_at REAL
+            );
+            """
+        )
+        self._lock = threading.Lock()
+
+    def _execute(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            return cursor.fetchall() if cursor.description else [cursor.rowcount]
+
+    def claim(self, slot: str, worker_id: str) -> bool:
+        """Claim a slot, or take over one left unfinished by a worker that stopped renewing it"""
+        now = time.time()
+        (inserted,) = self._execute(
+            "INSERT OR IGNORE INTO job_runs (slot, worker_id, claimed_at) VALUES (?, ?, ?)",
+            (slot, worker_id, now),
+        )
+        if inserted == 1:
+            return True
+        (reclaimed,) = self._execute(
+            "UPDATE job_runs SET worker_id = ?, claimed_at = ? "
+            "WHERE slot = ? AND finished_at IS NULL AND claimed_at < ?",
+            (worker_id, now, slot, now - SLOT_LEASE.total_seconds()),
+        )
+        if reclaimed == 1:
+            logger.warning(f"Reclaimed pre-generation slot {slot} from a stopped worker")
+        return reclaimed == 1
+
+    def renew(self, slot: str, worker_id: str):
+        self._execute(
+            "UPDATE job_runs SET claimed_at = ? WHERE slot = ? AND worker_id = ?",
+            (time.time(), slot, worker_id),
+        )
+
+    def finish(self, slot: str):
+        self._execute("UPDATE job_runs SET finished_at = ? WHERE slot = ?", (time.time(), slot))
+
+    def save(self, note: PrecomputedNote):
+        self._execute(
+            "INSERT OR REPLACE INTO notes VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)",
+            (
+                note.directory,
+                note.doc_type,
+                note.options_key,
+                note.fingerprint,
+                note.markdown,
+                note.note_complete,
+                note.validation,
+                note.created_at.isoformat(),
+            ),
+        )
+
+    def get(self, directory: str, key: str) -> Optional[PrecomputedNote]:
+        rows = self._execute(
+            "SELECT directory, doc_type, options_key, fingerprint, markdown, note_complete, "
+            "validation, created_at, stale FROM notes WHERE directory = ? AND options_key = ?",
+            (directory, key),
+        )
+        return self._note(rows[0]) if rows else None
+
+    def fresh(self) -> List[PrecomputedNote]:
+        rows = self._execute(
+            "SELECT directory, doc_type, options_key, fingerprint, markdown, note_complete, "
+            "validation, created_at, stale FROM notes WHERE stale = 0"
+        )
+        return [self._note(row) for row in rows]
+
+    def mark_stale(self, directory: str, key: str):
+        self._execute(
+            "UPDATE notes SET stale = 1 WHERE directory = ? AND options_key = ?", (directory, key)
+        )
+
+    @staticmethod
+    def _note(row: tuple) -> PrecomputedNote:
+        fields = list(PrecomputedNote.model_fields)
+        return PrecomputedNote(**dict(zip(fields, row)))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# (sink, thread_id, doc_type, note_options, directory) -> runs the note pipeline
+Generate = Callable[[RecordingSink, str, str, dict, Path], Awaitable[None]]
+
+
+class PregenerationScheduler:
+    """
+    Runs pre-generation jobs at fixed local times for every source folder and
+    keeps their results fresh.
+
+    Every CHECK_INTERVAL the scheduler claims and runs any job that is due
+    today (up to CATCH_UP late), and marks stored notes stale when their
+    folder's fingerprint no longer matches. A running job renews its slot
+    after each folder; a slot left unrenewed by a crashed worker is reclaimed
+    and its remaining folders are run.
+    """
+
+    def __init__(
+        self,
+        jobs: List[PregenerationJob],
+        store: Optional[PrecomputedNoteStore],
+        generate: Generate,
+        targets: Callable[[], List[Path]],
+        fingerprint: Callable[[Path], str],
+        worker_id: str,
+    ):
+        self.jobs = jobs
+        self.store = store
+        self.generate = generate
+        self.targets = targets
+        self.fingerprint = fingerprint
+        self.worker_id = worker_id
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self.jobs and self.store is not None and self._task is None:
+            logger.info(f"Pre-generation jobs: {', '.join(job.label for job in self.jobs)}")
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.store is not None:
+            self.store.close()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_due_jobs()
+                await self.check_staleness()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Pre-generation scheduler error: {e}", exc_info=True)
+            await asyncio.sleep(CHECK_INTERVAL)
+
+    async def run_due_jobs(self, now: Optional[datetime] = None):
+        now = now or datetime.now()
+        for job in self.jobs:
+            due = job.due_at(now.date())
+            if not due <= now < due + CATCH_UP:
+                continue
+            slot = f"{job.label}@{now.date().isoformat()}"
+            if not await asyncio.to_thread(self.store.claim, slot, self.worker_id):
+                continue
+            key = options_key(job.docType, job.noteOptions)
+            try:
+                directories = self.targets()
+            except Exception as e:
+                # Left unfinished; the slot is reclaimed once its lease runs out
+                logger.error(f"Pre-generation {job.label} could not list folders: {e}")
+                continue
+            for directory in directories:
+                try:
+                    # Done before a crash and not changed since
+                    existing = await asyncio.to_thread(self.store.get, str(directory), key)
+                    if existing and not existing.stale and existing.created_at >= due:
+                        continue
+                    await self.run_job(job, directory)
+                except Exception as e:
+                    # One folder failing must not cost the others their note
+                    logger.error(f"Pre-generation {job.label} for {directory} failed: {e}", exc_info=True)
+                await asyncio.to_thread(self.store.renew, slot, self.worker_id)
+            # Only a completed run finishes the slot. A cancelled one (sidecar
+            # stopping) stays unfinished, so the lease lets a worker resume it.
+            await asyncio.to_thread(self.store.finish, slot)
+
+    async def run_job(self, job: PregenerationJob, directory: Path) -> Optional[PrecomputedNote]:
+        fingerprint = await asyncio.to_thread(self.fingerprint, directory)
+        sink = RecordingSink()
+        started = time.perf_counter()
+        thread_id = f"pregenerate:{job.label}"
+        with log_context(thread_id):
+            await self.generate(sink, thread_id, job.docType, job.noteOptions, directory)
+        if sink.note_complete is None:
+            logger.error(f"Pre-generation {job.label} for {directory} failed: {sink.error}")
+            return None
+        note = PrecomputedNote(
+            directory=str(directory),
+            doc_type=job.docType,
+            options_key=options_key(job.docType, job.noteOptions),
+            fingerprint=fingerprint,
+            markdown=sink.note_complete.data.markdown,
+            note_complete=sink.note_complete.model_dump_json(),
+            validation=json.dumps(sink.validation) if sink.validation else None,
+            created_at=datetime.now(),
+        )
+        await asyncio.to_thread(self.store.save, note)
+        logger.info(
+            f"Pre-generated {job.label} for {directory} in {time.perf_counter() - started:.1f}s"
+        )
+        return note
+
+    async def check_staleness(self):
+        notes = await asyncio.to_thread(self.store.fresh)
+        fingerprints: Dict[str, str] = {}
+        for note in notes:
+            if note.directory not in fingerprints:
+                fingerprints[note.directory] = await asyncio.to_thread(
+                    self.fingerprint, Path(note.directory)
+                )
+            if fingerprints[note.directory] != note.fingerprint:
+                logger.info(f"Pre-generated {note.doc_type} for {note.directory} is stale")
+                await asyncio.to_thread(self.store.mark_stale, note.directory, note.options_key)
+
+    async def lookup(
+        self, directory: Path, doc_type: str, note_options: dict
+    ) -> Optional[PrecomputedNote]:
+        """
+        A fresh precomputed note for this request, if there is one: generated
+        today, within MAX_AGE, and from the folder as it is now.
+        """
+        if self.store is None or note_options.get("regenerate"):
+            return None
+        key = options_key(doc_type, note_options)
+        note = await asyncio.to_thread(self.store.get, str(directory), key)
+        if note is None or note.stale:
+            return None
+        now = datetime.now()
+        if note.created_at.date() != now.date() or now - note.created_at > MAX_AGE:
+            return None
+        # Files added, removed or renamed since: a stat, before the full fingerprint
+        try:
+            folder_changed = Path(directory).stat().st_mtime > note.created_at.timestamp()
+        except OSError:
+            folder_changed = True
+        if folder_changed or await asyncio.to_thread(self.fingerprint, directory) != note.fingerprint:
+            await asyncio.to_thread(self.store.mark_stale, note.directory, key)
+            return None
+        return note
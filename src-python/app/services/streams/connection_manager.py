@@ -1,30 +1,203 @@
-from typing import Dict, Optional
+from typing import Dict, Optional, Union
 import asyncio
+import time
+import logging
 from fastapi import WebSocket
+from pydantic import BaseModel
+from .state_backend import (
+    CANCEL,
+    FRAME,
+    InMemoryStateBackend,
+    StateBackend,
+    new_worker_id,
+)
+from .wire_protocol import DEFAULT_PROTOCOL, Frame, WireProtocol, dumps
+
+logger = logging.getLogger(__name__)
+
 
 class ConnectionManager:
-    def __init__(self):
+    """
+    Tracks the WebSockets and stream tasks held by this worker.
+
+    Routing and task ownership go through a StateBackend, so a stream started
+    by one worker can send frames to a socket held by another. Frames are
+    routed as JSON and encoded for the socket's negotiated WireProtocol by
+    the worker that holds it.
+    """
+
+    HEARTBEAT_INTERVAL = 10.0
+
+    def __init__(self, backend: Optional[StateBackend] = None):
         self._sockets: Dict[str, WebSocket] = {}
+        self._protocols: Dict[str, WireProtocol] = {}
+        # Serialises sends per socket; several generations may share one
+        self._send_locks: Dict[str, asyncio.Lock] = {}
         self._tasks: Dict[str, asyncio.Task] = {}
         self._lock = asyncio.Lock()
+        self.backend = backend or InMemoryStateBackend()
+        self.worker_id = new_worker_id()
+        self._pump: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Start delivering frames routed to this worker by other workers"""
+        if self._pump is None:
+            # Announces this worker and prunes rows left by crashed ones
+            await self.backend.heartbeat(self.worker_id)
+            self._pump = asyncio.create_task(self._pump_messages())
 
-    async def connect(self, thread_id: str, websocket: WebSocket):
+    async def stop(self):
+        if self._pump is not None:
+            self._pump.cancel()
+            self._pump = None
+        for thread_id in list(self._sockets):
+            await self.disconnect(thread_id)
+        await self.backend.drop_worker(self.worker_id)
+        await self.backend.close()
+
+    async def connect(
+        self, thread_id: str, websocket: WebSocket, protocol: Optional[WireProtocol] = None
+    ):
         async with self._lock:
             self._sockets[thread_id] = websocket
+            self._protocols[thread_id] = protocol or DEFAULT_PROTOCOL
+            self._send_locks[thread_id] = asyncio.Lock()
+        await self.backend.register_socket(thread_id, self.worker_id)
 
     async def disconnect(self, thread_id: str):
         async with self._lock:
-            if thread_id in self._tasks:
-                task = self._tasks.pop(thread_id)
+            task = self._tasks.pop(thread_id, None)
+            if task:
                 task.cancel()
             self._sockets.pop(thread_id, None)
+            self._protocols.pop(thread_id, None)
+            self._send_locks.pop(thread_id, None)
+        await self.backend.unregister_socket(thread_id, self.worker_id)
+        if task is None:
+            # The stream may have been started through another worker
+            owner = await self.backend.task_owner(thread_id)
+            if owner and owner != self.worker_id:
+                await self.backend.publish(owner, CANCEL, thread_id)
+        await self.backend.release_task(thread_id, self.worker_id)
 
     async def get_socket(self, thread_id: str) -> Optional[WebSocket]:
         async with self._lock:
             return self._sockets.get(thread_id)
 
+    async def is_connected(self, thread_id: str) -> bool:
+        """True if any worker holds a socket for this thread"""
+        if await self.get_socket(thread_id):
+            return True
+        return await self.backend.socket_owner(thread_id) is not None
+
+    async def wants_section_events(self, thread_id: str) -> bool:
+        """
+        True if the thread's socket asked for section events. A socket held
+        by another worker gets them routed; that worker drops them if unwanted.
+        """
+        async with self._lock:
+            protocol = self._protocols.get(thread_id)
+        return protocol.section_events if protocol else True
+
+    async def send_frame(self, thread_id: str, frame: Frame) -> bool:
+        """Encode a frame for the thread's socket protocol and send it"""
+        async with self._lock:
+            websocket = self._sockets.get(thread_id)
+            protocol = self._protocols.get(thread_id, DEFAULT_PROTOCOL)
+            send_lock = self._send_locks.get(thread_id)
+        if websocket:
+            if protocol.accepts(frame):
+                await self._deliver(websocket, protocol.encode(frame), send_lock)
+            return True
+        owner = await self.backend.socket_owner(thread_id)
+        if owner is None:
+            return False
+        text = frame.model_dump_json() if isinstance(frame, BaseModel) else dumps(frame)
+        await self.backend.publish(owner, FRAME, thread_id, text)
+        return True
+
+    @staticmethod
+    async def _deliver(
+        websocket: WebSocket, payload: Union[str, bytes], send_lock: Optional[asyncio.Lock]
+    ):
+        async with send_lock or asyncio.Lock():
+            if isinstance(payload, bytes):
+                await websocket.send_bytes(payload)
+            else:
+                await websocket.send_text(payload)
+
     async def start_stream_task(self, thread_id: str, task_coro):
+        previous_owner = await self.backend.claim_task(thread_id, self.worker_id)
+        if previous_owner and previous_owner != self.worker_id:
+            await self.backend.publish(previous_owner, CANCEL, thread_id)
         async with self._lock:
             if thread_id in self._tasks and not self._tasks[thread_id].done():
                 self._tasks[thread_id].cancel()
-            self._tasks[thread_id] = asyncio.create_task(task_coro)
+            task = asyncio.create_task(task_coro)
+            self._tasks[thread_id] = task
+        task.add_done_callback(lambda t: self._on_task_done(thread_id, t))
+
+    def _on_task_done(self, thread_id: str, task: asyncio.Task):
+        if self._tasks.get(thread_id) is task:
+            self._tasks.pop(thread_id, None)
+            asyncio.create_task(self.backend.release_task(thread_id, self.worker_id))
+
+    async def _pump_messages(self):
+        last_beat = time.monotonic()
+        while True:
+            try:
+                if time.monotonic() - last_beat >= self.HEARTBEAT_INTERVAL:
+                    await self.backend.heartbeat(self.worker_id)
+                    last_beat = time.monotonic()
+                messages = await self.backend.fetch(self.worker_id, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"State backend poll failed: {e}")
+                await asyncio.sleep(1.0)
+                continue
+            for kind, thread_id, payload in messages:
+                if kind == FRAME:
+                    async with self._lock:
+                        websocket = self._sockets.get(thread_id)
+                        protocol = self._protocols.get(thread_id, DEFAULT_PROTOCOL)
+                        send_lock = self._send_locks.get(thread_id)
+                    if not websocket:
+                        continue
+                    try:
+                        payload = protocol.reencode(payload)
+                        if payload is not None:
+                            await self._deliver(websocket, payload, send_lock)
+                    except Exception as e:
+                        logger.warning(f"Dropping routed frame for {thread_id}: {e}")
+                elif kind == CANCEL:
+                    async with self._lock:
+                        task = self._tasks.pop(thread_id, None)
+                    if task and not task.done():
+                        task.cancel()
+                    # A no-op if another worker has claimed the thread since
+                    await self.backend.release_task(thread_id, self.worker_id)
+
+
+class TaggedSink:
+    """
+    Sends one generation's frames through another sink with a docType tag,
+    so several note types can share a thread's socket.
+    """
+
+    def __init__(self, sink, doc_type: str):
+        self.sink = sink
+        self.doc_type = doc_type
+
+    async def is_connected(self, thread_id: str) -> bool:
+        return await self.sink.is_connected(thread_id)
+
+    async def wants_section_events(self, thread_id: str) -> bool:
+        return await self.sink.wants_section_events(thread_id)
+
+    async def send_frame(self, thread_id: str, frame: Frame) -> bool:
+        if isinstance(frame, BaseModel):
+            frame = frame.model_copy(update={"docType": self.doc_type})
+        else:
+            frame = {**frame, "docType": self.doc_type}
+        return await self.sink.send_frame(thread_id, frame)
@@ -0,0 +1,184 @@
+import re
+from typing import List, Optional, Tuple
+
+# "## Progress", "### Impression and Plan:"
+TOP_HEADING_RE = re.compile(r"^#{2,3}\s+(.+?)\s*:?\s*$")
+# "\# Delirium" (escaped, as the prompt asks) or "# Delirium"
+SUB_HEADING_RE = re.compile(r"^\\?#\s+(.+?)\s*$")
+CITATION_RE = re.compile(r"\[(\d+)\]")
+# Longest fragment held back while waiting for a citation's closing bracket
+MAX_CITATION_TAIL = 6
+
+
+class SectionStreamParser:
+    """
+    Incremental markdown section parser for streamed notes.
+
+    Feed it raw LLM deltas; it returns `section_start`, `section_delta` and
+    `section_end` events so the client can render each section as it grows
+    without re-parsing the whole note. Top-level sections are `##` headings
+    (or a bare "Name:" line for a known section); `\\#` issue headings open
+    subsections of the current section. Inline citation markers `[n]` are
+    reported with their absolute character offset in the note.
+    """
+
+    def __init__(self, sections: List[str]):
+        self._known = {s.lower(): s for s in sections}
+        self._buffer = ""
+        self._offset = 0  # absolute offset of the start of _buffer
+        self._at_line_start = True
+        self._section: Optional[str] = None
+        self._subsection: Optional[str] = None
+        self._events: List[dict] = []
+
+    @property
+    def current_section(self) -> Optional[str]:
+        return self._section
+
+    def feed(self, delta: str) -> List[dict]:
+        """Consume a delta and return the events it completes"""
+        self._buffer += delta
+        while True:
+            newline = self._buffer.find("\n")
+            if newline == -1:
+                break
+            line = self._buffer[: newline + 1]
+            if self._at_line_start and self._handle_heading(line):
+                pass
+            else:
+                self._emit_text(line)
+            self._consume(len(line))
+            self._at_line_start = True
+
+        # Emit as much of a partial line as can no longer turn into a heading
+        # or split a citation marker.
+        if self._buffer and not (self._at_line_start and self._could_be_heading(self._buffer)):
+            safe = len(self._buffer)
+            bracket = self._buffer.rfind("[")
+            if bracket != -1 and "]" not in self._buffer[bracket:]:
+                if len(self._buffer) - bracket <= MAX_CITATION_TAIL:
+                    safe = bracket
+            if safe:
+                self._emit_text(self._buffer[:safe])
+                self._consume(safe)
+                self._at_line_start = False
+        return self._drain()
+
+    def close(self) -> List[dict]:
+        """Flush buffered text and close any open sections"""
+        if self._buffer:
+            if not (self._at_line_start and self._handle_heading(self._buffer)):
+                self._emit_text(self._buffer)
+            self._consume(len(self._buffer))
+        self._end_subsection()
+        self._end_section()
+        return self._drain()
+
+    def _consume(self, n: int):
+        self._buffer = self._buffer[n:]
+        self._offset += n
+
+    def _drain(self) -> List[dict]:
+        events, self._events = self._events, []
+        return events
+
+    def _could_be_heading(self, partial: str) -> bool:
+        stripped = partial.lstrip()
+        if not stripped or stripped[0] in "#\\":
+            return True
+        lowered = stripped.lower()
+        return any(name.startswith(lowered) or lowered.startswith(name) for name in self._known)
+
+    def _match_heading(self, line: str) -> Optional[Tuple[int, str]]:
+        stripped = line.strip()
+        top = TOP_HEADING_RE.match(stripped)
+        if top:
+            title = top.group(1).strip()
+            return 2, self._known.get(title.lower(), title)
+        label = stripped.rstrip(":").strip().lower()
+        if label in self._known:
+            return 2, self._known[label]
+        sub = SUB_HEADING_RE.match(stripped)
+        if sub and self._section is not None:
+            return 3, sub.group(1).strip()
+        return None
+
+    def _handle_heading(self, line: str) -> bool:
+        heading = self._match_heading(line)
+        if not heading:
+            return False
+        level, title = heading
+        self._end_subsection()
+        if level == 2:
+            self._end_section()
+            self._section = title
+            parent = None
+        else:
+            self._subsection = title
+            parent = self._section
+        self._events.append(
+            {
+                "type": "section_start",
+                "section": title,
+                "parent": parent,
+                "level": level,
+                "offset": self._offset,
+            }
+        )
+        return True
+
+    def _end_subsection(self):
+        if self._subsection is not None:
+            self._events.append(
+                {
+                    "type": "section_end",
+                    "section": self._subsection,
+                    "parent": self._section,
+                    "offset": self._offset,
+                }
+            )
+            self._subsection = None
+
+    def _end_section(self):
+        if self._section is not None:
+            self._events.append(
+                {
+                    "type": "section_end",
+                    "section": self._section,
+                    "parent": None,
+                    "offset": self._offset,
+                }
+            )
+            self._section = None
+
+    def _emit_text(self, text: str):
+        if self._subsection is not None:
+            section, parent = self._subsection, self._section
+        else:
+            section, parent = self._section, None
+        citations = [
+            {"number": int(m.group(1)), "offset": self._offset + m.start()}
+            for m in CITATION_RE.finditer(text)
+        ]
+        last = self._events[-1] if self._events else None
+        # Coalesce consecutive text for the same section into one event
+        if (
+            last
+            and last["type"] == "section_delta"
+            and last["section"] == section
+            and last["parent"] == parent
+            and last["offset"] + len(last["content"]) == self._offset
+        ):
+            last["content"] += text
+            last["citations"].extend(citations)
+            return
+        self._events.append(
+            {
+                "type": "section_delta",
+                "section": section,
+                "parent": parent,
+                "offset": self._offset,
+                "content": text,
+                "citations": citations,
+            }
+        )
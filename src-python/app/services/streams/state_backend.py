@@ -0,0 +1,396 @@
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import os
+import sqlite3
+import time
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Message kinds routed between workers
+FRAME = "frame"
+CANCEL = "cancel"
+
+Message = Tuple[str, str, str]  # (kind, thread_id, payload)
+
+
+class StateBackend(ABC):
+    """
+    Shared state for socket routing, task ownership and stream fan-out.
+
+    Every sidecar worker process owns a subset of the open WebSockets. The
+    backend records which worker holds the socket for a thread and which worker
+    runs its stream task, and carries frames/control messages to the worker that
+    can act on them.
+
+    Patient links outlive their socket by LINK_TTL seconds, so a trigger can
+    link a thread before its socket connects and a client can reconnect; the
+    heartbeat drops links older than that with no socket.
+    """
+
+    LINK_TTL = 60.0
+
+    @abstractmethod
+    async def register_socket(self, thread_id: str, worker_id: str) -> None:
+        """Record that `worker_id` holds the socket for `thread_id`"""
+        pass
+
+    @abstractmethod
+    async def unregister_socket(self, thread_id: str, worker_id: str) -> None:
+        """Drop the socket record if it still belongs to `worker_id`"""
+        pass
+
+    @abstractmethod
+    async def socket_owner(self, thread_id: str) -> Optional[str]:
+        """Return the worker holding the socket for `thread_id`, if any"""
+        pass
+
+    @abstractmethod
+    async def claim_task(self, thread_id: str, worker_id: str) -> Optional[str]:
+        """Make `worker_id` the task owner for `thread_id`; return the previous owner"""
+        pass
+
+    @abstractmethod
+    async def release_task(self, thread_id: str, worker_id: str) -> None:
+        """Drop the task record if it still belongs to `worker_id`"""
+        pass
+
+    @abstractmethod
+    async def publish(self, worker_id: str, kind: str, thread_id: str, payload: str = "") -> None:
+        """Queue a message for delivery to `worker_id`"""
+        pass
+
+    @abstractmethod
+    async def fetch(self, worker_id: str, timeout: float) -> List[Message]:
+        """Return pending messages for `worker_id`, waiting up to `timeout` seconds"""
+        pass
+
+    @abstractmethod
+    async def link_patient(self, thread_id: str, patient_id: str) -> None:
+        """Route future generations for `thread_id` to `patient_id`'s folder"""
+        pass
+
+    @abstractmethod
+    async def thread_patient(self, thread_id: str) -> Optional[str]:
+        """Return the patient linked to `thread_id`, if any"""
+        pass
+
+    async def task_owner(self, thread_id: str) -> Optional[str]:
+        """Return the worker running the stream task for `thread_id`, if any"""
+        return None
+
+    async def heartbeat(self, worker_id: str) -> None:
+        """Mark `worker_id` alive, forget workers that stopped beating and expire patient links"""
+        pass
+
+    async def drop_worker(self, worker_id: str) -> None:
+        """Forget everything owned by a worker that is shutting down"""
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+class InMemoryStateBackend(StateBackend):
+    """Single-process backend; every socket and task lives in this worker."""
+
+    def __init__(self):
+        self._sockets: Dict[str, str] = {}
+        self._tasks: Dict[str, str] = {}
+        self._patients: Dict[str, Tuple[str, float]] = {}  # thread -> (patient, linked or unregistered at)
+        self._queues: Dict[str, asyncio.Queue] = {}
+
+    def _queue(self, worker_id: str) -> asyncio.Queue:
+        if worker_id not in self._queues:
+            self._queues[worker_id] = asyncio.Queue()
+        return self._queues[worker_id]
+
+    async def register_socket(self, thread_id: str, worker_id: str) -> None:
+        self._sockets[thread_id] = worker_id
+
+    async def unregister_socket(self, thread_id: str, worker_id: str) -> None:
+        if self._sockets.get(thread_id) == worker_id:
+            self._sockets.pop(thread_id, None)
+            if thread_id in self._patients:
+                self._patients[thread_id] = (self._patients[thread_id][0], time.time())
+
+    async def socket_owner(self, thread_id: str) -> Optional[str]:
+        return self._sockets.get(thread_id)
+
+    async def claim_task(self, thread_id: str, worker_id: str) -> Optional[str]:
+        previous = self._tasks.get(thread_id)
+        self._tasks[thread_id] = worker_id
+        return previous
+
+    async def release_task(self, thread_id: str, worker_id: str) -> None:
+        if self._tasks.get(thread_id) == worker_id:
+            self._tasks.pop(thread_id, None)
+
+    async def task_owner(self, thread_id: str) -> Optional[str]:
+        return self._tasks.get(thread_id)
+
+    async def publish(self, worker_id: str, kind: str, thread_id: str, payload: str = "") -> None:
+        self._queue(worker_id).put_nowait((kind, thread_id, payload))
+
+    async def link_patient(self, thread_id: str, patient_id: str) -> None:
+        self._patients[thread_id] = (patient_id, time.time())
+
+    async def thread_patient(self, thread_id: str) -> Optional[str]:
+        link = self._patients.get(thread_id)
+        return link[0] if link else None
+
+    async def heartbeat(self, worker_id: str) -> None:
+        cutoff = time.time() - self.LINK_TTL
+        for thread_id, (_, at) in list(self._patients.items()):
+            if at < cutoff and thread_id not in self._sockets:
+                del self._patients[thread_id]
+
+    async def fetch(self, worker_id: str, timeout: float) -> List[Message]:
+        queue = self._queue(worker_id)
+        try:
+            first = await asyncio.wait_for(queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        messages = [first]
+        while not queue.empty():
+            messages.append(queue.get_nowait())
+        return messages
+
+
+class SQLiteStateBackend(StateBackend):
+    """
+    Multi-process backend for workers on the same machine.
+
+    State and the per-worker message queues live in one SQLite database in WAL
+    mode, so any uvicorn worker can route a frame to the worker that holds the
+    socket. All blocking SQLite calls run in a worker thread.
+
+    Workers heartbeat into the `workers` table; rows owned by a worker that
+    has not beaten for WORKER_TTL seconds (it crashed or was killed) are
+    pruned by the next heartbeat from any live worker, and so are expired
+    patient links.
+    """
+
+    POLL_INTERVAL = 0.02
+    WORKER_TTL = 60.0
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path).expanduser().resolve()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(
+            str(self.db_path), timeout=5.0, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS sockets (
+                thread_id TEXT PRIMARY KEY,
+                worker_id TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS tasks (
+                thread_id TEXT PRIMARY KEY,
+                worker_id TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                worker_id TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                thread_id TEXT NOT NULL,
+                payload TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS messages_worker ON messages (worker_id, id);
+            CREATE TABLE IF NOT EXISTS workers (
+                worker_id TEXT PRIMARY KEY,
+                seen_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS thread_patients (
+                thread_id TEXT PRIMARY KEY,
+                patient_id TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            """
+        )
+        # One connection shared by this process; serialise access to it.
+        self._db_lock = asyncio.Lock()
+
+    async def _run(self, fn, *args):
+        async with self._db_lock:
+            return await asyncio.to_thread(fn, *args)
+
+    def _execute(self, sql: str, params: tuple = ()):
+        return self._conn.execute(sql, params).fetchall()
+
+    async def register_socket(self, thread_id: str, worker_id: str) -> None:
+        await self._run(
+            self._execute,
+            "INSERT OR REPLACE INTO sockets (thread_id, worker_id, updated_at) VALUES (?, ?, ?)",
+            (thread_id, worker_id, time.time()),
+        )
+
+    async def unregister_socket(self, thread_id: str, worker_id: str) -> None:
+        await self._run(
+            self._execute,
+            "DELETE FROM sockets WHERE thread_id = ? AND worker_id = ?",
+            (thread_id, worker_id),
+        )
+        # The link expires LINK_TTL from now unless a socket comes back
+        await self._run(
+            self._execute,
+            "UPDATE thread_patients SET updated_at = ? WHERE thread_id = ?",
+            (time.time(), thread_id),
+        )
+
+    async def socket_owner(self, thread_id: str) -> Optional[str]:
+        rows = await self._run(
+            self._execute, "SELECT worker_id FROM sockets WHERE thread_id = ?", (thread_id,)
+        )
+        return rows[0][0] if rows else None
+
+    def _claim_task(self, thread_id: str, worker_id: str) -> Optional[str]:
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self._conn.execute(
+                "SELECT worker_id FROM tasks WHERE thread_id = ?", (thread_id,)
+            ).fetchall()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO tasks (thread_id, worker_id, updated_at) VALUES (?, ?, ?)",
+                (thread_id, worker_id, time.time()),
+            )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        return rows[0][0] if rows else None
+
+    async def claim_task(self, thread_id: str, worker_id: str) -> Optional[str]:
+        return await self._run(self._claim_task, thread_id, worker_id)
+
+    async def release_task(self, thread_id: str, worker_id: str) -> None:
+        await self._run(
+            self._execute,
+            "DELETE FROM tasks WHERE thread_id = ? AND worker_id = ?",
+            (thread_id, worker_id),
+        )
+
+    async def task_owner(self, thread_id: str) -> Optional[str]:
+        rows = await self._run(
+            self._execute, "SELECT worker_id FROM tasks WHERE thread_id = ?", (thread_id,)
+        )
+        return rows[0][0] if rows else None
+
+    async def publish(self, worker_id: str, kind: str, thread_id: str, payload: str = "") -> None:
+        await self._run(
+            self._execute,
+            "INSERT INTO messages (worker_id, kind, thread_id, payload) VALUES (?, ?, ?, ?)",
+            (worker_id, kind, thread_id, payload),
+        )
+
+    async def link_patient(self, thread_id: str, patient_id: str) -> None:
+        await self._run(
+            self._execute,
+            "INSERT OR REPLACE INTO thread_patients (thread_id, patient_id, updated_at) VALUES (?, ?, ?)",
+            (thread_id, patient_id, time.time()),
+        )
+
+    async def thread_patient(self, thread_id: str) -> Optional[str]:
+        rows = await self._run(
+            self._execute, "SELECT patient_id FROM thread_patients WHERE thread_id = ?", (thread_id,)
+        )
+        return rows[0][0] if rows else None
+
+    def _drain(self, worker_id: str) -> List[Message]:
+        # Only this worker consumes its queue, so read without the write lock
+        # and delete what was read; the common empty poll never writes.
+        rows = self._conn.execute(
+            "SELECT id, kind, thread_id, payload FROM messages WHERE worker_id = ? ORDER BY id",
+            (worker_id,),
+        ).fetchall()
+        if rows:
+            self._conn.execute(
+                "DELETE FROM messages WHERE worker_id = ? AND id <= ?",
+                (worker_id, rows[-1][0]),
+            )
+        return [(kind, thread_id, payload) for _, kind, thread_id, payload in rows]
+
+    async def fetch(self, worker_id: str, timeout: float) -> List[Message]:
+        deadline = time.monotonic() + timeout
+        while True:
+            messages = await self._run(self._drain, worker_id)
+            if messages or time.monotonic() >= deadline:
+                return messages
+            await asyncio.sleep(self.POLL_INTERVAL)
+
+    def _heartbeat(self, worker_id: str) -> List[str]:
+        now = time.time()
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO workers (worker_id, seen_at) VALUES (?, ?)", (worker_id, now)
+            )
+            dead = [
+                row[0]
+                for row in self._conn.execute(
+                    "SELECT worker_id FROM workers WHERE seen_at < ?", (now - self.WORKER_TTL,)
+                ).fetchall()
+            ]
+            self._conn.execute("DELETE FROM workers WHERE seen_at < ?", (now - self.WORKER_TTL,))
+            # Also catches rows from workers that never heartbeat at all
+            for table in ("sockets", "tasks", "messages"):
+                self._conn.execute(
+                    f"DELETE FROM {table} WHERE worker_id NOT IN (SELECT worker_id FROM workers)"
+                )
+            self._conn.execute(
+                "DELETE FROM thread_patients WHERE updated_at < ? "
+                "AND thread_id NOT IN (SELECT thread_id FROM sockets)",
+                (now - self.LINK_TTL,),
+            )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        return dead
+
+    async def heartbeat(self, worker_id: str) -> None:
+        dead = await self._run(self._heartbeat, worker_id)
+        if dead:
+            logger.info(f"Pruned state for stale workers: {', '.join(dead)}")
+
+    async def drop_worker(self, worker_id: str) -> None:
+        for table in ("sockets", "tasks", "messages", "workers"):
+            await self._run(
+                self._execute, f"DELETE FROM {table} WHERE worker_id = ?", (worker_id,)
+            )
+
+    async def close(self) -> None:
+        await self._run(self._conn.close)
+
+
+def new_worker_id() -> str:
+    return f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+def create_state_backend() -> StateBackend:
+    """
+    Build the backend selected by SIDECAR_STATE_BACKEND ("memory" or "sqlite").
+
+    Defaults to the SQLite backend when more than one worker is configured,
+    since in-memory state cannot be seen across processes.
+    """
+    workers = int(os.getenv("SIDECAR_WORKERS", "1"))
+    kind = os.getenv("SIDECAR_STATE_BACKEND", "sqlite" if workers > 1 else "memory").lower()
+    if kind == "memory":
+        if workers > 1:
+            logger.warning("In-memory state backend with %s workers; routing will fail", workers)
+        return InMemoryStateBackend()
+    if kind == "sqlite":
+        db_path = os.getenv(
+            "SIDECAR_STATE_DB", str(Path.home() / "tmp" / "anton-sidecar" / "state.db")
+        )
+        return SQLiteStateBackend(Path(db_path))
+    raise ValueError(f"Unknown state backend: {kind}")
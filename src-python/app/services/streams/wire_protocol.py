@@ -0,0 +1,166 @@
+from hashlib import sha256
+from typing import Dict, Literal, Mapping, Optional, Union
+import json
+import logging
+from pydantic import BaseModel
+from models.citation import Citation, CitationMap
+
+logger = logging.getLogger(__name__)
+
+# Optional fast paths; plain json is used when they are not installed
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the build
+    orjson = None
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - depends on the build
+    msgpack = None
+
+JSON = "json"
+MSGPACK = "msgpack"
+MARKDOWN_FULL = "full"
+MARKDOWN_REF = "ref"
+EVENTS_NONE = "none"
+EVENTS_SECTIONS = "sections"
+
+SECTION_EVENTS = frozenset({"section_start", "section_delta", "section_end"})
+
+
+class NoteCompleteData(BaseModel):
+    # None when the client asked for a reference to the streamed chunks
+    markdown: Optional[str] = None
+    markdown_sha256: str
+    markdown_length: int
+    citations: Dict[str, Citation]
+    citation_count: int
+
+
+class NoteCompleteFrame(BaseModel):
+    type: Literal["note_complete"] = "note_complete"
+    data: NoteCompleteData
+    # Set when several note types are multiplexed over one socket
+    docType: Optional[str] = None
+
+
+def markdown_digest(markdown: str) -> str:
+    return sha256(markdown.encode("utf-8")).hexdigest()
+
+
+def note_complete_frame(markdown: str, citation_map: CitationMap) -> NoteCompleteFrame:
+    return NoteCompleteFrame(
+        data=NoteCompleteData(
+            markdown=markdown,
+            markdown_sha256=markdown_digest(markdown),
+            markdown_length=len(markdown),
+            citations={str(number): cite for number, cite in citation_map.citations.items()},
+            citation_count=citation_map.total_count,
+        )
+    )
+
+
+def dumps(frame: Mapping) -> str:
+    """Compact JSON text for a plain dict frame"""
+    if orjson is not None:
+        return orjson.dumps(frame).decode("utf-8")
+    return json.dumps(frame, separators=(",", ":"), ensure_ascii=False)
+
+
+Frame = Union[Mapping, BaseModel]
+
+
+class WireProtocol:
+    """
+    Per-connection frame encoding, negotiated from the WebSocket query string:
+
+      ?encoding=json|msgpack   text JSON (default) or binary MessagePack frames
+      ?markdown=full|ref       note_complete repeats the markdown (default), or
+                               only carries its sha256 and length, for clients
+                               that rebuild it from the streamed chunks
+      ?events=none|sections    only chunk frames (default), or also
+                               section_start/section_delta/section_end
+                               frames for clients that render by section
+
+    Pydantic frames are serialized by their compiled schema; plain dict frames
+    go through orjson when it is installed. Compression is left to the
+    permessage-deflate extension negotiated by uvicorn.
+    """
+
+    def __init__(self, encoding: str = JSON, markdown: str = MARKDOWN_FULL, events: str = EVENTS_NONE):
+        if encoding == MSGPACK and msgpack is None:
+            logger.warning("msgpack is not installed; falling back to JSON frames")
+            encoding = JSON
+        if encoding not in (JSON, MSGPACK):
+            raise ValueError(f"Unsupported frame encoding: {encoding}")
+        if markdown not in (MARKDOWN_FULL, MARKDOWN_REF):
+            raise ValueError(f"Unsupported markdown mode: {markdown}")
+        if events not in (EVENTS_NONE, EVENTS_SECTIONS):
+            raise ValueError(f"Unsupported events mode: {events}")
+        self.encoding = encoding
+        self.markdown = markdown
+        self.events = events
+
+    @classmethod
+    def from_query(cls, params: Mapping[str, str]) -> "WireProtocol":
+        return cls(
+            encoding=params.get("encoding", JSON).lower(),
+            markdown=params.get("markdown", MARKDOWN_FULL).lower(),
+            events=params.get("events", EVENTS_NONE).lower(),
+        )
+
+    @property
+    def is_default(self) -> bool:
+        return self.encoding == JSON and self.markdown == MARKDOWN_FULL and self.events == EVENTS_NONE
+
+    @property
+    def section_events(self) -> bool:
+        return self.events == EVENTS_SECTIONS
+
+    @property
+    def binary(self) -> bool:
+        return self.encoding == MSGPACK
+
+    def describe(self) -> dict:
+        return {"type": "protocol", "encoding": self.encoding, "markdown": self.markdown, "events": self.events}
+
+    def accepts(self, frame: Frame) -> bool:
+        """False for section events the client did not ask for"""
+        if self.section_events or isinstance(frame, BaseModel):
+            return True
+        return frame.get("type") not in SECTION_EVENTS
+
+    def encode(self, frame: Frame) -> Union[str, bytes]:
+        if isinstance(frame, BaseModel):
+            exclude = {}
+            if isinstance(frame, NoteCompleteFrame):
+                if self.markdown == MARKDOWN_REF:
+                    exclude["data"] = {"markdown"}
+                if frame.docType is None:
+                    exclude["docType"] = True
+            if self.encoding == MSGPACK:
+                return msgpack.packb(frame.model_dump(mode="json", exclude=exclude))
+            return frame.model_dump_json(exclude=exclude)
+        if self.encoding == MSGPACK:
+            return msgpack.packb(frame)
+        return dumps(frame)
+
+    def reencode(self, text: str) -> Union[str, bytes, None]:
+        """
+        Re-encode a JSON frame routed from another worker for this connection;
+        None if the connection did not ask for it
+        """
+        frame = None
+        # Only frames that can be section events are parsed to check
+        if not self.section_events and "section_" in text:
+            frame = json.loads(text)
+            if not self.accepts(frame):
+                return None
+        if self.encoding == JSON and self.markdown == MARKDOWN_FULL:
+            return text
+        frame = frame if frame is not None else json.loads(text)
+        if self.markdown == MARKDOWN_REF and frame.get("type") == "note_complete":
+            frame["data"].pop("markdown", None)
+        return self.encode(frame)
+
+
+DEFAULT_PROTOCOL = WireProtocol()
@@ -0,0 +1,218 @@
+import re
+from typing import Dict, List, Optional, Tuple
+from pydantic import BaseModel
+from services.streams.section_parser import SectionStreamParser
+
+CITATION_RE = re.compile(r"\[(\d+)\]")
+# [1, 2] / [1,2] / [1 2]
+BAD_CITATION_RE = re.compile(r"\[\d+(?:\s*,\s*\d+|\s+\d+)+\]")
+REFERENCE_RE = re.compile(r"^\s*(\d+)\.\s*\[cite:([^\]]*)\]")
+QUOTE_RE = re.compile(r"^\s*>")
+
+REFERENCES_SECTION = "References"
+
+
+class ValidationIssue(BaseModel):
+    code: str
+    message: str
+    severity: str  # "fatal" | "error" | "warning"
+    section: Optional[str] = None
+    offset: Optional[int] = None
+
+    @property
+    def fatal(self) -> bool:
+        return self.severity == "fatal"
+
+
+class StreamingNoteValidator:
+    """
+    Online validator for a streamed note.
+
+    Consumes SectionStreamParser events as they arrive and reports issues as
+    soon as they can be detected. Section order problems are fatal: the caller
+    should stop generation and regenerate from the broken section. Citation
+    problems are reported but do not stop the stream.
+    """
+
+    def __init__(self, sections: List[str]):
+        self.sections = sections
+        self._order: Dict[str, int] = {name: i for i, name in enumerate(sections)}
+        self._seen: List[str] = []
+        self._last_index = -1
+        self._section: Optional[str] = None
+        self._line = ""
+        self._line_offset = 0
+        self._used: Dict[int, int] = {}  # citation number -> first offset
+        self._references: Dict[int, bool] = {}  # reference number -> has quote
+        self._pending_reference: Optional[int] = None
+        self.issues: List[ValidationIssue] = []
+        self._new: List[ValidationIssue] = []
+
+    @property
+    def fatal(self) -> Optional[ValidationIssue]:
+        return next((issue for issue in self.issues if issue.fatal), None)
+
+    @property
+    def is_valid(self) -> bool:
+        return not any(issue.severity in ("fatal", "error") for issue in self.issues)
+
+    def expected_next_section(self) -> Optional[str]:
+        """First declared section after the last one accepted"""
+        for name in self.sections[self._last_index + 1:]:
+            if name not in self._seen:
+                return name
+        return None
+
+    def observe(self, events: List[dict]) -> List[ValidationIssue]:
+        """Consume parser events; return the issues they raised"""
+        for event in events:
+            if event["type"] == "section_start":
+                self._flush_line()
+                if event["level"] == 2:
+                    self._start_section(event["section"], event["offset"])
+            elif event["type"] == "section_end":
+                self._flush_line()
+                if event["parent"] is None:
+                    self._end_section()
+            elif event["type"] == "section_delta":
+                self._feed_text(event["content"], event["offset"])
+        new, self._new = self._new, []
+        return new
+
+    def finish(self) -> List[ValidationIssue]:
+        """Run end-of-note checks; return the issues they raised"""
+        self._flush_line()
+        self._end_section()
+        missing = [name for name in self.sections if name not in self._seen]
+        for name in missing:
+            # A note that cites sources but never lists them can be repaired by
+            # generating just the References section.
+            fatal = name == REFERENCES_SECTION and bool(self._used)
+            self._report(
+                "missing_section",
+                f"Missing section: {name}",
+                "fatal" if fatal else "error",
+                section=name,
+            )
+        for number, offset in sorted(self._used.items()):
+            if REFERENCES_SECTION in self._seen and number not in self._references:
+                self._report(
+                    "unresolved_citation",
+                    f"Citation [{number}] has no matching reference",
+                    "error",
+                    offset=offset,
+                )
+        new, self._new = self._new, []
+        return new
+
+    def _report(self, code: str, message: str, severity: str, section: Optional[str] = None, offset: Optional[int] = None):
+        issue = ValidationIssue(
+            code=code,
+            message=message,
+            severity=severity,
+            section=section if section is not None else self._section,
+            offset=offset,
+        )
+        self.issues.append(issue)
+        self._new.append(issue)
+
+    def _start_section(self, name: str, offset: int):
+        self._end_section()
+        self._section = name
+        index = self._order.get(name)
+        if index is None:
+            self._report("unknown_section", f"Unexpected section: {name}", "warning", offset=offset)
+            return
+        if name in self._seen:
+            self._report("duplicate_section", f"Section repeated: {name}", "fatal", offset=offset)
+            return
+        if index < self._last_index:
+            self._report(
+                "section_order",
+                f"Section {name} appears after {self.sections[self._last_index]}",
+                "fatal",
+                offset=offset,
+            )
+            return
+        self._seen.append(name)
+        self._last_index = index
+
+    def _end_section(self):
+        if self._pending_reference is not None:
+            self._report_missing_quote(self._pending_reference)
+            self._pending_reference = None
+        self._section = None
+
+    def _feed_text(self, text: str, offset: int):
+        if not self._line:
+            self._line_offset = offset
+        self._line += text
+        while "\n" in self._line:
+            line, self._line = self._line.split("\n", 1)
+            self._check_line(line, self._line_offset)
+            self._line_offset += len(line) + 1
+
+    def _flush_line(self):
+        if self._line:
+            self._check_line(self._line, self._line_offset)
+            self._line = ""
+
+    def _check_line(self, line: str, offset: int):
+        if self._section == REFERENCES_SECTION:
+            self._check_reference_line(line)
+            return
+        for match in BAD_CITATION_RE.finditer(line):
+            self._report(
+                "citation_syntax",
+                f"Malformed citation {match.group(0)}; use consecutive brackets like [1][2]",
+                "error",
+                offset=offset + match.start(),
+            )
+        for match in CITATION_RE.finditer(line):
+            self._used.setdefault(int(match.group(1)), offset + match.start())
+
+    def _check_reference_line(self, line: str):
+        reference = REFERENCE_RE.match(line)
+        if reference:
+            if self._pending_reference is not None:
+                self._report_missing_quote(self._pending_reference)
+            number = int(reference.group(1))
+            self._references[number] = False
+            self._pending_reference = number
+            if ":" not in reference.group(2):
+                self._report(
+                    "reference_format",
+                    f"Reference {number} should use [cite:filename:section]",
+                    "error",
+                )
+        elif QUOTE_RE.match(line) and self._pending_reference is not None:
+            self._references[self._pending_reference] = True
+            self._pending_reference = None
+
+    def _report_missing_quote(self, number: int):
+        self._report(
+            "reference_without_quote",
+            f"Reference {number} has no > quote",
+            "error",
+        )
+
+
+def validate_note_text(note: str, sections: List[str]) -> StreamingNoteValidator:
+    """Validate a complete note offline; returns the finished validator"""
+    parser = SectionStreamParser(sections)
+    validator = StreamingNoteValidator(sections)
+    validator.observe(parser.feed(note))
+    validator.observe(parser.close())
+    validator.finish()
+    return validator
+
+
+def resume_validation(prefix: str, sections: List[str]) -> Tuple[SectionStreamParser, StreamingNoteValidator]:
+    """
+    Parser and validator in the state they reach after `prefix`, the part of
+    a note kept by a rollback, so a regenerated remainder continues from it
+    """
+    parser = SectionStreamParser(sections)
+    validator = StreamingNoteValidator(sections)
+    validator.observe(parser.feed(prefix))
+    return parser, validator
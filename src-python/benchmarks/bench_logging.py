@@ -0,0 +1,140 @@
+"""
+Report event-loop stall time caused by logging during a generation.
+
+Usage (from src-python):
+    python benchmarks/bench_logging.py
+
+Replays the logging-heavy steps of a request on the event loop (prompt
+formatting over 40 source files, citation extraction over a 120-citation
+note, 200 streamed chunks) and measures how long the loop is held per
+request. Each configuration writes to a real file and to a slow pipe
+(0.2 ms per write, like a sidecar stderr pipe the parent reads lazily):
+  off        root at WARNING, nothing emitted
+  direct     handler on the root logger at DEBUG, as the import-time
+             basicConfig did (per-file and per-citation lines written inline)
+  queue      configure_logging() at DEBUG: queue handler, rate limited
+  queue-info configure_logging() at the default INFO level
+"""
+from pathlib import Path
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from services.citations.citation_extractor import CitationExtractor  # noqa: E402
+from services.diagnostics.log_pipeline import configure_logging, log_context, shutdown_logging  # noqa: E402
+from services.note_formatters.ward_round_formatter import WardRoundFormatter  # noqa: E402
+
+REQUESTS = 5
+FILES = 40
+CITATIONS = 120
+CHUNKS = 200
+chunk_logger = logging.getLogger("bench.stream")
+
+
+class SlowPipe:
+    def __init__(self, delay: float = 0.0002):
+        self.delay = delay
+
+    def write(self, text: str):
+        time.sleep(self.delay)
+
+    def flush(self):
+        pass
+
+
+def corpus() -> dict[str, str]:
+    return {
+        f"nurse-note-202510{10 + i // 10:02d}-{i % 24:02d}.00.txt": f"Nursing Progress Note {i}\n" + "Obs stable. " * 40
+        for i in range(FILES)
+    }
+
+
+def cited_note(files: list[str]) -> str:
+    refs = "\n".join(
+        f"{n}. [cite:{files[n % len(files)]}:Progress]\n   > Obs stable, pt settled overnight {n}"
+        for n in range(1, CITATIONS + 1)
+    )
+    return "## Issues\n- Stable\n## References\n" + refs + "\n"
+
+
+async def request(content: dict[str, str], note: str) -> float:
+    """Loop time spent in synchronous work for one request, in seconds"""
+    formatter = WardRoundFormatter()
+    extractor = CitationExtractor()
+    blocked = 0.0
+    with log_context("bench-thread"):
+        start = time.perf_counter()
+        formatter.format_user_message(content, "Generate ward round note")
+        blocked += time.perf_counter() - start
+        await asyncio.sleep(0)
+        for i in range(CHUNKS):
+            start = time.perf_counter()
+            chunk_logger.debug(f"chunk {i}")
+            blocked += time.perf_counter() - start
+            await asyncio.sleep(0)
+        start = time.perf_counter()
+        extractor.extract_citations(note, content)
+        blocked += time.perf_counter() - start
+    return blocked
+
+
+def configure(mode: str, stream):
+    shutdown_logging()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    if mode == "off":
+        root.setLevel(logging.WARNING)
+    elif mode == "direct":
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+        root.addHandler(handler)
+        root.setLevel(logging.DEBUG)
+    else:
+        os.environ["SIDECAR_LOG_LEVEL"] = "DEBUG" if mode == "queue" else "INFO"
+        sys.stderr, real_stderr = stream, sys.stderr
+        try:
+            configure_logging()
+        finally:
+            sys.stderr = real_stderr
+
+
+def run(mode: str, stream, content, note) -> float:
+    configure(mode, stream)
+
+    async def main():
+        return sum([await request(content, note) for _ in range(REQUESTS)]) / REQUESTS
+
+    blocked = asyncio.run(main())
+    shutdown_logging()  # drain the queue outside the measurement
+    return blocked
+
+
+def main():
+    content = corpus()
+    note = cited_note(list(content))
+    with tempfile.TemporaryDirectory() as tmp:
+        sinks = {
+            "file": lambda: open(Path(tmp) / "bench.log", "w", encoding="utf-8"),
+            "slow pipe": SlowPipe,
+        }
+        for sink_name, make_sink in sinks.items():
+            print(f"{sink_name}:")
+            baseline = None
+            for mode in ("off", "direct", "queue", "queue-info"):
+                blocked = run(mode, make_sink(), content, note)
+                baseline = blocked if baseline is None else baseline
+                print(
+                    f"  {mode:10} loop held {blocked * 1000:7.2f} ms/request  "
+                    f"(logging {max(0.0, blocked - baseline) * 1000:6.2f} ms)"
+                )
+    logging.getLogger().handlers.clear()
+
+
+if __name__ == "__main__":
+    main()
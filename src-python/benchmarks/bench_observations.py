@@ -0,0 +1,69 @@
+"""
+Report prompt savings from the observation table stage.
+
+Usage (from src-python):
+    python benchmarks/bench_observations.py
+
+Compares the ward round user message with and without observation tables for
+the sample corpus and for a synthetic obs-heavy admission: six nursing notes
+over 24h with 2-hourly BSLs and vitals every 60, 30 or 15 minutes. Tokens are
+approximated as chars/4.
+"""
+from datetime import datetime, timedelta
+from pathlib import Path
+import os
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+os.environ.setdefault("OPENROUTER_API_KEY", "benchmark")
+
+import main  # noqa: E402
+from services.file_reader import FileReader  # noqa: E402
+
+SAMPLES = Path(__file__).resolve().parent.parent / "app" / "tmp" / "medical_files"
+
+
+def obs_heavy_corpus(samples: dict[str, str], interval_minutes: int = 60) -> dict[str, str]:
+    """Six 4-hour nursing shifts with vitals every `interval_minutes` and 2-hourly BSLs"""
+    corpus = dict(samples)
+    admission = datetime(2025, 10, 10, 8, 0)
+    for shift in range(6):
+        shift_start = admission + timedelta(hours=shift * 4)
+        lines = [f"Nursing Note (shift {shift + 1})", "", "Obs:"]
+        for step in range(4 * 60 // interval_minutes):
+            at = shift_start + timedelta(minutes=step * interval_minutes)
+            i = shift * 16 + step
+            lines.append(f"{at:%H:%M} - Temp {36.8 + (i % 5) * 0.2:.1f}°C, HR {78 + i % 9}, BP {135 + i % 11}/{72 + i % 6}, RR {16 + i % 4}, SpO2 {92 + i % 4}%")
+            if at.minute == 0 and at.hour % 2 == 0:
+                lines.append(f"{at:%H}:30 - BSL {9 + (i % 7) * 0.8:.1f} mmol/L")
+        lines.append("Pt settled, no acute concerns.")
+        written = shift_start + timedelta(hours=4)
+        corpus[f"nurse-note-{written:%Y%m%d-%H.%M}.txt"] = "\n".join(lines) + "\n"
+    return corpus
+
+
+def report(label: str, corpus: dict[str, str]):
+    formatter = main.NoteFormatterFactory.create(main.NoteType.WARD_ROUND)
+    instruction = "Generate ward_round note"
+    options = {"dedupe": False}
+    before = formatter.format_user_message(corpus, instruction)
+    start = time.perf_counter()
+    content, table = main.prepare_prompt_content(corpus, options)
+    elapsed = time.perf_counter() - start
+    after = formatter.format_user_message(content, instruction, table)
+    print(f"{label}: {len(corpus)} files, table {'used' if table else 'skipped'}")
+    print(f"  user message tokens  {len(before) // 4:7d} -> {len(after) // 4:7d}  ({(len(before) - len(after)) / len(before):6.1%} saved)")
+    print(f"  extraction time      {elapsed * 1000:7.1f} ms")
+
+
+def main_():
+    samples = FileReader(SAMPLES).read_all_files()
+    report("sample corpus", samples)
+    report("obs-heavy 24h, hourly vitals", obs_heavy_corpus(samples, 60))
+    report("obs-heavy 24h, 30-min vitals", obs_heavy_corpus(samples, 30))
+    report("obs-heavy 24h, 15-min vitals", obs_heavy_corpus(samples, 15))
+
+
+if __name__ == "__main__":
+    main_()
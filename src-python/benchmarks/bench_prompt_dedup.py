@@ -0,0 +1,78 @@
+"""
+Report prompt savings from copy-forward dedup.
+
+Usage (from src-python):
+    python benchmarks/bench_prompt_dedup.py
+
+Measures the ward round user message for:
+  - the sample corpus in app/tmp/medical_files
+  - a synthetic 7-day admission where each daily ward note copies forward the
+    admission history's PMHx / medications / social history blocks
+Tokens are counted with tiktoken when its encoding is available, else chars/4.
+"""
+from pathlib import Path
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from services.context.copy_forward import CopyForwardDeduplicator  # noqa: E402
+from services.file_reader import FileReader  # noqa: E402
+from services.note_formatters.ward_round_formatter import WardRoundFormatter  # noqa: E402
+
+SAMPLES = Path(__file__).resolve().parent.parent / "app" / "tmp" / "medical_files"
+
+
+def token_counter():
+    try:
+        import tiktoken
+
+        encoding = tiktoken.get_encoding("cl100k_base")
+        return lambda text: len(encoding.encode(text)), "tiktoken cl100k_base"
+    except Exception:
+        return lambda text: len(text) // 4, "chars/4 estimate"
+
+
+def copy_forward_corpus(samples: dict[str, str]) -> dict[str, str]:
+    history = samples["gen-history-20250918-15.42.txt"]
+    carried = history[history.index("Past medical history"):history.index("Examination:")]
+    corpus = dict(samples)
+    for day in range(7):
+        corpus[f"ward-round-202510{12 + day:02d}-09.30.txt"] = (
+            f"Ward Round Note (Day {day + 2})\n\n"
+            f"Progress\nDay {day + 2} review. Pt comfortable, E+D well, mobilising with physio.\n\n"
+            f"{carried}\n"
+            f"Plan\nContinue current mx, review in AM.\n"
+        )
+    return corpus
+
+
+def report(label: str, corpus: dict[str, str], count):
+    formatter = WardRoundFormatter()
+    instruction = "Generate ward_round note"
+    deduplicator = CopyForwardDeduplicator()
+
+    start = time.perf_counter()
+    result = deduplicator.deduplicate(corpus)
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    deduplicator.deduplicate(corpus)
+    warm = time.perf_counter() - start
+
+    before = count(formatter.format_user_message(corpus, instruction))
+    after = count(formatter.format_user_message(result.content, instruction))
+    print(f"{label}: {len(corpus)} files, {len(result.repeats)} repeated blocks")
+    print(f"  user message tokens  {before:7d} -> {after:7d}  ({(before - after) / before:6.1%} saved)")
+    print(f"  dedup time           {cold * 1000:7.1f} ms cold, {warm * 1000:.2f} ms cached")
+
+
+def main():
+    count, method = token_counter()
+    print(f"Token counting: {method}")
+    samples = FileReader(SAMPLES).read_all_files()
+    report("sample corpus", samples, count)
+    report("7-day copy-forward", copy_forward_corpus(samples), count)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Report note_complete payload size and serialization time per wire protocol.
+
+Usage (from src-python):
+    python benchmarks/bench_wire_format.py
+
+Builds a ward round note citing the sample corpus 120 times, extracts its
+citations, then encodes note_complete the legacy way (hand-built dict and
+json.dumps) and with each negotiated WireProtocol. Deflated sizes use a raw
+deflate stream per message, as permessage-deflate without context takeover.
+"""
+from pathlib import Path
+import json
+import sys
+import time
+import zlib
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from services.citations.citation_extractor import CitationExtractor  # noqa: E402
+from services.file_reader import FileReader  # noqa: E402
+from services.streams.wire_protocol import WireProtocol, msgpack, note_complete_frame, orjson  # noqa: E402
+
+SAMPLES = Path(__file__).resolve().parent.parent / "app" / "tmp" / "medical_files"
+CITATIONS = 120
+RUNS = 200
+
+
+def cited_note(samples: dict[str, str], count: int) -> str:
+    quotes = []
+    for filename, text in sorted(samples.items()):
+        lines = [line.strip() for line in text.splitlines() if len(line.strip()) > 30]
+        quotes += [(filename, line) for line in lines]
+    body = [
+        "## Issues",
+        *(f"- Issue {n}: finding documented in the sources [{n}]" for n in range(1, count + 1)),
+        "## Progress",
+        "Stable overnight, tolerating diet, mobilising with physio.",
+        "## Examination",
+        "HS dual, chest clear, abdomen soft.",
+        "## Impression and Plan",
+        "Continue current management, review in AM.",
+        "## References",
+    ]
+    for n in range(1, count + 1):
+        filename, quote = quotes[(n - 1) % len(quotes)]
+        body.append(f"{n}. [cite:{filename}:Section {n % 7}]\n   > {quote}")
+    return "\n".join(body) + "\n"
+
+
+def legacy_encode(markdown: str, citation_map) -> str:
+    return json.dumps(
+        {
+            "type": "note_complete",
+            "data": {
+                "markdown": markdown,
+                "citations": {
+                    str(num): {
+                        "id": cite.id,
+                        "number": cite.number,
+                        "filename": cite.filename,
+                        "section": cite.section,
+                        "timestamp": cite.timestamp.isoformat() if cite.timestamp else None,
+                        "content": cite.content,
+                        "context": cite.context,
+                    }
+                    for num, cite in citation_map.citations.items()
+                },
+                "citation_count": citation_map.total_count,
+            },
+        }
+    )
+
+
+def measure(encode) -> tuple[int, int, float]:
+    payload = encode()
+    raw = payload.encode("utf-8") if isinstance(payload, str) else payload
+    compressor = zlib.compressobj(wbits=-15)
+    deflated = len(compressor.compress(raw) + compressor.flush(zlib.Z_SYNC_FLUSH)) - 4
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        encode()
+    return len(raw), deflated, (time.perf_counter() - start) / RUNS
+
+
+def main():
+    samples = FileReader(SAMPLES).read_all_files()
+    markdown = cited_note(samples, CITATIONS)
+    citation_map = CitationExtractor().extract_citations(markdown, samples)
+    print(f"note: {len(markdown)} chars, {citation_map.total_count} citations")
+    print(f"orjson {'available' if orjson else 'missing'}, msgpack {'available' if msgpack else 'missing'}")
+
+    variants = [("legacy json.dumps", lambda: legacy_encode(markdown, citation_map))]
+    for encoding in ("json", "msgpack"):
+        for mode in ("full", "ref"):
+            protocol = WireProtocol(encoding, mode)
+            if protocol.encoding != encoding:
+                continue
+            # The frame model is built once per note; include it in the timing
+            variants.append(
+                (
+                    f"{encoding} markdown={mode}",
+                    lambda p=protocol: p.encode(note_complete_frame(markdown, citation_map)),
+                )
+            )
+
+    baseline = None
+    print(f"{'variant':24} {'bytes':>8} {'deflated':>9} {'encode':>10}")
+    for label, encode in variants:
+        raw, deflated, seconds = measure(encode)
+        baseline = baseline or raw
+        print(f"{label:24} {raw:8d} {deflated:9d} {seconds * 1e6:8.0f} us  ({1 - raw / baseline:6.1%} smaller)")
+
+
+if __name__ == "__main__":
+    main()
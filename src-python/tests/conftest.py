@@ -0,0 +1,5 @@
+from pathlib import Path
+import sys
+
+# Import app modules the way main.py does (`from services...`)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
@@ -0,0 +1,70 @@
+import asyncio
+import threading
+import time
+from services.llm.async_stream import ThreadedStream
+
+
+def slow_deltas(pulled, closed, count=20, delay=0.01):
+    try:
+        for i in range(count):
+            time.sleep(delay)
+            pulled.append(i)
+            yield f"d{i} "
+    finally:
+        closed.set()
+
+
+def test_deltas_arrive_in_order():
+    async def consume():
+        return [delta async for delta in ThreadedStream(slow_deltas([], threading.Event(), 5, 0))]
+
+    assert asyncio.run(consume()) == ["d0 ", "d1 ", "d2 ", "d3 ", "d4 "]
+
+
+def test_cancelling_the_consumer_stops_the_producer():
+    pulled = []
+    closed = threading.Event()
+
+    async def consume(received):
+        # As generate_validated_note consumes it
+        stream = ThreadedStream(slow_deltas(pulled, closed))
+        try:
+            async for _ in stream:
+                received.set()
+                await asyncio.sleep(1)
+        finally:
+            await stream.aclose()
+
+    async def main():
+        received = asyncio.Event()
+        task = asyncio.create_task(consume(received))
+        await received.wait()
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        # Checked while the loop is still running
+        return await asyncio.to_thread(closed.wait, 1.0)
+
+    assert asyncio.run(main()), "provider stream was not closed"
+    assert len(pulled) < 20
+
+
+def test_cancel_while_waiting_for_a_delta_stops_the_producer():
+    pulled = []
+    closed = threading.Event()
+
+    async def main():
+        stream = ThreadedStream(slow_deltas(pulled, closed, delay=0.05))
+        task = asyncio.create_task(stream.__anext__())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        return await asyncio.to_thread(closed.wait, 1.0)
+
+    assert asyncio.run(main()), "provider stream was not closed"
+    assert len(pulled) < 20
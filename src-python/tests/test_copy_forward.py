@@ -0,0 +1,53 @@
+from services.context.copy_forward import CopyForwardDeduplicator, minhash_signature
+
+HISTORY = (
+    "Past medical history\n"
+    "- Hypertension, on amlodipine 5mg daily since 2015 with good control\n"
+    "- Type 2 diabetes mellitus, HbA1c 7.2% in August, on metformin 1g BD\n"
+    "- Atrial fibrillation, rate controlled, anticoagulated with apixaban 5mg BD\n"
+    "- COPD, last exacerbation March, uses Trelegy one puff daily\n"
+)
+
+
+def test_long_copy_forward_block_is_replaced():
+    content = {
+        "gen-history-20251009-10.00.txt": "Admission history\n\n" + HISTORY,
+        "ward-round-20251010-09.30.txt": "Day 2 review, pt comfortable.\n\n" + HISTORY,
+    }
+    result = CopyForwardDeduplicator().deduplicate(content)
+    assert len(result.repeats) == 1
+    assert "Repeated from gen-history-20251009-10.00.txt" in result.content["ward-round-20251010-09.30.txt"]
+    assert result.deduped_chars < result.original_chars
+
+
+def test_short_blocks_are_never_grown():
+    line = "PMHx: HTN, T2DM, AF on apixaban, COPD on Trelegy, CKD stage 3, OA knees\n"
+    content = {
+        "a-20251010-10.00.txt": line,
+        "b-20251011-10.00.txt": line,
+    }
+    result = CopyForwardDeduplicator().deduplicate(content)
+    assert result.content == content
+    assert result.deduped_chars <= result.original_chars
+
+
+def test_signature_is_deterministic_and_similarity_preserving():
+    first = minhash_signature(HISTORY)
+    assert first == minhash_signature(HISTORY)
+    edited = minhash_signature(HISTORY.replace("March", "April"))
+    assert sum(a == b for a, b in zip(first, edited)) / len(first) > 0.6
+
+
+def test_edited_block_is_kept_verbatim():
+    edited = HISTORY.replace("apixaban 5mg BD", "apixaban 2.5mg BD")
+    content = {
+        "gen-history-20251009-10.00.txt": "Admission history\n\n" + HISTORY,
+        "ward-round-20251010-09.30.txt": "Day 2 review, pt comfortable.\n\n" + edited,
+        "ward-round-20251011-09.30.txt": "Day 3 review, pt comfortable.\n\n" + edited,
+    }
+    result = CopyForwardDeduplicator().deduplicate(content)
+    assert result.content["ward-round-20251010-09.30.txt"] == content["ward-round-20251010-09.30.txt"]
+    # The edited version becomes the copy later notes refer back to
+    assert [(r.filename, r.canonical_filename) for r in result.repeats] == [
+        ("ward-round-20251011-09.30.txt", "ward-round-20251010-09.30.txt")
+    ]
@@ -0,0 +1,27 @@
+from agents.medical_agent import MedicalAgent
+from services.file_reader import FileReader
+
+
+def test_a_folder_over_the_total_cap_is_still_cached(tmp_path, monkeypatch):
+    for day, letter in ((10, "a"), (11, "b"), (12, "c")):
+        (tmp_path / f"nurse-note-202510{day}-08.00.txt").write_text(letter * 100)
+    monkeypatch.setattr(FileReader, "MAX_TOTAL_BYTES", 250)
+    agent = MedicalAgent()
+    read = []
+    read_documents = agent._read_documents
+    monkeypatch.setattr(
+        agent,
+        "_read_documents",
+        lambda documents, reader: read.append([d.filename for d in documents]) or read_documents(documents, reader),
+    )
+
+    first = agent.load_medical_files(tmp_path)
+    # The same newest-first cut the reader makes without a cache
+    assert first == FileReader(str(tmp_path)).read_all_files()
+    assert first["nurse-note-20251010-08.00.txt"].startswith("a" * 50 + "\n[... truncated: 50 of 100")
+    assert len(agent.document_cache._entries) == 3
+
+    read.clear()
+    assert agent.load_medical_files(tmp_path) == first
+    # Only the document the budget ran out in is read again, cut short
+    assert read == [["nurse-note-20251010-08.00.txt"]]
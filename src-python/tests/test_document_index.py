@@ -0,0 +1,53 @@
+import pytest
+from services.context.document_index import DocumentIndex, TimeWindowError
+
+
+@pytest.fixture
+def index(tmp_path):
+    for name in (
+        "gen-history-20251010-08.00.txt",
+        "ward-round-20251011-09.30.txt",
+        "nurse-note-20251011-14.00.txt",
+        "consult-letter-20251012-10.00.txt",
+    ):
+        (tmp_path / name).write_text("text")
+    index = DocumentIndex(tmp_path)
+    index.refresh()
+    return index
+
+
+def names(documents):
+    return [document.filename for document in documents]
+
+
+def test_since_last_starts_at_the_latest_document_of_the_type(index):
+    assert names(index.select({"sinceLast": "ward_note"})) == [
+        "ward-round-20251011-09.30.txt",
+        "nurse-note-20251011-14.00.txt",
+        "consult-letter-20251012-10.00.txt",
+    ]
+    # Types only this folder has are accepted too
+    assert names(index.select({"sinceLast": "consult_letter"})) == ["consult-letter-20251012-10.00.txt"]
+
+
+def test_known_type_without_documents_selects_everything(index):
+    assert len(index.select({"sinceLast": "physio"})) == 4
+
+
+@pytest.mark.parametrize(
+    "window",
+    [
+        {"sinceLast": "ward_rounds"},
+        {"sinceLast": ["ward_note"]},
+        {"sinceLast": ""},
+        {"since": "yesterday"},
+        {"until": 20251011},
+        {"lastHours": "24"},
+        {"lastHours": -1},
+        {"documentTypes": "lab"},
+        ["ward_note"],
+    ],
+)
+def test_malformed_windows_are_rejected(index, window):
+    with pytest.raises(TimeWindowError):
+        index.select(window)
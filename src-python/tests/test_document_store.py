@@ -0,0 +1,78 @@
+import io
+import pytest
+from agents.medical_agent import MedicalAgent
+from services.context import document_store as store_module
+from services.context.document_store import (
+    GZIP,
+    TEXT_BINARY,
+    TEXT_NORMALIZED,
+    TEXT_RAW,
+    DocumentStore,
+    DocumentTooLargeError,
+)
+from services.file_reader import FileReader
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    # Small chunks, so normalization crosses chunk boundaries
+    monkeypatch.setattr(store_module, "CHUNK_BYTES", 7)
+    store = DocumentStore(tmp_path / "store", codec=GZIP)
+    yield store
+    store.close()
+
+
+def ingest(store, source, filename, data: bytes):
+    return store.ingest(source, filename, io.BytesIO(data))
+
+
+@pytest.mark.parametrize(
+    "data, state, text",
+    [
+        (b"line one\nline two\n", TEXT_RAW, b"line one\nline two\n"),
+        # The CRLF pairs straddle the 7-byte chunks
+        (b"abcdef\r\nabcde\r\nx", TEXT_NORMALIZED, b"abcdef\nabcde\nx"),
+        (b"lone\rcr\n", TEXT_RAW, b"lone\rcr\n"),
+        ("﻿BOM café\r\n".encode("utf-8"), TEXT_NORMALIZED, "BOM café\n".encode("utf-8")),
+        ("café naïve\r\n".encode("cp1252"), TEXT_NORMALIZED, "café naïve\n".encode("utf-8")),
+        ("aébécédé".encode("utf-8"), TEXT_RAW, "aébécédé".encode("utf-8")),
+        (b"\x00\x01\x02binary", TEXT_BINARY, None),
+    ],
+)
+def test_objects_are_normalized_in_chunks(store, tmp_path, data, state, text):
+    stored = ingest(store, tmp_path, "note.txt", data)
+    assert stored.text == state
+    assert store.read_text(stored.sha256) == text
+
+
+def test_read_text_stops_at_the_limit(store, tmp_path):
+    stored = ingest(store, tmp_path, "note.txt", b"x" * 100)
+    assert store.read_text(stored.sha256, 10) == b"x" * 10
+
+
+def test_documents_over_the_size_cap_are_rejected(tmp_path):
+    store = DocumentStore(tmp_path / "store", codec=GZIP, max_document_bytes=10)
+    with pytest.raises(DocumentTooLargeError):
+        ingest(store, tmp_path, "note.txt", b"x" * 11)
+    store.close()
+
+
+def test_files_and_stored_documents_share_one_budget(store, tmp_path):
+    folder = tmp_path / "patient"
+    folder.mkdir()
+    (folder / "nurse-note-20251010-08.00.txt").write_text("a" * 100)
+    (folder / "nurse-note-20251012-08.00.txt").write_text("b" * 100)
+    ingest(store, folder, "ward-round-20251011-09.30.txt", b"c" * 100)
+    ingest(store, folder, "ward-round-20251013-09.30.txt", b"d" * 100)
+
+    agent = MedicalAgent(store)
+    index = agent.get_index(folder)
+    reader = FileReader(str(folder), max_total_bytes=250)
+    contents = agent._read_documents(index.documents(), reader)
+
+    assert reader.bytes_loaded == 250
+    # Newest first across both sources: stored, file, then half of the stored one
+    assert contents["ward-round-20251013-09.30.txt"] == "d" * 100
+    assert contents["nurse-note-20251012-08.00.txt"] == "b" * 100
+    assert contents["ward-round-20251011-09.30.txt"].startswith("c" * 50 + "\n[... truncated: 50 of 100")
+    assert contents["nurse-note-20251010-08.00.txt"] == reader.TRUNCATION_MARKER.format(omitted=100, total=100)
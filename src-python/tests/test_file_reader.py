@@ -0,0 +1,45 @@
+import os
+from services.file_reader import FileReader
+
+
+def write(path, data: bytes, mtime: int):
+    path.write_bytes(data)
+    os.utime(path, (mtime, mtime))
+
+
+def test_newer_binary_does_not_take_the_budget(tmp_path):
+    write(tmp_path / "nurse-note.txt", b"Pt settled overnight.\n" * 10, 1_000)
+    write(tmp_path / "scan.pdf", b"%PDF\x00\x01" * 100, 2_000)
+    reader = FileReader(str(tmp_path), max_total_bytes=300)
+
+    contents = reader.read_all_files()
+
+    assert contents == {"nurse-note.txt": "Pt settled overnight.\n" * 10}
+
+
+def test_budget_of_a_failed_read_goes_to_truncated_files(tmp_path, monkeypatch):
+    write(tmp_path / "old.txt", b"a" * 100, 1_000)
+    write(tmp_path / "new.txt", b"b" * 100, 2_000)
+    reader = FileReader(str(tmp_path), max_total_bytes=120)
+    read_file = reader.read_file
+    # new.txt is text but fails to read
+    monkeypatch.setattr(
+        reader,
+        "read_file",
+        lambda path, limit=None, size=None: None if os.path.basename(path) == "new.txt" else read_file(path, limit, size),
+    )
+
+    contents = reader.read_all_files()
+
+    assert contents == {"old.txt": "a" * 100}
+
+
+def test_total_budget_goes_to_newest_files_first(tmp_path):
+    write(tmp_path / "old.txt", b"a" * 100, 1_000)
+    write(tmp_path / "new.txt", b"b" * 100, 2_000)
+    reader = FileReader(str(tmp_path), max_total_bytes=150)
+
+    contents = reader.read_all_files()
+
+    assert contents["new.txt"] == "b" * 100
+    assert contents["old.txt"].startswith("a" * 50 + "\n[... truncated: 50 of 100 bytes")
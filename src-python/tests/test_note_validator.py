@@ -0,0 +1,85 @@
+from services.streams.section_parser import SectionStreamParser
+from services.validation.note_validator import (
+    StreamingNoteValidator,
+    resume_validation,
+    validate_note_text,
+)
+
+SECTIONS = ["Progress", "Impression", "Plan", "References"]
+
+PROGRESS = "## Progress\nPt comfortable [1]\n"
+IMPRESSION = "## Impression\nImproving\n"
+PLAN = "## Plan\n- Continue mx\n"
+REFERENCES = "## References\n1. [cite:nurse-note.txt:Overnight]\n> Slept well.\n"
+
+
+def codes(validator):
+    return [(issue.code, issue.severity) for issue in validator.issues]
+
+
+def test_a_complete_note_is_valid():
+    validator = validate_note_text(PROGRESS + IMPRESSION + PLAN + REFERENCES, SECTIONS)
+    assert validator.issues == []
+    assert validator.is_valid
+
+
+def test_duplicate_section_is_fatal_at_its_heading():
+    note = PROGRESS + IMPRESSION + "## Progress\nagain\n" + PLAN + REFERENCES
+    fatal = validate_note_text(note, SECTIONS).fatal
+    assert fatal.code == "duplicate_section"
+    assert fatal.offset == len(PROGRESS + IMPRESSION)
+
+
+def test_out_of_order_section_is_fatal_at_its_heading():
+    note = PROGRESS + PLAN + IMPRESSION + REFERENCES
+    fatal = validate_note_text(note, SECTIONS).fatal
+    assert fatal.code == "section_order"
+    assert fatal.offset == len(PROGRESS + PLAN)
+
+
+def test_missing_references_is_fatal_only_when_citations_need_them():
+    cited = validate_note_text(PROGRESS + IMPRESSION + PLAN, SECTIONS)
+    assert cited.fatal.code == "missing_section" and cited.fatal.section == "References"
+    uncited = validate_note_text("## Progress\nPt well\n" + IMPRESSION + PLAN, SECTIONS)
+    assert uncited.fatal is None
+    assert codes(uncited) == [("missing_section", "error")]
+
+
+def test_citation_problems_are_errors():
+    note = (
+        "## Progress\nPt well [1, 2] and [3]\n" + IMPRESSION + PLAN
+        + "## References\n1. [cite:a.txt:S]\n> quote\n2. [cite:b.txt:S]\n"
+    )
+    validator = validate_note_text(note, SECTIONS)
+    assert validator.fatal is None
+    assert sorted(codes(validator)) == [
+        ("citation_syntax", "error"),
+        ("reference_without_quote", "error"),
+        ("unresolved_citation", "error"),
+    ]
+
+
+def test_split_deltas_report_the_same_issues_and_offsets():
+    note = PROGRESS + PLAN + IMPRESSION + REFERENCES
+    parser = SectionStreamParser(SECTIONS)
+    validator = StreamingNoteValidator(SECTIONS)
+    for i in range(0, len(note), 5):
+        validator.observe(parser.feed(note[i:i + 5]))
+    validator.observe(parser.close())
+    validator.finish()
+    assert validator.issues == validate_note_text(note, SECTIONS).issues
+
+
+def test_state_is_rebuilt_from_the_prefix_kept_by_a_rollback():
+    # Rolled back at the repeated Progress heading; the kept prefix is replayed
+    parser, validator = resume_validation(PROGRESS + IMPRESSION, SECTIONS)
+    assert validator.expected_next_section() == "Plan"
+    assert validator.issues == []
+
+    remainder = PLAN + REFERENCES
+    events = parser.feed(remainder)
+    # Offsets continue from the end of the kept prefix
+    assert events[0]["offset"] == len(PROGRESS + IMPRESSION)
+    issues = validator.observe(events) + validator.observe(parser.close()) + validator.finish()
+    assert issues == []
+    assert validator.is_valid
@@ -0,0 +1,85 @@
+import pytest
+from services.context.observations import ObservationExtractor
+
+
+def parse(line):
+    found, _ = ObservationExtractor._parse_line(line)
+    return found
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        "BSLs QID, last 2 readings high",
+        "BGL target 6-10",
+        "BSL 6-10",
+        "BSL 6 to 10",
+        "HR 2x daily",
+        "Na 135-140",
+    ],
+)
+def test_numbers_that_are_not_readings_are_ignored(line):
+    assert parse(line) == []
+
+
+@pytest.mark.parametrize(
+    "line, expected",
+    [
+        ("BSL: 11.2", [("BSL", 11.2)]),
+        ("BGL 7.5 mmol/L", [("BSL", 7.5)]),
+        ("K 4.1", [("K", 4.1)]),
+        ("Temp 37.", [("Temp", 37.0)]),
+    ],
+)
+def test_value_after_label_or_separator(line, expected):
+    assert parse(line) == expected
+
+
+def test_every_bp_on_a_line_is_read():
+    assert parse("BP 130/80 lying, 110/70 standing") == [
+        ("SBP", 130.0),
+        ("DBP", 80.0),
+        ("SBP", 110.0),
+        ("DBP", 70.0),
+    ]
+
+
+def test_only_lines_made_of_readings_are_replaced():
+    content = {
+        "nurse-note-20251010-19.43.txt": (
+            "02:00 - Temp 37.1°C, HR 82, BP 142/77, RR 18, SpO2 93%\n"
+            "BSL 11 this morning, pt reports feeling shaky\n"
+            "Pt settled overnight.\n"
+        )
+    }
+    observations = ObservationExtractor().extract(content)
+    text = observations.content["nurse-note-20251010-19.43.txt"]
+    assert text.splitlines() == [
+        "[obs L1: see Observation Trends]",
+        "BSL 11 this morning, pt reports feeling shaky",
+        "Pt settled overnight.",
+    ]
+    assert set(observations.series) == {"Temp", "HR", "RR", "SpO2", "BSL", "SBP", "DBP"}
+
+
+def test_readings_in_date_only_files_stay_on_that_day():
+    content = {"lab-results-20251010.txt": "08:00 BSL 11.2\n22:00 BSL 7.4\n"}
+    series = ObservationExtractor().extract(content).series["BSL"]
+    assert [str(t) for t in series.times] == ["2025-10-10T08:00", "2025-10-10T22:00"]
+
+
+def test_citing_a_replaced_line_quotes_the_original():
+    from services.citations.citation_extractor import CitationExtractor
+
+    original = {"nurse-note-20251010-19.43.txt": "Obs\n02:00 - HR 82, RR 18, SpO2 93%\n"}
+    prompt = ObservationExtractor().extract(original).content
+    assert "SpO2" not in prompt["nurse-note-20251010-19.43.txt"]
+
+    note = (
+        "Sats 93% overnight [1]\n\n"
+        "## References\n"
+        "1. [cite:nurse-note-20251010-19.43.txt:L2]\n"
+        "> SpO2 (%) | 93 @ 10/10 02:00 | 93-93 | +0 | 1 | nurse-note-20251010-19.43.txt:L2\n"
+    )
+    citation = CitationExtractor().extract_citations(note, original).citations[1]
+    assert citation.content == "02:00 - HR 82, RR 18, SpO2 93%"
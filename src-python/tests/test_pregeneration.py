@@ -0,0 +1,131 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+from services.scheduler import pregeneration
+from services.scheduler.pregeneration import (
+    PrecomputedNote,
+    PrecomputedNoteStore,
+    PregenerationScheduler,
+    options_key,
+)
+
+
+def make_scheduler(store, folder):
+    return PregenerationScheduler(
+        jobs=[],
+        store=store,
+        generate=None,
+        targets=lambda: [folder],
+        fingerprint=lambda directory: "fp",
+        worker_id="w1",
+    )
+
+
+def patient_folder(tmp_path):
+    folder = tmp_path / "p1"
+    folder.mkdir()
+    an_hour_ago = time.time() - 3600
+    os.utime(folder, (an_hour_ago, an_hour_ago))
+    return folder
+
+
+def save_note(store, folder, created_at):
+    store.save(
+        PrecomputedNote(
+            directory=str(folder),
+            doc_type="ward_round",
+            options_key=options_key("ward_round", {}),
+            fingerprint="fp",
+            markdown="note",
+            note_complete="{}",
+            created_at=created_at,
+        )
+    )
+
+
+def test_lookup_serves_a_fresh_note(tmp_path):
+    store = PrecomputedNoteStore(tmp_path / "pre.db")
+    folder = patient_folder(tmp_path)
+    save_note(store, folder, datetime.now() - timedelta(minutes=1))
+    scheduler = make_scheduler(store, folder)
+    assert asyncio.run(scheduler.lookup(folder, "ward_round", {})) is not None
+
+
+def test_lookup_skips_notes_past_max_age(tmp_path, monkeypatch):
+    store = PrecomputedNoteStore(tmp_path / "pre.db")
+    folder = patient_folder(tmp_path)
+    save_note(store, folder, datetime.now() - timedelta(minutes=1))
+    monkeypatch.setattr(pregeneration, "MAX_AGE", timedelta(0))
+    scheduler = make_scheduler(store, folder)
+    assert asyncio.run(scheduler.lookup(folder, "ward_round", {})) is None
+
+
+def test_lookup_skips_notes_older_than_the_folder(tmp_path):
+    store = PrecomputedNoteStore(tmp_path / "pre.db")
+    folder = patient_folder(tmp_path)
+    save_note(store, folder, datetime.now() - timedelta(minutes=5))
+    (folder / "new-note.txt").write_text("added after generation")
+    scheduler = make_scheduler(store, folder)
+    assert asyncio.run(scheduler.lookup(folder, "ward_round", {})) is None
+
+
+def test_unrenewed_slot_is_reclaimed(tmp_path, monkeypatch):
+    store = PrecomputedNoteStore(tmp_path / "pre.db")
+    assert store.claim("job@2025-10-10", "crashed")
+    assert not store.claim("job@2025-10-10", "w2")
+    later = time.time() + pregeneration.SLOT_LEASE.total_seconds() + 1
+    monkeypatch.setattr(pregeneration.time, "time", lambda: later)
+    assert store.claim("job@2025-10-10", "w2")
+    store.finish("job@2025-10-10")
+    assert not store.claim("job@2025-10-10", "w3")
+
+
+def job_scheduler(store, folders, generate):
+    job = pregeneration.PregenerationJob(at="06:30", docType="ward_round")
+    return PregenerationScheduler(
+        jobs=[job],
+        store=store,
+        generate=generate,
+        targets=lambda: folders,
+        fingerprint=lambda directory: "fp",
+        worker_id="w1",
+    ), job
+
+
+def test_a_failing_folder_does_not_stop_the_run(tmp_path):
+    store = PrecomputedNoteStore(tmp_path / "pre.db")
+    generated = []
+
+    async def generate(sink, thread_id, doc_type, note_options, directory):
+        if directory.name == "p1":
+            raise OSError("folder removed")
+        generated.append(directory.name)
+
+    scheduler, job = job_scheduler(store, [tmp_path / "p1", tmp_path / "p2"], generate)
+    now = job.due_at(datetime.now().date())
+    asyncio.run(scheduler.run_due_jobs(now))
+    assert generated == ["p2"]
+    assert not store.claim(f"{job.label}@{now.date().isoformat()}", "w2")
+
+
+def test_a_cancelled_run_leaves_its_slot_to_be_reclaimed(tmp_path, monkeypatch):
+    store = PrecomputedNoteStore(tmp_path / "pre.db")
+
+    async def generate(sink, thread_id, doc_type, note_options, directory):
+        await asyncio.sleep(30)
+
+    scheduler, job = job_scheduler(store, [tmp_path / "p1"], generate)
+    now = job.due_at(datetime.now().date())
+
+    async def main():
+        task = asyncio.create_task(scheduler.run_due_jobs(now))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(main())
+    slot = f"{job.label}@{now.date().isoformat()}"
+    later = time.time() + pregeneration.SLOT_LEASE.total_seconds() + 1
+    monkeypatch.setattr(pregeneration.time, "time", lambda: later)
+    assert store.claim(slot, "w2")
@@ -0,0 +1,37 @@
+import asyncio
+import threading
+import time
+from services.diagnostics.profiler import ProfileStore, profile_capture, stream_thread_name
+
+
+def busy(stop: threading.Event):
+    while not stop.is_set():
+        time.sleep(0.001)
+
+
+def test_capture_leaves_out_other_generations_threads(tmp_path):
+    stop = threading.Event()
+    before = threading.Thread(target=busy, args=(stop,), name="pool-worker")
+    before.start()
+
+    async def main():
+        store = ProfileStore(tmp_path)
+        async with profile_capture("t1", "ward_round", store) as capture_id:
+            threads = [
+                threading.Thread(target=busy, args=(stop,), name=name)
+                for name in (stream_thread_name("t1"), stream_thread_name("t2"), "started-during")
+            ]
+            for thread in threads:
+                thread.start()
+            await asyncio.sleep(0.2)
+        stop.set()
+        return store, capture_id
+
+    store, capture_id = asyncio.run(main())
+    before.join()
+
+    sampled = {line.split(";")[0] for line in store.path(capture_id, ".collapsed").read_text().splitlines()}
+    assert {stream_thread_name("t1"), "started-during", "MainThread"} <= sampled
+    assert stream_thread_name("t2") not in sampled
+    assert "pool-worker" not in sampled
+    assert store.list()[0].other_generations == 1
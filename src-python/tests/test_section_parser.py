@@ -0,0 +1,78 @@
+from services.streams.section_parser import SectionStreamParser
+
+SECTIONS = ["Progress", "Impression", "Plan", "References"]
+
+NOTE = (
+    "## Progress\n"
+    "Pt comfortable overnight [1][2]\n"
+    "## Impression\n"
+    "\\# Delirium\n"
+    "Improving [3]\n"
+    "Plan:\n"
+    "- Continue mx\n"
+)
+
+
+def run(deltas):
+    parser = SectionStreamParser(SECTIONS)
+    events = []
+    for delta in deltas:
+        events += parser.feed(delta)
+    return events + parser.close()
+
+
+def summary(events):
+    """Headings, per-section text and citations, independent of how deltas were cut"""
+    starts = [(e["section"], e["parent"], e["offset"]) for e in events if e["type"] == "section_start"]
+    text = {}
+    citations = []
+    for event in events:
+        if event["type"] == "section_delta":
+            text[event["section"]] = text.get(event["section"], "") + event["content"]
+            citations += [(c["number"], c["offset"]) for c in event["citations"]]
+    return starts, text, citations
+
+
+def test_sections_subsections_and_citations():
+    starts, text, citations = summary(run([NOTE]))
+    assert starts == [
+        ("Progress", None, 0),
+        ("Impression", None, NOTE.index("## Impression")),
+        ("Delirium", "Impression", NOTE.index("\\# Delirium")),
+        ("Plan", None, NOTE.index("Plan:")),
+    ]
+    assert text == {
+        "Progress": "Pt comfortable overnight [1][2]\n",
+        "Delirium": "Improving [3]\n",
+        "Plan": "- Continue mx\n",
+    }
+    assert citations == [(n, NOTE.index(f"[{n}]")) for n in (1, 2, 3)]
+
+
+def test_headings_and_citations_split_across_deltas():
+    one_char = run(list(NOTE))
+    cuts = [3, 9, 38, 40, 50, 64, 70, 80]
+    pieces = [NOTE[a:b] for a, b in zip([0] + cuts, cuts + [len(NOTE)])]
+    assert summary(one_char) == summary(run([NOTE])) == summary(run(pieces))
+
+
+def test_a_partial_line_that_cannot_be_a_heading_is_emitted_early():
+    parser = SectionStreamParser(SECTIONS)
+    parser.feed("## Progress\n")
+    events = parser.feed("Pt well")
+    assert [e["content"] for e in events if e["type"] == "section_delta"] == ["Pt well"]
+    # ...but an unclosed citation is held back until its bracket closes
+    assert [e["content"] for e in parser.feed(" [1")] == [" "]
+    events = parser.feed("2]\n")
+    assert events[0]["citations"] == [{"number": 12, "offset": len("## Progress\nPt well ")}]
+
+
+def test_sections_end_where_the_next_one_starts():
+    events = run([NOTE])
+    ends = [(e["section"], e["offset"]) for e in events if e["type"] == "section_end"]
+    assert ends == [
+        ("Progress", NOTE.index("## Impression")),
+        ("Delirium", NOTE.index("Plan:")),
+        ("Impression", NOTE.index("Plan:")),
+        ("Plan", len(NOTE)),
+    ]
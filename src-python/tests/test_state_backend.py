@@ -0,0 +1,109 @@
+import asyncio
+import time
+import pytest
+from services.streams.connection_manager import ConnectionManager
+from services.streams.state_backend import CANCEL, InMemoryStateBackend, SQLiteStateBackend
+
+
+class FakeSocket:
+    async def send_text(self, text):
+        pass
+
+
+def test_heartbeat_prunes_rows_of_crashed_workers(tmp_path):
+    async def main():
+        backend = SQLiteStateBackend(tmp_path / "state.db")
+        await backend.heartbeat("crashed")
+        await backend.register_socket("t1", "crashed")
+        await backend.claim_task("t1", "crashed")
+        await backend.publish("crashed", CANCEL, "t1")
+        # Rows written by a worker that never heartbeat are orphans too
+        await backend.register_socket("t2", "unknown")
+
+        await backend.heartbeat("live")
+        await backend.register_socket("t3", "live")
+        assert await backend.socket_owner("t1") == "crashed"
+
+        backend._execute("UPDATE workers SET seen_at = ? WHERE worker_id = 'crashed'", (time.time() - 3600,))
+        await backend.heartbeat("live")
+
+        assert await backend.socket_owner("t1") is None
+        assert await backend.task_owner("t1") is None
+        assert await backend.socket_owner("t2") is None
+        assert await backend.socket_owner("t3") == "live"
+        assert backend._execute("SELECT COUNT(*) FROM messages")[0][0] == 0
+        await backend.close()
+
+    asyncio.run(main())
+
+
+def test_empty_poll_does_not_write(tmp_path):
+    async def main():
+        backend = SQLiteStateBackend(tmp_path / "state.db")
+        before = backend._conn.total_changes
+        assert await backend.fetch("w1", timeout=0.05) == []
+        assert backend._conn.total_changes == before
+
+        await backend.publish("w1", CANCEL, "t1")
+        assert await backend.fetch("w1", timeout=0.05) == [(CANCEL, "t1", "")]
+        assert await backend.fetch("w1", timeout=0) == []
+        await backend.close()
+
+    asyncio.run(main())
+
+
+def test_disconnect_cancels_a_task_running_on_another_worker(tmp_path):
+    async def main():
+        runner = ConnectionManager(SQLiteStateBackend(tmp_path / "state.db"))
+        holder = ConnectionManager(SQLiteStateBackend(tmp_path / "state.db"))
+        await runner.start()
+        await holder.start()
+
+        # The socket lives on `holder`, the generation was triggered through `runner`
+        await holder.connect("t1", FakeSocket())
+        cancelled = asyncio.Event()
+
+        async def generation():
+            try:
+                await asyncio.sleep(30)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        await runner.start_stream_task("t1", generation())
+        await asyncio.sleep(0)
+        assert await holder.backend.task_owner("t1") == runner.worker_id
+
+        await holder.disconnect("t1")
+        await asyncio.wait_for(cancelled.wait(), timeout=5)
+        await asyncio.sleep(0.1)
+        assert await holder.backend.task_owner("t1") is None
+
+        await holder.stop()
+        await runner.stop()
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize("kind", ["memory", "sqlite"])
+def test_patient_links_expire_once_their_socket_is_gone(tmp_path, kind):
+    async def main():
+        backend = InMemoryStateBackend() if kind == "memory" else SQLiteStateBackend(tmp_path / "state.db")
+        await backend.register_socket("open", "w1")
+        await backend.register_socket("closed", "w1")
+        for thread_id in ("open", "closed", "never-connected"):
+            await backend.link_patient(thread_id, "p1")
+        await backend.unregister_socket("closed", "w1")
+
+        # Within the TTL a client can still reconnect
+        await backend.heartbeat("w1")
+        assert await backend.thread_patient("closed") == "p1"
+
+        backend.LINK_TTL = -1
+        await backend.heartbeat("w1")
+        assert await backend.thread_patient("open") == "p1"
+        assert await backend.thread_patient("closed") is None
+        assert await backend.thread_patient("never-connected") is None
+        await backend.close()
+
+    asyncio.run(main())
@@ -0,0 +1,30 @@
+import pytest
+from services.streams.wire_protocol import WireProtocol, dumps
+
+CHUNK = {"type": "chunk", "content": "## Progress\n"}
+SECTION = {"type": "section_start", "section": "Progress", "parent": None, "offset": 0}
+
+
+def test_section_events_are_opt_in():
+    default = WireProtocol.from_query({})
+    assert default.accepts(CHUNK)
+    assert not default.accepts(SECTION)
+    assert default.describe()["events"] == "none"
+
+    sections = WireProtocol.from_query({"events": "sections"})
+    assert sections.accepts(SECTION)
+
+
+def test_routed_section_events_are_dropped_unless_asked_for():
+    # A chunk that merely mentions an event name is still delivered
+    chunk = dumps({"type": "chunk", "content": "section_start"})
+    default = WireProtocol()
+    assert default.reencode(chunk) == chunk
+    assert default.reencode(dumps(SECTION)) is None
+    assert WireProtocol(events="sections").reencode(dumps(SECTION)) == dumps(SECTION)
+    assert WireProtocol(markdown="ref").reencode(dumps(SECTION)) is None
+
+
+def test_unknown_events_mode_is_rejected():
+    with pytest.raises(ValueError):
+        WireProtocol.from_query({"events": "all"})
@@ -11,10 +11,18 @@ type TriggerPayload = {
   onMessage?: (message: any) => void;
 };
 
+async function sha256Hex(text: string): Promise<string> {
+  const digest = await crypto.subtle.digest('SHA-256', new TextEncoder().encode(text));
+  return Array.from(new Uint8Array(digest), (b) => b.toString(16).padStart(2, '0')).join('');
+}
+
 export function useAutoTriggeredStream(sidecarPort: number, initial: TriggerPayload) {
   const editor = usePlateEditor();
   const mountedRef = useRef(false);
   const wsRef = useRef<WebSocket | null>(null);
+  // Markdown rebuilt from chunk frames, per docType (several notes may share
+  // the socket); note_complete only carries its hash.
+  const streamedRef = useRef<Record<string, string>>({});
   const [connected, setConnected] = useState(false);
   const [streaming, setStreaming] = useState(false);
   const [error, setError] = useState<string | null>(null);
@@ -64,7 +72,9 @@ export function useAutoTriggeredStream(sidecarPort: number, initial: TriggerPayl
 
       // create socket and attach handlers
       try {
-        ws = new WebSocket(`ws://127.0.0.1:${sidecarPort}/ws/medical-note/${payload.threadId}`);
+        ws = new WebSocket(
+          `ws://127.0.0.1:${sidecarPort}/ws/medical-note/${payload.threadId}?markdown=ref`
+        );
         wsRef.current = ws;
       } catch (e: any) {
         console.error('Failed to construct WebSocket:', e);
@@ -77,40 +87,77 @@ export function useAutoTriggeredStream(sidecarPort: number, initial: TriggerPayl
         console.log('✓ WebSocket connected');
         setConnected(true);
         setStreaming(true);
+        streamedRef.current = {};
         editor?.setOption(AIChatPlugin, 'streaming', true);
       };
 
-      ws.onmessage = (ev) => {
-        try {
-          const msg = JSON.parse(ev.data);
-          console.log('📩 WebSocket message:', msg.type);
-
-          // ALWAYS call custom message handler first
-          if (initial.onMessage) {
-            initial.onMessage(msg);
+      const handleMessage = async (msg: any, streamed: string | null) => {
+        if (streamed !== null) {
+          if ((await sha256Hex(streamed)) !== msg.data.markdown_sha256) {
+            console.error('❌ Streamed markdown does not match note_complete hash');
           }
+          msg.data.markdown = streamed;
+        }
 
-          // DON'T process chunks - let handleMessage in PlateEditor handle everything
-          // The onMessage callback will process note_complete and update the editor
-          
-          if (msg.type === 'note_complete') {
-            console.log('✓ Note complete received');
-            setStreaming(false);
-            editor?.setOption(AIChatPlugin, 'streaming', false);
-          } else if (msg.type === 'done') {
-            console.log('✓ Stream done');
-            setStreaming(false);
-            editor?.setOption(AIChatPlugin, 'streaming', false);
-          } else if (msg.type === 'error') {
-            console.error('❌ Stream error:', msg.content);
-            setError(msg.content || 'Error');
-            setStreaming(false);
-            editor?.setOption(AIChatPlugin, 'streaming', false);
-          }
+        // ALWAYS call custom message handler first
+        if (initial.onMessage) {
+          initial.onMessage(msg);
+        }
+
+        // DON'T process chunks - let handleMessage in PlateEditor handle everything
+        // The onMessage callback will process note_complete and update the editor
+        
+        if (msg.type === 'note_complete') {
+          console.log('✓ Note complete received');
+          setStreaming(false);
+          editor?.setOption(AIChatPlugin, 'streaming', false);
+        } else if (msg.type === 'done') {
+          console.log('✓ Stream done');
+          setStreaming(false);
+          editor?.setOption(AIChatPlugin, 'streaming', false);
+        } else if (msg.type === 'error') {
+          console.error('❌ Stream error:', msg.content);
+          setError(msg.content || 'Error');
+          setStreaming(false);
+          editor?.setOption(AIChatPlugin, 'streaming', false);
+        }
+      };
+
+      // Frames are handled one at a time in arrival order, so a done can't
+      // overtake the note_complete whose hash is still being checked.
+      let pending: Promise<void> = Promise.resolve();
+
+      ws.onmessage = (ev) => {
+        let msg: any;
+        try {
+          msg = JSON.parse(ev.data);
         } catch (e: any) {
           console.error('❌ Parse error:', e);
           setError(e?.message || 'Parse error');
+          return;
         }
+        console.log('📩 WebSocket message:', msg.type);
+
+        // The buffer is updated before any await, so chunks of the next note
+        // never land in (or get cleared from) the one being completed.
+        const buffers = streamedRef.current;
+        const key = msg.docType ?? '';
+        let streamed: string | null = null;
+        if (msg.type === 'chunk') {
+          buffers[key] = (buffers[key] ?? '') + (msg.content ?? '');
+        } else if (msg.type === 'rollback') {
+          buffers[key] = (buffers[key] ?? '').slice(0, msg.offset);
+        } else if (msg.type === 'note_complete' && msg.data.markdown == null) {
+          streamed = buffers[key] ?? '';
+          delete buffers[key];
+        }
+
+        pending = pending
+          .then(() => handleMessage(msg, streamed))
+          .catch((e: any) => {
+            console.error('❌ Message handling error:', e);
+            setError(e?.message || 'Message handling error');
+          });
       };
 
       ws.onerror = (ev) => {
@@ -81,11 +81,13 @@ export function useWsNoteStream(
     if (wsRef.current) wsRef.current.close();
     // initialize sanitizer for this connection
     joinerRef.current = new MarkdownJoiner();
-    const ws = new WebSocket(`ws://127.0.0.1:${sidecarPort}/ws/medical-note/${threadId}`);
+    // This hook renders from the chunk frames, so note_complete need not repeat the markdown.
+    const url = `ws://127.0.0.1:${sidecarPort}/ws/medical-note/${threadId}?markdown=ref`;
+    const ws = new WebSocket(url);
     wsRef.current = ws;
 
     ws.onopen = () => {
-      console.debug('WS onopen:', { url: `ws://127.0.0.1:${sidecarPort}/ws/medical-note/${threadId}` });
+      console.debug('WS onopen:', { url });
       setStreaming(true);
       editorRef.current?.setOption(AIChatPlugin, 'streaming', true);
       fullContentRef.current = '';
@@ -131,15 +133,16 @@ export function useWsNoteStream(
     function handleWsFrame(data: any) {
       console.debug('WS onmessage:', data?.type);
       if (data.type === 'chunk') {
-        const chunk = data.content;
-
-        if (!chunk || chunk.trim().length === 0) return;
-
-        // ACCUMULATE instead of immediate insert
-        fullContentRef.current += chunk;
+        // ACCUMULATE instead of immediate insert. Keep every chunk, whitespace
+        // included, so rollback offsets line up with the server's text;
+        // blank content is filtered when rendering.
+        fullContentRef.current += data.content ?? '';
+      } else if (data.type === 'rollback') {
+        // Server abandoned a malformed section and is regenerating from `offset`.
+        fullContentRef.current = fullContentRef.current.slice(0, data.offset);
       } else if (data.type === 'done') {
         // Insert ALL content at once
-        if (fullContentRef.current && editorRef.current) {
+        if (fullContentRef.current.trim() && editorRef.current) {
           console.log('=== FULL CONTENT ===');
           console.log(fullContentRef.current);
 